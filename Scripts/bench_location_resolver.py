@@ -0,0 +1,91 @@
+"""Benchmark: LocationResolver vs the per-call SQL chain it replaced.
+
+Usage: python Scripts/bench_location_resolver.py [db_path] [iterations]
+
+Resolves a mix of inputs (ids, exact names, different case, prefixes,
+substrings and unknown values) with both implementations, checks that the
+exact/id answers agree and prints the time per call.
+"""
+import sqlite3
+import sys
+import time
+from pathlib import Path
+# ensure repo root is on sys.path so imports like `db_utils` work when running from scripts/
+repo_root = str(Path(__file__).resolve().parent.parent)
+if repo_root not in sys.path:
+    sys.path.insert(0, repo_root)
+from location_resolver import get_location_resolver
+
+
+def sql_chain_resolve(db_name, deposit_value, rack_value):
+    """The old approach: one connection and up to a few LIKE queries per value."""
+    def _one(table, id_col, desc_col, value):
+        conn = sqlite3.connect(db_name)
+        cur = conn.cursor()
+        try:
+            text = str(value).strip()
+            try:
+                r = cur.execute(f"SELECT {id_col} FROM {table} WHERE {id_col} = ?", (int(text),)).fetchone()
+                if r:
+                    return r[0]
+            except ValueError:
+                pass
+            for sql, arg in ((f"SELECT {id_col} FROM {table} WHERE {desc_col} = ? COLLATE NOCASE LIMIT 1", text),
+                             (f"SELECT {id_col} FROM {table} WHERE {desc_col} LIKE ? LIMIT 1", f"{text}%"),
+                             (f"SELECT {id_col} FROM {table} WHERE {desc_col} LIKE ? LIMIT 1", f"%{text}%")):
+                r = cur.execute(sql, (arg,)).fetchone()
+                if r:
+                    return r[0]
+            return None
+        finally:
+            conn.close()
+    return (_one("deposits", "deposit_id", "deposit_description", deposit_value),
+            _one("racks", "rack_id", "rack_description", rack_value))
+
+
+def main():
+    db_name = sys.argv[1] if len(sys.argv) > 1 else str(Path(repo_root) / 'inventariovlm.db')
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    conn = sqlite3.connect(db_name)
+    deposits = conn.execute("SELECT deposit_id, deposit_description FROM deposits").fetchall()
+    racks = conn.execute("SELECT rack_id, rack_description FROM racks").fetchall()
+    conn.close()
+
+    inputs = []
+    for i in range(max(len(deposits), len(racks))):
+        dep_id, dep_desc = deposits[i % len(deposits)]
+        rack_id, rack_desc = racks[i % len(racks)]
+        inputs.append((dep_desc, rack_desc))
+        inputs.append((str(dep_id), str(rack_id)))
+        inputs.append(((dep_desc or '').upper(), (rack_desc or '').lower()))
+        inputs.append(((dep_desc or '')[:4], (rack_desc or '')[:2]))
+    inputs.append(("no existe", "ZZZ"))
+
+    resolver = get_location_resolver(db_name)
+    mismatches = 0
+    for dep, rack in inputs[:len(inputs) - 1]:
+        if len(dep) > 4 and not dep.isdigit():
+            # exact names must agree between both implementations
+            if resolver.resolve(dep, rack)[0] != sql_chain_resolve(db_name, dep, rack)[0]:
+                mismatches += 1
+
+    calls = [inputs[i % len(inputs)] for i in range(iterations)]
+    t0 = time.perf_counter()
+    for dep, rack in calls:
+        sql_chain_resolve(db_name, dep, rack)
+    t_sql = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for dep, rack in calls:
+        resolver.resolve(dep, rack)
+    t_mem = time.perf_counter() - t0
+
+    print(f"{len(deposits)} deposits, {len(racks)} racks, {iterations} resolutions ({len(inputs)} distinct inputs)")
+    print(f"SQL chain        : {t_sql * 1e6 / iterations:9.1f} us/call")
+    print(f"LocationResolver : {t_mem * 1e6 / iterations:9.1f} us/call  ({t_sql / max(t_mem, 1e-9):.0f}x)")
+    print(f"cache: {resolver.cache_info()}")
+    print(f"exact-name mismatches: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark: full per-item differences vs the "changes since the last run" delta.
+
+Usage: python Scripts/bench_report_delta.py [--items 50000] [--rows 200000] [--touched 10,100,1000] [--repeat 3]
+
+Builds a throwaway database with ``--items`` items and ``--rows`` count
+rows (the columns the per-item aggregate reads), times the bulk insert
+with and without the ``report_delta`` change triggers, then for each
+``--touched`` count updates that many items and times the full per-item
+aggregate plus storing its fingerprints (what 'Diferencias por Item' does)
+against ``changes_since_last_run``, checking that the delta finds exactly
+the touched items.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+# ensure repo root is on sys.path so imports like `report_delta` work when running from Scripts/
+repo_root = str(Path(__file__).resolve().parent.parent)
+if repo_root not in sys.path:
+    sys.path.insert(0, repo_root)
+
+from report_delta import changes_since_last_run, current_mark, ensure_item_changes, save_fingerprints
+from ui_pdf_report import _PER_ITEM_DIFF_TEMPLATE
+
+SCHEMA = """
+CREATE TABLE items (item_id INTEGER PRIMARY KEY, code_item TEXT UNIQUE, description_item TEXT,
+                    current_inventory INTEGER);
+CREATE TABLE inventory_count (id INTEGER PRIMARY KEY AUTOINCREMENT, counter_name TEXT, code_item TEXT,
+                              item_id INTEGER, magazijn INTEGER, boxunittotal INTEGER, total INTEGER);
+CREATE INDEX idx_inventory_item ON inventory_count (code_item);
+CREATE INDEX idx_inventory_count_item_id ON inventory_count (item_id);
+"""
+
+
+def make_db(path, n_items, n_rows, triggers, seed=7):
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO items VALUES (?, ?, ?, ?)",
+                     ((i, f"{100000 + i}", f"Artículo {i}", rnd.randint(0, 5000)) for i in range(1, n_items + 1)))
+    conn.commit()
+    conn.close()
+    if triggers:
+        ensure_item_changes(path)
+    rows = []
+    for n in range(n_rows):
+        i = rnd.randint(1, n_items)
+        loose = rnd.randint(0, 50)
+        boxes = rnd.choice((0, 6, 12, 24))
+        rows.append((f"contador{n % 12}", f"{100000 + i}", i, loose, boxes, loose + boxes))
+    conn = sqlite3.connect(path)
+    start = time.perf_counter()
+    conn.executemany("INSERT INTO inventory_count (counter_name, code_item, item_id, magazijn, boxunittotal, total) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed
+
+
+def full_run(path):
+    mark = current_mark(path)
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(_PER_ITEM_DIFF_TEMPLATE.format(where="")).fetchall()
+    finally:
+        conn.close()
+    save_fingerprints(path, "bench", rows, mark)
+    return rows
+
+
+def touch(path, n, rnd):
+    """Recount one row of ``n`` random items; returns their item ids."""
+    conn = sqlite3.connect(path)
+    try:
+        rows = dict(conn.execute("SELECT item_id, MIN(id) FROM inventory_count GROUP BY item_id").fetchall())
+        items = set(rnd.sample(sorted(rows), n))
+        conn.executemany("UPDATE inventory_count SET magazijn = magazijn + 1, total = total + 1 WHERE id = ?",
+                         ((rows[i],) for i in items))
+        conn.commit()
+        return items
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=50000)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--touched', default='10,100,1000')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = os.path.join(tmp, "plain.db")
+        path = os.path.join(tmp, "delta.db")
+        t_plain = make_db(plain, args.items, args.rows, triggers=False)
+        t_trig = make_db(path, args.items, args.rows, triggers=True)
+        print(f"insert {args.rows} rows: {t_plain:.2f} s without triggers, {t_trig:.2f} s with "
+              f"({(t_trig - t_plain) * 1e6 / args.rows:.1f} µs/row)")
+        rnd = random.Random(11)
+        full_run(path)
+        print(f"{'touched':>8} {'full (s)':>9} {'delta (s)':>10} {'changed':>8} {'speedup':>8}")
+        for n in (int(x) for x in args.touched.split(',')):
+            t_full = t_delta = None
+            for _ in range(args.repeat):
+                # the full report stores the baseline, then n other items change before the delta
+                touch(path, n, rnd)
+                start = time.perf_counter()
+                full_run(path)
+                elapsed = time.perf_counter() - start
+                t_full = elapsed if t_full is None else min(t_full, elapsed)
+                items = touch(path, n, rnd)
+                start = time.perf_counter()
+                _since, changes = changes_since_last_run(path, "bench", _PER_ITEM_DIFF_TEMPLATE)
+                elapsed = time.perf_counter() - start
+                t_delta = elapsed if t_delta is None else min(t_delta, elapsed)
+                found = {cur[8] for _prev, cur in changes}
+                if found != items:
+                    print(f"{n:>8}  ERROR: el delta no coincide ({len(found)} de {len(items)})")
+                    return 1
+            print(f"{n:>8} {t_full:9.3f} {t_delta:10.4f} {len(changes):>8} {t_full / t_delta:7.1f}x", flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
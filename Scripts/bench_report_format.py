@@ -0,0 +1,100 @@
+"""Benchmark: column-wise vs per-cell formatting of report rows.
+
+Usage: python Scripts/bench_report_format.py [--rows 10000,100000,500000] [--repeat 3]
+
+Formats synthetic rows shaped like ``conteos`` (14 columns: 8 integer
+columns with ``fmt_int``, a truncated description and plain text) with
+``report_format.format_rows_per_cell`` (one ``fmt_int`` per cell, the old
+path) and ``report_format.format_rows`` (a column at a time, NumPy for the
+integer columns; also timed with NumPy switched off), checks that all give
+the same cells and prints the best time of ``--repeat`` runs and the time
+per 100,000 cells.
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+# ensure repo root is on sys.path so imports like `report_engine` work when running from Scripts/
+repo_root = str(Path(__file__).resolve().parent.parent)
+if repo_root not in sys.path:
+    sys.path.insert(0, repo_root)
+
+import report_format
+from report_engine import Column
+from report_format import format_rows, format_rows_per_cell, np
+
+COLUMNS = [
+    Column("ID", 0, 30),
+    Column("Contador", 1, 70),
+    Column("Código", 2, 60),
+    Column("Descripción", 3, 140, max_len=60),
+    Column("Cajas", 4, 35, "int"),
+    Column("U/caja", 5, 40, "int"),
+    Column("Total cajas", 6, 45, "int"),
+    Column("Magazijn", 7, 45, "int"),
+    Column("Winkel", 8, 40, "int"),
+    Column("Total", 9, 45, "int"),
+    Column("Actual", 10, 40, "int"),
+    Column("Difer.", 11, 40, "abs_int"),
+    Column("Ubicación", 14, 90),
+    Column("Fecha", 15, 60),
+]
+
+
+def make_rows(n, seed=7):
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        boxes = rnd.randint(0, 40)
+        per_box = rnd.choice((1, 6, 12, 24, 48))
+        loose = rnd.randint(0, 30) if rnd.random() < 0.7 else None
+        total = boxes * per_box + (loose or 0)
+        current = rnd.randint(0, 20000)
+        rows.append((i + 1, f"contador{i % 12}", f"{100000 + i % 9000}",
+                     f"Artículo de prueba número {i} con una descripción larga " * 2,
+                     boxes, per_box, boxes * per_box, loose, rnd.randint(0, 5), total, current,
+                     total - current, "DEP", "R01", f"DEP{i % 7}-R{i % 40:02d}-{i % 9}", "2026-02-14"))
+    return rows
+
+
+def best_of(func, rows, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = func(rows, COLUMNS)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='10000,100000,500000')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"numpy: {np.__version__ if np is not None else 'no disponible'}")
+    print(f"{'rows':>8}  {'path':<12} {'seconds':>9} {'ms/100k cells':>14} {'speedup':>8}")
+    for n in (int(x) for x in args.rows.split(',')):
+        rows = make_rows(n)
+        cells = n * len(COLUMNS)
+        t_cell, ref = best_of(format_rows_per_cell, rows, args.repeat)
+        t_col, out = best_of(format_rows, rows, args.repeat)
+        # the same column-wise path as without NumPy installed
+        report_format.np = None
+        try:
+            t_py, out_py = best_of(format_rows, rows, args.repeat)
+        finally:
+            report_format.np = np
+        if out != ref or out_py != ref:
+            print(f"{n:>8}  ERROR: los resultados no coinciden")
+            return 1
+        print(f"{n:>8}  {'per-cell':<12} {t_cell:9.3f} {t_cell * 1e8 / cells:14.1f}")
+        print(f"{n:>8}  {'column-wise':<12} {t_col:9.3f} {t_col * 1e8 / cells:14.1f} {t_cell / t_col:7.1f}x")
+        print(f"{n:>8}  {'(no numpy)':<12} {t_py:9.3f} {t_py * 1e8 / cells:14.1f} {t_cell / t_py:7.1f}x", flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
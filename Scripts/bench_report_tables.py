@@ -0,0 +1,90 @@
+"""Benchmark: ChunkedTable vs one reportlab Table for long reports.
+
+Usage: python Scripts/bench_report_tables.py [--rows 2000,20000,200000] [--legacy-max 20000] [--memory]
+
+Renders synthetic rows shaped like ``inventario_por_ubicacion`` (five
+columns, landscape A4, same style) with both layouts and prints the time,
+pages and time per 1,000 rows. The single Table is skipped above
+``--legacy-max`` rows because its splits make it quadratic. ``--memory``
+repeats each run under tracemalloc and prints the peak.
+"""
+import argparse
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+# ensure repo root is on sys.path so imports like `report_tables` work when running from Scripts/
+repo_root = str(Path(__file__).resolve().parent.parent)
+if repo_root not in sys.path:
+    sys.path.insert(0, repo_root)
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from report_tables import ChunkedTable
+
+
+def make_data(n):
+    data = [['Ubicación', 'Código', 'Descripción', 'Inventario', 'Actual Total (Item)']]
+    for i in range(n):
+        data.append([f"DEP{i % 7}-R{i % 40:02d}-{i % 9}", f"{100000 + i}", f"Artículo de prueba número {i} " * 3,
+                     f"{(i * 37) % 5000:,}".replace(',', '.'), f"{(i * 91) % 9000:,}".replace(',', '.')])
+    return data
+
+
+def render(data, table_cls):
+    out = io.BytesIO()
+    doc = SimpleDocTemplate(out, pagesize=landscape(A4), rightMargin=18, leftMargin=18, topMargin=18, bottomMargin=18)
+    table = table_cls(data, repeatRows=1, hAlign='LEFT', colWidths=[200, 80, 360, 80, 80])
+    style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d3d3d3')),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('LEFTPADDING', (0, 0), (-1, -1), 4),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+    ])
+    style.add('ALIGN', (3, 1), (4, -1), 'RIGHT')
+    table.setStyle(style)
+    doc.build([Paragraph('Benchmark', getSampleStyleSheet()['Heading1']), Spacer(1, 8), table])
+    return doc.page
+
+
+def measure(data, table_cls, memory):
+    start = time.perf_counter()
+    pages = render(data, table_cls)
+    elapsed = time.perf_counter() - start
+    peak = None
+    if memory:
+        tracemalloc.start()
+        render(data, table_cls)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, pages, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='2000,20000,200000')
+    parser.add_argument('--legacy-max', type=int, default=20000)
+    parser.add_argument('--memory', action='store_true')
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}  {'layout':<12} {'seconds':>9} {'pages':>6} {'ms/1k rows':>11} {'peak MB':>8}")
+    for n in (int(x) for x in args.rows.split(',')):
+        data = make_data(n)
+        for name, cls in (('Table', Table), ('ChunkedTable', ChunkedTable)):
+            if cls is Table and n > args.legacy_max:
+                print(f"{n:>8}  {name:<12} {'skipped':>9}")
+                continue
+            elapsed, pages, peak = measure(data, cls, args.memory)
+            mem = f"{peak / 1e6:8.1f}" if peak is not None else f"{'-':>8}"
+            print(f"{n:>8}  {name:<12} {elapsed:9.2f} {pages:>6} {elapsed * 1e6 / n:11.1f} {mem}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,12 @@
 import sqlite3
 import os
-import csv
+import sys
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_schema import ensure_schema
+from db_backup import snapshot_before
+
 DB = os.path.join(os.getcwd(), 'inventariovlm.db')
 print('Using DB:', DB)
 if not os.path.exists(DB):
@@ -11,31 +15,19 @@ if not os.path.exists(DB):
 conn = sqlite3.connect(DB)
 cur = conn.cursor()
 
-# Backup current inventory_count_res to CSV
-ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-backup_dir = os.path.join(os.getcwd(), 'backups')
-os.makedirs(backup_dir, exist_ok=True)
-backup_path = os.path.join(backup_dir, f'inventory_count_res_backup_{ts}.csv')
-try:
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='inventory_count_res'")
-    if cur.fetchone():
-        rows = cur.execute('SELECT * FROM inventory_count_res').fetchall()
-        cols = [d[0] for d in cur.description]
-        with open(backup_path, 'w', newline='', encoding='utf-8') as fh:
-            w = csv.writer(fh)
-            w.writerow(cols)
-            w.writerows(rows)
-        print('Backup written to', backup_path)
-    else:
-        print('No existing inventory_count_res table; nothing to backup')
-except Exception as e:
-    print('Warning: could not backup inventory_count_res:', e)
+# Snapshot of the whole database before clearing inventory_count_res (backups/snapshots)
+snap = snapshot_before(DB, 'clear-res')
+if snap:
+    print('Snapshot written to', snap)
+else:
+    print('Warning: could not snapshot the database')
 
 # Ensure table exists and columns
 cur.execute('''
 CREATE TABLE IF NOT EXISTS inventory_count_res (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     code_item TEXT(10) NOT NULL,
+    item_id INTEGER,
     description_item TEXT,
     boxqty INTEGER DEFAULT 0,
     boxunitqty INTEGER DEFAULT 0,
@@ -60,6 +52,9 @@ if 'purchasing_qty' not in cols:
     cur.execute("ALTER TABLE inventory_count_res ADD COLUMN purchasing_qty INTEGER DEFAULT 0")
 conn.commit()
 
+# item_id on items and the fact tables (joins below are by item_id)
+ensure_schema(DB)
+
 # Clear existing rows (we choose to replace current summary)
 cur.execute('DELETE FROM inventory_count_res')
 conn.commit()
@@ -67,7 +62,7 @@ print('Cleared inventory_count_res')
 
 # Perform aggregation (assumes sales and purchasing tables with (code_item, qty))
 agg_sql = '''
-SELECT ic.code_item AS code_item,
+SELECT COALESCE(MAX(i.code_item), MAX(ic.code_item)) AS code_item,
        COALESCE(SUM(ic.boxqty),0) AS boxqty,
        COALESCE(SUM(ic.boxunitqty),0) AS boxunitqty,
        COALESCE(SUM(ic.boxunittotal),0) AS boxunittotal,
@@ -77,16 +72,17 @@ SELECT ic.code_item AS code_item,
        MAX(COALESCE(i.description_item, '')) AS description_item,
        MAX(COALESCE(i.current_inventory,0)) AS current_inventory,
        COALESCE(s.sales_qty, 0) AS sales_qty,
-       COALESCE(p.purchasing_qty, 0) AS purchasing_qty
+       COALESCE(p.purchasing_qty, 0) AS purchasing_qty,
+       ic.item_id AS item_id
   FROM inventory_count ic
-  LEFT JOIN items i ON i.code_item = ic.code_item
+  LEFT JOIN items i ON i.item_id = ic.item_id
   LEFT JOIN (
-      SELECT code_item, SUM(sales_qty) AS sales_qty FROM sales GROUP BY code_item
-  ) s ON s.code_item = ic.code_item
+      SELECT item_id, SUM(sales_qty) AS sales_qty FROM sales GROUP BY item_id
+  ) s ON s.item_id = ic.item_id
   LEFT JOIN (
-      SELECT code_item, SUM(purchasing_qty) AS purchasing_qty FROM purchasing GROUP BY code_item
-  ) p ON p.code_item = ic.code_item
- GROUP BY ic.code_item
+      SELECT item_id, SUM(purchasing_qty) AS purchasing_qty FROM purchasing GROUP BY item_id
+  ) p ON p.item_id = ic.item_id
+ GROUP BY COALESCE(ic.item_id, ic.code_item)
 '''
 
 try:
@@ -109,20 +105,21 @@ try:
         purchasing_qty = int(r[10] or 0)
         total_calc = total + purchasing_qty - sales_qty
         difference = current_inventory - total_calc
+        item_id = r[11]
         # include total_calc column if present
         cur.execute("PRAGMA table_info(inventory_count_res)")
         cols = [c[1] for c in cur.fetchall()]
         if 'total_calc' in cols:
             cur.execute('''INSERT INTO inventory_count_res
-                (code_item, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, total_calc, updated_date)
-                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)''',
-                (code_item, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, total_calc, ts_now)
+                (code_item, item_id, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, total_calc, updated_date)
+                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)''',
+                (code_item, item_id, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, total_calc, ts_now)
             )
         else:
             cur.execute('''INSERT INTO inventory_count_res
-                (code_item, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, updated_date)
-                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)''',
-                (code_item, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, ts_now)
+                (code_item, item_id, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, updated_date)
+                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)''',
+                (code_item, item_id, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, ts_now)
             )
         inserted += 1
     conn.commit()
@@ -4,27 +4,12 @@ repo_root = Path(__file__).resolve().parent.parent
 if str(repo_root) not in sys.path:
     sys.path.insert(0, str(repo_root))
 
-import traceback
-
-# Prefer the new resumen module; fall back to the original ui_pdf_report
-try:
-    import ui_pdf_report_resumen as rpt
-except Exception:
-    import ui_pdf_report as rpt
+from report_api import run_report
 
 out = Path(repo_root) / 'tmp'
 out.mkdir(exist_ok=True)
 outfile = out / 'diferencias_resumen.pdf'
 
-# Monkeypatch asksave and _open_pdf_file to avoid dialogs and opening
-setattr(rpt, '_asksave', lambda parent: str(outfile))
-setattr(rpt, '_open_pdf_file', lambda path, parent=None: True)
-
-print('Calling generate_pdf_report_diferencias_resumen ->', outfile)
-try:
-    rpt.generate_pdf_report_diferencias_resumen(None, db_path=str(repo_root / 'inventariovlm.db'))
-    print('Report completed, file exists:', outfile.exists(), 'size=', outfile.stat().st_size if outfile.exists() else 'n/a')
-except Exception:
-    print('Exception during report:')
-    traceback.print_exc()
-    raise
+print('Generating diferencias_resumen ->', outfile)
+stats = run_report('diferencias_resumen', str(repo_root / 'inventariovlm.db'), str(outfile))
+print('Report completed:', stats)
@@ -0,0 +1,63 @@
+"""Checks that ui_grid.ColumnarSource sorts like SQLite (the order SqlPageSource shows).
+
+Usage: python Scripts/test_columnar_sort.py   (or: python -m pytest Scripts/test_columnar_sort.py)
+
+Seeds an in-memory table with NULLs, empty strings, repeated values and
+-inf, and compares every column sorted both ways with ORDER BY col, id.
+"""
+import sqlite3
+import sys
+from pathlib import Path
+# ensure repo root is on sys.path so imports like `ui_grid` work when running from Scripts/
+repo_root = str(Path(__file__).resolve().parent.parent)
+if repo_root not in sys.path:
+    sys.path.insert(0, repo_root)
+
+import ui_grid
+from ui_grid import ColumnarSource
+
+COLUMNS = ("id", "code_item", "total")
+ROWS = [
+    (1, "B", 3.0), (2, None, None), (3, "", 1.0), (4, "a", float("-inf")), (5, None, 2.0),
+    (6, "", None), (7, "B", float("-inf")), (8, "10", 0.0), (9, "ñ", 2.0), (10, None, 1.0),
+]
+
+
+def sql_order(col, descending=False):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, code_item TEXT, total REAL)")
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?)", ROWS)
+    d = " DESC" if descending else ""
+    return [r[0] for r in conn.execute(f"SELECT id FROM t ORDER BY {col}{d}, id{d}")]
+
+
+def grid_order(col, descending=False):
+    src = ColumnarSource(COLUMNS, list(ROWS))
+    src.set_view(sort_col=col, descending=descending)
+    return [r[0] for r in src.fetch(0, src.count())]
+
+
+def check_all():
+    for col in COLUMNS:
+        for descending in (False, True):
+            assert grid_order(col, descending) == sql_order(col, descending), (col, descending)
+
+
+def test_sort_matches_sqlite():
+    check_all()
+
+
+def test_sort_matches_sqlite_without_numpy():
+    np = ui_grid.np
+    ui_grid.np = None
+    try:
+        check_all()
+    finally:
+        ui_grid.np = np
+
+
+if __name__ == '__main__':
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print("OK ", name)
@@ -0,0 +1,109 @@
+"""Checks for db_backup: a snapshot finishes while another connection keeps committing.
+
+Usage: python Scripts/test_db_backup.py   (or: python -m pytest Scripts/test_db_backup.py)
+
+Builds a throwaway database of some 50k pages and snapshots it while a
+second connection commits every 10 ms (CountWriter commits every 500 ms).
+A copy in small steps restarts on every commit and never finished here.
+"""
+import gzip
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+# ensure repo root is on sys.path so imports like `db_backup` work when running from Scripts/
+repo_root = str(Path(__file__).resolve().parent.parent)
+if repo_root not in sys.path:
+    sys.path.insert(0, repo_root)
+
+from db_backup import restore, snapshot
+
+LIMIT_S = 30
+
+
+def make_db(path, rows=1000000):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)")
+    conn.executemany("INSERT INTO t (v) VALUES (?)", (("x" * 200,) for _ in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def count_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_snapshot_while_writing():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "live.db")
+        make_db(db)
+        stop = threading.Event()
+        writes = []
+
+        def writer():
+            conn = sqlite3.connect(db, timeout=30)
+            while not stop.is_set():
+                conn.execute("INSERT INTO t (v) VALUES ('y')")
+                conn.commit()
+                writes.append(1)
+                time.sleep(0.01)
+            conn.close()
+
+        thread = threading.Thread(target=writer, daemon=True)
+        thread.start()
+        start = time.perf_counter()
+
+        def progress(status, remaining, total):
+            if time.perf_counter() - start > LIMIT_S:
+                raise RuntimeError(f"snapshot still copying after {LIMIT_S} s")
+
+        try:
+            time.sleep(0.2)
+            path = snapshot(db, dest_dir=tmp, progress=progress)
+            elapsed = time.perf_counter() - start
+        finally:
+            stop.set()
+            thread.join()
+        assert elapsed < LIMIT_S
+        assert writes, "the writer never committed"
+        # the copy is a consistent state between two commits of the writer
+        copy = os.path.join(tmp, "copy.db")
+        with gzip.open(path, "rb") as fin, open(copy, "wb") as fout:
+            fout.write(fin.read())
+        assert 1000000 <= count_rows(copy) <= count_rows(db)
+        conn = sqlite3.connect(copy)
+        assert [r[0] for r in conn.execute("PRAGMA quick_check")] == ["ok"]
+        conn.close()
+
+
+def test_restore_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "live.db")
+        make_db(db, rows=1000)
+        path = snapshot(db, dest_dir=tmp)
+        conn = sqlite3.connect(db)
+        conn.execute("DELETE FROM t")
+        conn.commit()
+        conn.close()
+        # not an app database: the migrations run after the restore log and skip their tables
+        logging.disable(logging.CRITICAL)
+        try:
+            restore(path, db)
+        finally:
+            logging.disable(logging.NOTSET)
+        assert count_rows(db) == 1000
+
+
+if __name__ == '__main__':
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print("OK ", name)
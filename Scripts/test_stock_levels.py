@@ -0,0 +1,81 @@
+"""Checks for count_recompute.stage_stock_levels / apply_stock_levels / recompute_counts.
+
+Usage: python Scripts/test_stock_levels.py   (or: python -m pytest Scripts/test_stock_levels.py)
+
+Runs on an in-memory database; seeds repeated codes and codes that resolve
+to the same item with and without leading zeros.
+"""
+import sqlite3
+import sys
+import time
+from pathlib import Path
+# ensure repo root is on sys.path so imports like `count_recompute` work when running from Scripts/
+repo_root = str(Path(__file__).resolve().parent.parent)
+if repo_root not in sys.path:
+    sys.path.insert(0, repo_root)
+
+from count_recompute import apply_stock_levels, recompute_counts, stage_stock_levels
+
+
+def make_db(n_items=5):
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE items (item_id INTEGER PRIMARY KEY, code_item TEXT UNIQUE, current_inventory INTEGER);
+        CREATE TABLE inventory_count (id INTEGER PRIMARY KEY, code_item TEXT, item_id INTEGER, total INTEGER,
+                                      current_inventory INTEGER, difference INTEGER);
+    """)
+    conn.executemany("INSERT INTO items VALUES (?, ?, 0)", ((i, str(100 + i)) for i in range(1, n_items + 1)))
+    return conn
+
+
+def staged(conn):
+    return dict(conn.execute("SELECT item_id, current_inventory FROM stock_levels WHERE item_id IS NOT NULL"))
+
+
+def test_repeated_code_last_value_wins():
+    conn = make_db()
+    stage_stock_levels(conn, [("101", 1), ("101", 2), (" 101 ", 3)])
+    assert staged(conn) == {1: 3}
+
+
+def test_exact_code_wins_over_leading_zeros():
+    conn = make_db()
+    # the exact code wins whichever comes last
+    not_found = stage_stock_levels(conn, [("101", 10), ("0101", 11), ("0102", 20), ("102", 21), ("0103", 30)])
+    assert not_found == []
+    assert staged(conn) == {1: 10, 2: 21, 3: 30}
+    assert conn.execute("SELECT COUNT(*) FROM stock_levels").fetchone()[0] == 3
+
+
+def test_unknown_codes_are_reported():
+    conn = make_db()
+    assert stage_stock_levels(conn, [("999", 1), ("101", 1), ("", 5), ("0998", 2)]) == ["0998", "999"]
+
+
+def test_apply_and_recompute():
+    conn = make_db()
+    conn.executemany("INSERT INTO inventory_count (code_item, item_id, total, current_inventory, difference) "
+                     "VALUES (?, ?, ?, 0, ?)", [("101", 1, 7, 7), ("101", 1, 3, 3), ("102", 2, 5, 5)])
+    stage_stock_levels(conn, [("101", 4), ("0101", 99), ("102", 0), ("103", 8)])
+    assert apply_stock_levels(conn) == (3, 2)  # 102 already had 0
+    assert recompute_counts(conn) == 2
+    assert conn.execute("SELECT total, current_inventory, difference FROM inventory_count ORDER BY id").fetchall() == [
+        (7, 4, 3), (3, 4, -1), (5, 0, 5)]
+
+
+def test_dedupe_is_not_quadratic():
+    conn = make_db(30000)
+    rows = [(str(100 + i), i) for i in range(1, 30001)] + [("0" + str(100 + i), -i) for i in range(1, 30001, 10)]
+    start = time.perf_counter()
+    stage_stock_levels(conn, rows)
+    elapsed = time.perf_counter() - start
+    assert conn.execute("SELECT COUNT(*) FROM stock_levels").fetchone()[0] == 30000
+    assert conn.execute("SELECT MIN(current_inventory) FROM stock_levels").fetchone()[0] == 1
+    assert elapsed < 5, f"stage_stock_levels took {elapsed:.1f} s for 30k codes"
+
+
+if __name__ == '__main__':
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print("OK ", name)
@@ -1,4 +1,8 @@
+import multiprocessing
+
 from ui_main import main
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # el paquete de reportes usa procesos; sin esto cada proceso del ejecutable abre otra ventana
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,85 @@
+"""In-process change notifications between open windows.
+
+A window that modifies a row publishes the change; every other open window
+subscribed to that table patches its own view instead of reloading::
+
+    token = subscribe("inventory_count", on_change)
+    publish("inventory_count", "update", row_id, row=new_row, code_item=code)
+    unsubscribe(token)
+
+``on_change(change)`` receives a ``Change`` with ``table``, ``op``
+(``"update"``, ``"delete"`` or ``"reload"``), ``row_id``, ``row`` and
+``code_item``. Callbacks run on the Tk thread: publishing from the main
+thread dispatches immediately, publishing from any other thread queues the
+change until ``pump()`` is called from the Tk loop.
+"""
+import itertools
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+_subscribers = {}
+_lock = threading.Lock()
+_tokens = itertools.count(1)
+_pending = queue.Queue()
+
+
+class Change:
+    __slots__ = ("table", "op", "row_id", "row", "code_item", "source")
+
+    def __init__(self, table, op, row_id=None, row=None, code_item=None, source=None):
+        self.table = table
+        self.op = op
+        self.row_id = row_id
+        self.row = row
+        self.code_item = code_item
+        # token of the publisher, so a window can ignore its own changes
+        self.source = source
+
+    def __repr__(self):
+        return f"Change({self.table!r}, {self.op!r}, row_id={self.row_id!r}, code_item={self.code_item!r})"
+
+
+def subscribe(table, callback):
+    """Register ``callback`` for changes to ``table``. Returns a token for ``unsubscribe``."""
+    token = next(_tokens)
+    with _lock:
+        _subscribers[token] = (table, callback)
+    return token
+
+
+def unsubscribe(token):
+    with _lock:
+        _subscribers.pop(token, None)
+
+
+def publish(table, op, row_id=None, row=None, code_item=None, source=None):
+    change = Change(table, op, row_id, row, code_item, source)
+    if threading.current_thread() is threading.main_thread():
+        _dispatch(change)
+    else:
+        _pending.put(change)
+
+
+def pump():
+    """Deliver changes published from background threads (call from the Tk loop)."""
+    while True:
+        try:
+            change = _pending.get_nowait()
+        except queue.Empty:
+            return
+        _dispatch(change)
+
+
+def _dispatch(change):
+    with _lock:
+        targets = [(tok, cb) for tok, (table, cb) in _subscribers.items() if table == change.table]
+    for tok, cb in targets:
+        if tok == change.source:
+            continue
+        try:
+            cb(change)
+        except Exception:
+            logger.exception("change_bus: subscriber failed for %r", change)
@@ -0,0 +1,140 @@
+"""One representation for count dates: ``'YYYY-MM-DD'`` text.
+
+``count_date`` used to arrive in several shapes: the CSV importers parse it
+with ``dayfirst=True`` and write ``date.isoformat()``, ``guardar`` writes
+``date.isoformat()``, editing a record wrote ``datetime.now().isoformat()``
+when the field was empty, and the column default is ``CURRENT_TIMESTAMP``
+(``'YYYY-MM-DD HH:MM:SS'``). Mixed values compare wrongly as text and
+``date(count_date)`` in a WHERE clause cannot use an index.
+
+``ensure_count_dates`` rewrites the existing rows of ``inventory_count`` and
+``consolidado_csv`` once, adds triggers that normalize whatever the writers
+store from then on (ISO with time, ``DD/MM/YYYY``, ``DD-MM-YYYY``, NULL ->
+today) and creates the index ``(count_date, deposit_id)``. "Today" is the
+local date on both paths: ``date.today()`` in Python, and
+``date('now', 'localtime')`` in the triggers, also for the column default
+``CURRENT_TIMESTAMP``, which is UTC. A count saved late in the evening
+therefore gets the same date whether the app, a Script or a DB browser
+wrote it. Timestamps with a UTC offset are converted to local time before
+their date is taken. Date-range
+filters are then plain ``count_date >= ? AND count_date < ?`` range scans
+(see ``count_filters.build_count_where``).
+"""
+import logging
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+DATE_TABLES = ("inventory_count", "consolidado_csv")
+
+_ISO_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]"
+
+# SQL version of normalize_count_date for the triggers (they cannot call Python)
+_NORMALIZED_SQL = f"""CASE
+        WHEN NEW.count_date IS NULL OR TRIM(NEW.count_date) = '' THEN date('now', 'localtime')
+        -- the column default (CURRENT_TIMESTAMP, UTC; 'now' is the same within the statement)
+        WHEN NEW.count_date = CURRENT_TIMESTAMP THEN date('now', 'localtime')
+        WHEN NEW.count_date GLOB '{_ISO_GLOB}*' THEN substr(NEW.count_date, 1, 10)
+        WHEN NEW.count_date GLOB '[0-9][0-9][0-9][0-9]/[0-9][0-9]/[0-9][0-9]*'
+            THEN replace(substr(NEW.count_date, 1, 10), '/', '-')
+        WHEN NEW.count_date GLOB '[0-9][0-9][/-][0-9][0-9][/-][0-9][0-9][0-9][0-9]*'
+            THEN substr(NEW.count_date, 7, 4) || '-' || substr(NEW.count_date, 4, 2) || '-' || substr(NEW.count_date, 1, 2)
+        ELSE NEW.count_date END"""
+
+# replaced on every start (DROP first): an older version may be installed
+_DATE_TRIGGERS = f"""
+DROP TRIGGER IF EXISTS trg_{{t}}_count_date_ins;
+DROP TRIGGER IF EXISTS trg_{{t}}_count_date_upd;
+CREATE TRIGGER IF NOT EXISTS trg_{{t}}_count_date_ins AFTER INSERT ON {{t}}
+WHEN NEW.count_date IS NULL OR NEW.count_date NOT GLOB '{_ISO_GLOB}' OR typeof(NEW.count_date) <> 'text'
+BEGIN
+    UPDATE {{t}} SET count_date = {_NORMALIZED_SQL} WHERE rowid = NEW.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_{{t}}_count_date_upd AFTER UPDATE OF count_date ON {{t}}
+WHEN NEW.count_date IS NULL OR NEW.count_date NOT GLOB '{_ISO_GLOB}' OR typeof(NEW.count_date) <> 'text'
+BEGIN
+    UPDATE {{t}} SET count_date = {_NORMALIZED_SQL} WHERE rowid = NEW.rowid;
+END;
+"""
+
+_DATE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_ic_date_deposit ON inventory_count (count_date, deposit_id)",
+    # superseded by the composite index above (same leading column)
+    "DROP INDEX IF EXISTS idx_ic_count_date",
+)
+
+_FORMATS = ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y/%m/%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y")
+
+_ensured = set()
+_ensured_lock = threading.Lock()
+
+
+def _local_date(dt):
+    # with an offset ('...Z', '+00:00'): the local date of that instant, like date('now', 'localtime')
+    return (dt.astimezone() if dt.tzinfo is not None else dt).date()
+
+
+def normalize_count_date(value):
+    """date / datetime / text -> local 'YYYY-MM-DD'; empty -> today. Raises ValueError if unparseable."""
+    if isinstance(value, datetime):
+        return _local_date(value).isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    text = str(value).strip() if value is not None else ""
+    if not text:
+        return date.today().isoformat()
+    try:
+        # ISO with time, fractions or offset ('2026-02-16T10:05:33.123456')
+        return _local_date(datetime.fromisoformat(text)).isoformat()
+    except ValueError:
+        pass
+    for fmt in _FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha inválida: {text}")
+
+
+def _normalize_or_keep(value):
+    try:
+        return normalize_count_date(value)
+    except ValueError:
+        return value
+
+
+def ensure_count_dates(db_path):
+    """Normalize stored count dates and install the triggers and index (once per database and process)."""
+    key = os.path.abspath(db_path)
+    with _ensured_lock:
+        if key in _ensured:
+            return True
+        try:
+            conn = sqlite3.connect(db_path)
+            try:
+                conn.create_function("normalize_count_date", 1, _normalize_or_keep, deterministic=True)
+                fixed = 0
+                for t in DATE_TABLES:
+                    cols = {r[1] for r in conn.execute(f"PRAGMA table_info({t})")}
+                    if "count_date" not in cols:
+                        continue
+                    cur = conn.execute(f"""
+                        UPDATE {t} SET count_date = normalize_count_date(count_date)
+                         WHERE count_date IS NULL OR count_date NOT GLOB '{_ISO_GLOB}' OR typeof(count_date) <> 'text'""")
+                    fixed += max(cur.rowcount, 0)
+                    conn.executescript(_DATE_TRIGGERS.format(t=t))
+                for ddl in _DATE_INDEXES:
+                    conn.execute(ddl)
+                if fixed:
+                    logger.info("count_dates: normalized %d count dates", fixed)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            logger.exception("count_dates: could not normalize count dates in %s", db_path)
+            return False
+        _ensured.add(key)
+        return True
@@ -0,0 +1,118 @@
+"""Filter criteria for inventory_count views.
+
+``build_count_where`` turns the criteria of the registros filter bar into
+one parameterized WHERE clause written so that SQLite can use the indexes
+created by ``ensure_count_filter_indexes``:
+
+* code: exact match, or a prefix as a half-open range (``>= ? AND < ?``)
+  instead of LIKE, which cannot use the index;
+* counter / deposit / rack / date range: equality and range terms that
+  match the composite indexes ``(counter_name, count_date)``,
+  ``(deposit_id, rack_id, count_date)`` and ``(count_date, deposit_id)``
+  (dates are stored as ``YYYY-MM-DD``, see ``count_dates``);
+* |difference| > X: ``difference > X OR difference < -X`` so both halves
+  can use the index on ``difference``;
+* remarks present: ``remarks <> ''``, which is the condition of a partial
+  index over the rows that have a comment.
+
+Criteria keys (all optional): code, code_exact, counter, deposit_id,
+rack_id, date_from, date_to (``YYYY-MM-DD``, both inclusive), with_remarks,
+min_abs_diff.
+"""
+import sqlite3
+from datetime import date, datetime, timedelta
+
+_COUNT_INDEXES = (
+    ("idx_ic_counter_date", "CREATE INDEX IF NOT EXISTS idx_ic_counter_date ON inventory_count (counter_name, count_date)"),
+    ("idx_ic_dep_rack_date", "CREATE INDEX IF NOT EXISTS idx_ic_dep_rack_date ON inventory_count (deposit_id, rack_id, count_date)"),
+    ("idx_ic_date_deposit", "CREATE INDEX IF NOT EXISTS idx_ic_date_deposit ON inventory_count (count_date, deposit_id)"),
+    ("idx_ic_difference", "CREATE INDEX IF NOT EXISTS idx_ic_difference ON inventory_count (difference)"),
+    ("idx_ic_remarks", "CREATE INDEX IF NOT EXISTS idx_ic_remarks ON inventory_count (count_date) WHERE remarks <> ''"),
+)
+
+
+def ensure_count_filter_indexes(db_name):
+    """Create the filter indexes; refresh planner statistics when any was new."""
+    try:
+        conn = sqlite3.connect(db_name)
+        existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        created = False
+        for name, ddl in _COUNT_INDEXES:
+            if name not in existing:
+                conn.execute(ddl)
+                created = True
+        if created:
+            conn.execute("ANALYZE inventory_count")
+        conn.commit()
+        conn.close()
+    except Exception:
+        pass
+
+
+def parse_filter_date(text):
+    """'YYYY-MM-DD' (or DD/MM/YYYY) -> date; '' -> None; raises ValueError otherwise."""
+    text = (text or "").strip()
+    if not text:
+        return None
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha inválida: {text}")
+
+
+def build_count_where(criteria, alias="c"):
+    """Return (where_sql, params) for ``criteria``; where_sql is '' when nothing is set."""
+    p = f"{alias}." if alias else ""
+    terms = []
+    params = []
+    code = (criteria.get("code") or "").strip()
+    if code:
+        if criteria.get("code_exact"):
+            terms.append(f"{p}code_item = ?")
+            params.append(code)
+        else:
+            terms.append(f"{p}code_item >= ? AND {p}code_item < ?")
+            params.extend([code, code + "\uffff"])
+    counter = criteria.get("counter")
+    if counter:
+        terms.append(f"{p}counter_name = ?")
+        params.append(counter)
+    if criteria.get("deposit_id") is not None:
+        terms.append(f"{p}deposit_id = ?")
+        params.append(criteria["deposit_id"])
+    if criteria.get("rack_id") is not None:
+        terms.append(f"{p}rack_id = ?")
+        params.append(criteria["rack_id"])
+    date_from = criteria.get("date_from")
+    if date_from:
+        terms.append(f"{p}count_date >= ?")
+        params.append(date_from.isoformat() if isinstance(date_from, date) else str(date_from))
+    date_to = criteria.get("date_to")
+    if date_to:
+        # exclusive upper bound on the next day also keeps 'YYYY-MM-DDTHH:MM' values of that day
+        if not isinstance(date_to, date):
+            date_to = parse_filter_date(str(date_to))
+        terms.append(f"{p}count_date < ?")
+        params.append((date_to + timedelta(days=1)).isoformat())
+    if criteria.get("with_remarks"):
+        terms.append(f"{p}remarks <> ''")
+    min_abs_diff = criteria.get("min_abs_diff")
+    if min_abs_diff is not None:
+        terms.append(f"({p}difference > ? OR {p}difference < ?)")
+        params.extend([min_abs_diff, -min_abs_diff])
+    return " AND ".join(terms), tuple(params)
+
+
+def date_range_label(date_from=None, date_to=None):
+    """'Del 2026-01-01 al 2026-01-31' style caption for report titles ('' when no range)."""
+    def _txt(d):
+        return d.isoformat() if isinstance(d, date) else str(d)
+    if date_from and date_to:
+        return f"Del {_txt(date_from)} al {_txt(date_to)}"
+    if date_from:
+        return f"Desde {_txt(date_from)}"
+    if date_to:
+        return f"Hasta {_txt(date_to)}"
+    return ""
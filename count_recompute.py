@@ -0,0 +1,127 @@
+"""Recompute the stock snapshot stored on count rows.
+
+``guardar`` copies ``items.current_inventory`` into each ``inventory_count``
+row and stores ``difference = total - current_inventory``. When new stock
+levels are loaded those columns go stale. Instead of patching them by hand
+(``Scripts/diferencias_por_items_*_update.sql``) the stock update goes
+through a staging table:
+
+1. ``stage_stock_levels`` loads the (code, stock) pairs into the temp table
+   ``stock_levels``, resolved to ``item_id`` by exact code and then without
+   leading zeros, like ``find_item``;
+2. ``apply_stock_levels`` updates ``items`` from it in one statement and
+   keeps the ids of the items whose stock really changed in the temp table
+   ``changed_items``;
+3. ``recompute_counts`` updates, in one ``UPDATE ... FROM``, only the count
+   rows of those items whose stored values differ.
+
+``recompute_counts(conn, all_items=True)`` re-syncs every row (after
+importing a catalog or running old SQL scripts).
+
+The view ``inventory_count_live`` (created by ``db_schema.ensure_schema``)
+has the same columns as ``inventory_count`` but computes
+``current_inventory`` and ``difference`` from ``items``. With the
+environment variable ``INVENTARIO_LIVE_COUNTS=1`` the registros window, the
+count report and the Excel export read ``COUNT_SOURCE`` (the view) instead
+of the table, so they never show a stale snapshot; by default they read the
+stored values.
+"""
+import os
+
+# Fuente de los lectores de conteos: la tabla (valores guardados) o la vista viva (opt-in)
+LIVE_COUNTS = os.environ.get("INVENTARIO_LIVE_COUNTS", "").strip().lower() in ("1", "true", "yes", "si", "sí")
+COUNT_SOURCE = "inventory_count_live" if LIVE_COUNTS else "inventory_count"
+
+_STAGING_SCHEMA = """
+CREATE TEMP TABLE IF NOT EXISTS stock_levels (
+    code_item TEXT PRIMARY KEY,
+    current_inventory INTEGER NOT NULL,
+    item_id INTEGER
+);
+CREATE TEMP TABLE IF NOT EXISTS changed_items (
+    item_id INTEGER PRIMARY KEY
+);
+CREATE INDEX IF NOT EXISTS temp.idx_stock_levels_item ON stock_levels (item_id);
+DELETE FROM stock_levels;
+DELETE FROM changed_items;
+"""
+
+_LIVE_VIEW = """
+CREATE VIEW IF NOT EXISTS inventory_count_live AS
+SELECT ic.id, ic.counter_name, ic.code_item, ic.magazijn, ic.winkel, ic.total,
+       COALESCE(i.current_inventory, ic.current_inventory) AS current_inventory,
+       CASE WHEN i.item_id IS NULL THEN ic.difference
+            ELSE ic.total - i.current_inventory END AS difference,
+       ic.count_date, ic.location, ic.deposit_id, ic.rack_id,
+       ic.boxqty, ic.boxunitqty, ic.boxunittotal, ic.remarks,
+       ic.item_id, ic.location_id
+  FROM inventory_count ic
+  LEFT JOIN items i ON i.item_id = ic.item_id
+"""
+
+
+def stage_stock_levels(conn, rows):
+    """Load ``rows`` of (code_item, current_inventory) into ``stock_levels``.
+
+    The last value wins for repeated codes; when two codes resolve to the
+    same item ('0123' and '123') the one equal to the item code wins.
+    Returns the list of codes that match no item.
+    """
+    conn.executescript(_STAGING_SCHEMA)
+    conn.executemany(
+        "INSERT OR REPLACE INTO stock_levels (code_item, current_inventory) VALUES (?, ?)",
+        ((str(code).strip(), int(qty)) for code, qty in rows if str(code).strip()))
+    conn.execute("""
+        UPDATE stock_levels SET item_id = COALESCE(
+            (SELECT item_id FROM items WHERE code_item = stock_levels.code_item),
+            (SELECT item_id FROM items WHERE code_item = LTRIM(stock_levels.code_item, '0')))""")
+    # one pass: a correlated subquery per row would scan stock_levels once per row
+    conn.execute("""
+        DELETE FROM stock_levels
+         WHERE rowid IN (
+               SELECT rowid FROM (
+                      SELECT s.rowid,
+                             ROW_NUMBER() OVER (
+                                 PARTITION BY s.item_id
+                                 ORDER BY EXISTS (SELECT 1 FROM items i WHERE i.code_item = s.code_item) DESC,
+                                          s.rowid DESC) AS rn
+                        FROM stock_levels s
+                       WHERE s.item_id IS NOT NULL)
+                WHERE rn > 1)""")
+    return [r[0] for r in conn.execute("SELECT code_item FROM stock_levels WHERE item_id IS NULL ORDER BY code_item")]
+
+
+def apply_stock_levels(conn):
+    """Update ``items`` from ``stock_levels``. Returns (matched, changed) item counts."""
+    matched = conn.execute("SELECT COUNT(*) FROM stock_levels WHERE item_id IS NOT NULL").fetchone()[0]
+    changed = conn.execute("""
+        UPDATE items SET current_inventory = s.current_inventory
+          FROM stock_levels s
+         WHERE items.item_id = s.item_id
+           AND items.current_inventory IS NOT s.current_inventory
+        RETURNING items.item_id""").fetchall()
+    conn.executemany("INSERT OR IGNORE INTO changed_items (item_id) VALUES (?)", changed)
+    return matched, len(changed)
+
+
+def recompute_counts(conn, all_items=False):
+    """Refresh ``current_inventory``/``difference`` on count rows. Returns the rows updated.
+
+    By default only the rows of ``changed_items`` are touched; ``all_items``
+    checks every linked row. Does not commit.
+    """
+    source = "items" if all_items else "items JOIN changed_items USING (item_id)"
+    cur = conn.execute(f"""
+        UPDATE inventory_count
+           SET current_inventory = i.current_inventory,
+               difference = inventory_count.total - i.current_inventory
+          FROM (SELECT items.item_id, items.current_inventory FROM {source}) i
+         WHERE inventory_count.item_id = i.item_id
+           AND (inventory_count.current_inventory IS NOT i.current_inventory
+                OR inventory_count.difference IS NOT inventory_count.total - i.current_inventory)""")
+    return cur.rowcount
+
+
+def ensure_live_view(conn):
+    """Create ``inventory_count_live`` (needs the item_id and location_id columns)."""
+    conn.execute(_LIVE_VIEW)
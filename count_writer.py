@@ -0,0 +1,262 @@
+"""Write-behind queue for the rows saved with Guardar.
+
+Guardar used to open a connection, insert a single row into
+``inventory_count`` and commit (one disk sync) on every press. ``CountWriter``
+takes the record from the UI thread, appends it to a small journal file and
+hands it to a background thread that inserts queued records in batches: one
+transaction every ``flush_ms`` milliseconds or every ``max_batch`` records,
+whichever comes first.
+
+The journal is an append-only JSON-lines file next to the database; each
+entry is fsynced before ``submit`` returns, so a record Guardar reported
+as saved survives a power loss, not only a crash of the application. Every
+entry carries a sequence number and the writer stores the last committed
+sequence in ``count_writer_state`` inside the same transaction as the rows,
+so on startup only the entries that never reached the database are replayed.
+The journal is truncated each time the queue drains.
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Columns written for every record, in INSERT order
+COUNT_COLUMNS = (
+    "counter_name", "code_item", "magazijn", "winkel", "total",
+    "current_inventory", "difference", "count_date", "location",
+    "deposit_id", "rack_id", "boxqty", "boxunitqty", "boxunittotal", "remarks",
+    "item_id",
+)
+
+_INSERT_SQL = "INSERT INTO inventory_count ({}) VALUES ({})".format(
+    ", ".join(COUNT_COLUMNS), ", ".join("?" for _ in COUNT_COLUMNS))
+
+# Sentinels placed on the queue to wake the writer thread
+_FLUSH = object()
+_STOP = object()
+
+
+def _ensure_state_table(conn):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS count_writer_state ("
+        "id INTEGER PRIMARY KEY CHECK (id = 1), last_seq INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO count_writer_state (id, last_seq) VALUES (1, 0)")
+
+
+class CountWriter:
+    """Batching writer for ``inventory_count`` inserts.
+
+    ``submit`` never touches the database; it only appends to the journal
+    and returns. ``flush`` forces the pending records to be committed now
+    and waits for them (used before reading ``inventory_count``), ``stop``
+    drains the queue and ends the thread (used when the window closes).
+    """
+
+    def __init__(self, db_path, journal_path=None, flush_ms=500, max_batch=50):
+        self.db_path = db_path
+        self.journal_path = journal_path or (os.path.splitext(db_path)[0] + "-guardar.jsonl")
+        self.flush_s = max(flush_ms, 1) / 1000.0
+        self.max_batch = max(int(max_batch), 1)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._committed = threading.Condition(self._lock)
+        self._journal = None
+        self._seq = 0
+        self._committed_seq = 0
+        self._thread = None
+        self.last_error = None
+
+    # --- public API (UI thread) ---
+
+    def start(self):
+        """Replay uncommitted journal entries and start the writer thread."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            _ensure_state_table(conn)
+            conn.commit()
+            last_seq = conn.execute("SELECT last_seq FROM count_writer_state WHERE id = 1").fetchone()[0]
+        finally:
+            conn.close()
+
+        replay = []
+        for seq, record in self._read_journal():
+            if seq > last_seq:
+                replay.append((seq, record))
+        self._seq = max([last_seq] + [s for s, _ in replay])
+        self._committed_seq = last_seq
+        # Rewrite the journal with only the entries still pending (to a temp file first: a crash
+        # while rewriting must not lose them)
+        tmp = self.journal_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            for seq, record in replay:
+                fh.write(json.dumps({"seq": seq, "row": record}) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.journal_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        if replay:
+            logger.info("CountWriter: replaying %d journal entries from %s", len(replay), self.journal_path)
+        for item in replay:
+            self._queue.put(item)
+
+        self._thread = threading.Thread(target=self._run, name="CountWriter", daemon=True)
+        self._thread.start()
+        return len(replay)
+
+    def submit(self, record):
+        """Queue one record (dict with ``COUNT_COLUMNS`` keys). Returns its sequence."""
+        row = {c: record.get(c) for c in COUNT_COLUMNS}
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._journal.write(json.dumps({"seq": seq, "row": row}) + "\n")
+            # to the OS and to disk before Guardar says it was saved: it survives a crash or a power loss
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        self._queue.put((seq, row))
+        return seq
+
+    @property
+    def pending(self):
+        with self._lock:
+            return self._seq - self._committed_seq
+
+    def flush(self, timeout=10.0):
+        """Commit everything submitted so far. Returns True when nothing is pending.
+
+        False (logged as an error) means records are still only in the
+        journal: the writer thread is not running or keeps failing
+        (``last_error``). They are replayed on the next ``start``.
+        """
+        with self._lock:
+            target = self._seq
+            if self._committed_seq >= target:
+                return True
+        if self._thread is None or not self._thread.is_alive():
+            logger.error("CountWriter: writer thread not running, %d records pending in %s (last error: %r)",
+                         self.pending, self.journal_path, self.last_error)
+            return False
+        self._queue.put(_FLUSH)
+        deadline = time.monotonic() + timeout
+        with self._committed:
+            while self._committed_seq < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.error("CountWriter: flush timed out with %d pending (last error: %r)",
+                                 target - self._committed_seq, self.last_error)
+                    return False
+                self._committed.wait(remaining)
+        return True
+
+    def stop(self, timeout=10.0):
+        """Commit the pending records and end the writer thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        with self._lock:
+            if self._journal is not None:
+                try:
+                    self._journal.close()
+                except Exception:
+                    pass
+                self._journal = None
+        return self.pending == 0
+
+    # --- writer thread ---
+
+    def _read_journal(self):
+        entries = []
+        if not os.path.exists(self.journal_path):
+            return entries
+        with open(self.journal_path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    obj = json.loads(line)
+                    entries.append((int(obj["seq"]), obj["row"]))
+                except Exception:
+                    # a torn last line after a crash; everything before it is intact
+                    logger.warning("CountWriter: ignoring unreadable journal line: %r", line[:80])
+        return entries
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path)
+        batch = []
+        stopping = False
+        try:
+            while True:
+                if not batch:
+                    item = self._queue.get()
+                    if item is _STOP:
+                        stopping = True
+                    elif item is not _FLUSH:
+                        batch.append(item)
+                    deadline = time.monotonic() + self.flush_s
+                    # keep collecting until the batch is full, the interval
+                    # elapses or somebody asks for a flush
+                    while batch and not stopping and len(batch) < self.max_batch:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        try:
+                            item = self._queue.get(timeout=remaining)
+                        except queue.Empty:
+                            break
+                        if item is _STOP:
+                            stopping = True
+                        elif item is _FLUSH:
+                            break
+                        else:
+                            batch.append(item)
+                if stopping:
+                    # drain whatever is still queued
+                    while True:
+                        try:
+                            item = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is not _STOP and item is not _FLUSH:
+                            batch.append(item)
+                if batch:
+                    try:
+                        self._commit(conn, batch)
+                        batch = []
+                    except Exception as e:
+                        self.last_error = e
+                        logger.exception("CountWriter: error committing %d records", len(batch))
+                        if stopping:
+                            # leave them in the journal, they are replayed on next start
+                            break
+                        time.sleep(min(self.flush_s * 4, 2.0))
+                        continue
+                if stopping:
+                    break
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _commit(self, conn, batch):
+        last_seq = max(seq for seq, _ in batch)
+        with conn:
+            conn.executemany(_INSERT_SQL, [tuple(row.get(c) for c in COUNT_COLUMNS) for _, row in batch])
+            conn.execute("UPDATE count_writer_state SET last_seq = ? WHERE id = 1 AND last_seq < ?", (last_seq, last_seq))
+        with self._committed:
+            self._committed_seq = max(self._committed_seq, last_seq)
+            if self._committed_seq >= self._seq and self._journal is not None:
+                # queue drained: nothing in the journal is needed any more
+                try:
+                    self._journal.seek(0)
+                    self._journal.truncate()
+                except Exception:
+                    logger.exception("CountWriter: could not truncate journal")
+            self._committed.notify_all()
+        logger.debug("CountWriter: committed %d records (last seq %d)", len(batch), last_seq)
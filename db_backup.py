@@ -0,0 +1,230 @@
+"""Online snapshots of the database, with rotation and restore.
+
+``snapshot`` copies the live database with ``sqlite3.Connection.backup`` in
+one step (``pages=-1``) under a read lock, run it off the UI thread. A copy
+in small steps restarts whenever another connection commits, and with
+``CountWriter`` committing every 500 ms during a count a large database
+would never finish copying; writers instead wait on their busy timeout for
+the one step. The copy is checked with ``quick_check`` and stored
+gzip-compressed as ``backups/snapshots/<db>_<YYYYmmdd_HHMMSS>_<kind>.db.gz``.
+
+Kinds and rotation (``rotate``):
+
+* ``auto``: periodic snapshots; the newest per hour is kept for the last
+  ``keep_hourly`` hours and the newest per day for the last ``keep_daily``
+  days;
+* ``pre-<action>``: taken automatically before a destructive admin action
+  (catalog import, stock update, clearing inventory_count_res, restore);
+  the last ``keep_pre`` are kept;
+* ``manual``: never deleted.
+
+Command line::
+
+    python db_backup.py snapshot [--db inventariovlm.db]
+    python db_backup.py list [--db inventariovlm.db]
+    python db_backup.py restore <snapshot.db.gz> [--db inventariovlm.db]
+
+``restore`` snapshots the current database (``pre-restore``) and then
+copies the snapshot over it with the backup API, so it also works while
+the application has the file open. Then ``db_schema.invalidate`` drops
+what the process built from the old contents and re-applies the
+migrations.
+"""
+import argparse
+import gzip
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from db_schema import invalidate
+
+logger = logging.getLogger(__name__)
+
+_NAME_RE = re.compile(r"^(?P<db>.+)_(?P<ts>\d{8}_\d{6})_(?P<kind>[A-Za-z0-9-]+)\.db\.gz$")
+
+
+def snapshot_dir(db_path):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "backups", "snapshots")
+
+
+def _copy_db(src_path, dst_path, pages, progress):
+    src = sqlite3.connect(src_path, timeout=30)
+    dst = sqlite3.connect(dst_path)
+    try:
+        src.backup(dst, pages=pages, progress=progress)
+        problems = [r[0] for r in dst.execute("PRAGMA quick_check")]
+        if problems != ["ok"]:
+            raise sqlite3.DatabaseError("quick_check: " + "; ".join(problems[:10]))
+    finally:
+        dst.close()
+        src.close()
+
+
+def snapshot(db_path, kind="manual", dest_dir=None, pages=-1, progress=None):
+    """Write a compressed, checked copy of ``db_path``. Returns the snapshot path.
+
+    ``progress(status, remaining, total)`` is called after every step of the
+    copy (one with the default ``pages=-1``); compression follows.
+    """
+    if not re.fullmatch(r"[A-Za-z0-9-]+", kind):
+        raise ValueError(f"invalid snapshot kind: {kind!r}")
+    dest_dir = dest_dir or snapshot_dir(db_path)
+    os.makedirs(dest_dir, exist_ok=True)
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    path = os.path.join(dest_dir, f"{base}_{datetime.now():%Y%m%d_%H%M%S}_{kind}.db.gz")
+    fd, tmp = tempfile.mkstemp(suffix=".db", dir=dest_dir)
+    os.close(fd)
+    try:
+        _copy_db(db_path, tmp, pages, progress)
+        with open(tmp, "rb") as fin, gzip.open(path + ".part", "wb", compresslevel=6) as fout:
+            shutil.copyfileobj(fin, fout, 1024 * 1024)
+        os.replace(path + ".part", path)
+    finally:
+        for leftover in (tmp, path + ".part"):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+    logger.info("db_backup: snapshot %s (%d bytes)", path, os.path.getsize(path))
+    return path
+
+
+def list_snapshots(db_path, dest_dir=None):
+    """[(datetime, kind, path)] of the snapshots of ``db_path``, oldest first."""
+    dest_dir = dest_dir or snapshot_dir(db_path)
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    found = []
+    try:
+        names = os.listdir(dest_dir)
+    except OSError:
+        return found
+    for name in names:
+        m = _NAME_RE.match(name)
+        if not m or m.group("db") != base:
+            continue
+        found.append((datetime.strptime(m.group("ts"), "%Y%m%d_%H%M%S"), m.group("kind"), os.path.join(dest_dir, name)))
+    return sorted(found)
+
+
+def rotate(db_path, dest_dir=None, keep_hourly=24, keep_daily=14, keep_pre=10, now=None):
+    """Delete the snapshots the rotation policy no longer keeps. Returns the deleted paths."""
+    now = now or datetime.now()
+    snaps = list_snapshots(db_path, dest_dir)
+    keep = set()
+    # newest first, so the first snapshot seen in each bucket is the one kept
+    hours, days = set(), set()
+    for ts, kind, path in reversed(snaps):
+        if kind == "auto":
+            hour = ts.strftime("%Y%m%d%H")
+            day = ts.strftime("%Y%m%d")
+            if ts >= now - timedelta(hours=keep_hourly) and hour not in hours:
+                hours.add(hour)
+                keep.add(path)
+            if ts >= now - timedelta(days=keep_daily) and day not in days:
+                days.add(day)
+                keep.add(path)
+        elif kind.startswith("pre-"):
+            pass
+        else:
+            keep.add(path)
+    pre = [path for ts, kind, path in snaps if kind.startswith("pre-")]
+    keep.update(pre[-keep_pre:] if keep_pre > 0 else [])
+    deleted = []
+    for ts, kind, path in snaps:
+        if path not in keep:
+            try:
+                os.remove(path)
+                deleted.append(path)
+            except OSError:
+                logger.warning("db_backup: could not delete %s", path)
+    return deleted
+
+
+def snapshot_before(db_path, action, progress=None):
+    """Snapshot taken before a destructive action (``pre-<action>``), then rotate.
+
+    Returns the path, or None if the snapshot failed (the error is logged).
+    """
+    try:
+        path = snapshot(db_path, kind=f"pre-{action}", progress=progress)
+    except Exception:
+        logger.exception("db_backup: snapshot before %s failed", action)
+        return None
+    try:
+        rotate(db_path)
+    except Exception:
+        logger.exception("db_backup: rotation failed")
+    return path
+
+
+def restore(snapshot_path, db_path, pages=-1):
+    """Replace the contents of ``db_path`` with ``snapshot_path`` (.db.gz or .db).
+
+    The current database is snapshotted first (``pre-restore``). Returns the
+    path of that safety snapshot.
+    """
+    fd, tmp = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        opener = gzip.open if snapshot_path.endswith(".gz") else open
+        with opener(snapshot_path, "rb") as fin, open(tmp, "wb") as fout:
+            shutil.copyfileobj(fin, fout, 1024 * 1024)
+        conn = sqlite3.connect(tmp)
+        try:
+            problems = [r[0] for r in conn.execute("PRAGMA quick_check")]
+        finally:
+            conn.close()
+        if problems != ["ok"]:
+            raise sqlite3.DatabaseError(f"{snapshot_path} is damaged: " + "; ".join(problems[:10]))
+        safety = snapshot(db_path, kind="pre-restore") if os.path.exists(db_path) else None
+        _copy_db(tmp, db_path, pages, None)
+        # other contents, maybe an older schema: migrations, reference data and cached results again
+        # (also a new report cache epoch: the counters went back)
+        invalidate(db_path)
+    finally:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    logger.info("db_backup: restored %s from %s", db_path, snapshot_path)
+    return safety
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshots de la base de datos (backup en línea, rotación y restauración)")
+    parser.add_argument("--db", default="inventariovlm.db", help="ruta de la base de datos")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_snap = sub.add_parser("snapshot", help="crear un snapshot comprimido")
+    p_snap.add_argument("--kind", default="manual", help="manual (por defecto), auto o pre-<accion>")
+    sub.add_parser("list", help="listar snapshots")
+    sub.add_parser("rotate", help="aplicar la política de rotación")
+    p_restore = sub.add_parser("restore", help="restaurar un snapshot sobre la base de datos")
+    p_restore.add_argument("snapshot")
+    args = parser.parse_args(argv)
+
+    if args.command == "snapshot":
+        print(snapshot(args.db, kind=args.kind))
+        if args.kind == "auto" or args.kind.startswith("pre-"):
+            rotate(args.db)
+    elif args.command == "list":
+        for ts, kind, path in list_snapshots(args.db):
+            print(f"{ts:%Y-%m-%d %H:%M:%S}  {kind:<20}  {os.path.getsize(path):>10}  {path}")
+    elif args.command == "rotate":
+        for path in rotate(args.db):
+            print("deleted", path)
+    elif args.command == "restore":
+        safety = restore(args.snapshot, args.db)
+        print(f"Restaurado {args.db} desde {args.snapshot}")
+        if safety:
+            print(f"Estado anterior guardado en {safety}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
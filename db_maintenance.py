@@ -0,0 +1,180 @@
+"""Background database maintenance.
+
+The database gets bulk deletes and rewrites (clearing ``inventory_count_res``,
+catalog and stock imports, the restart scripts) but nothing refreshed the
+planner statistics or gave free pages back. ``MaintenanceService`` does it
+on its own thread so the UI never waits:
+
+* at start: ``PRAGMA quick_check`` and read the ``auto_vacuum`` mode;
+* ``request_analyze()`` after a bulk import: ``ANALYZE`` a few seconds later
+  (several requests in a row run it once);
+* ``idle()`` when the user is not working: ``PRAGMA incremental_vacuum`` on
+  a bounded number of free pages. A file not yet in ``auto_vacuum =
+  INCREMENTAL`` is converted first, which takes one full ``VACUUM``: it
+  holds an exclusive lock for the whole rewrite, so it is never run at
+  start (the user is saving then) and is skipped, until the next idle
+  period, when the lock is not free within ``VACUUM_LOCK_MS``;
+* ``stop()`` on exit: ``PRAGMA optimize``.
+
+Every task that did something appends one line to the maintenance log
+(``<db>-maintenance.log``): time, task, ok/error, duration and detail.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# how long the auto_vacuum conversion waits for the database to be free
+VACUUM_LOCK_MS = 1000
+
+
+class MaintenanceService:
+    """Runs SQLite maintenance tasks for ``db_path`` on a daemon thread."""
+
+    def __init__(self, db_path, log_path=None, analyze_delay_s=5.0, vacuum_pages=500):
+        self.db_path = db_path
+        self.log_path = log_path or (os.path.splitext(db_path)[0] + "-maintenance.log")
+        self.analyze_delay_s = analyze_delay_s
+        self.vacuum_pages = max(int(vacuum_pages), 1)
+        self._queue = queue.Queue()
+        self._log_lock = threading.Lock()
+        self._analyze_at = None
+        self._thread = None
+        self.last_check = None
+        self.auto_vacuum = None  # PRAGMA auto_vacuum of the file (2 = incremental), read at start
+
+    # --- public API (UI thread) ---
+
+    def start(self):
+        """Start the thread; it reads the auto_vacuum mode and runs quick_check."""
+        self._thread = threading.Thread(target=self._run, name="DbMaintenance", daemon=True)
+        self._thread.start()
+        self._queue.put(self._check_auto_vacuum)
+        self._queue.put(self._quick_check)
+
+    def request_analyze(self):
+        """Refresh the planner statistics shortly (call after bulk inserts/deletes)."""
+        self._queue.put("analyze")
+
+    def idle(self):
+        """Give free pages back to the file system while the user is idle (converting auto_vacuum once)."""
+        self._queue.put(self._idle_vacuum)
+
+    def stop(self, timeout=5.0):
+        """End the thread and run ``PRAGMA optimize`` (pending ANALYZE requests run first)."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        self._task("optimize", self._optimize)
+
+    # --- maintenance thread ---
+
+    def _run(self):
+        while True:
+            timeout = None
+            if self._analyze_at is not None:
+                timeout = max(self._analyze_at - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                if self._analyze_at is not None:
+                    self._task("analyze", self._analyze)
+                return
+            if item == "analyze":
+                self._analyze_at = time.monotonic() + self.analyze_delay_s
+            elif item is not None:
+                self._task(item.__name__.lstrip("_"), item)
+            if self._analyze_at is not None and time.monotonic() >= self._analyze_at:
+                self._analyze_at = None
+                self._task("analyze", self._analyze)
+
+    def _task(self, name, func):
+        start = time.monotonic()
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                status, detail = "ok", func(conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.exception("DbMaintenance: %s failed", name)
+            status, detail = "error", str(e)
+        # tasks that found nothing to do return None and are not logged
+        if detail is not None:
+            self._log(name, status, (time.monotonic() - start) * 1000, detail)
+        return status == "ok"
+
+    def _log(self, task, status, ms, detail):
+        line = f"{datetime.now().isoformat(timespec='seconds')}\t{task}\t{status}\t{ms:.0f} ms\t{detail}\n"
+        with self._log_lock:
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as fh:
+                    fh.write(line)
+            except OSError:
+                logger.warning("DbMaintenance: could not write %s", self.log_path)
+        logger.info("DbMaintenance: %s %s (%.0f ms) %s", task, status, ms, detail)
+
+    # --- tasks (each gets its own connection) ---
+
+    def _check_auto_vacuum(self, conn):
+        self.auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if self.auto_vacuum == 2:
+            return "auto_vacuum=incremental"
+        return f"auto_vacuum={self.auto_vacuum}, to be converted when idle"
+
+    def _idle_vacuum(self, conn):
+        if self.auto_vacuum != 2:
+            return self._convert_auto_vacuum(conn)
+        return self._incremental_vacuum(conn)
+
+    def _convert_auto_vacuum(self, conn):
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode == 2:
+            self.auto_vacuum = mode
+            return None
+        # the mode of an existing file only changes with a full VACUUM, which locks out every
+        # other connection until it ends: only if nobody is using the database right now
+        conn.execute(f"PRAGMA busy_timeout = {VACUUM_LOCK_MS}")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        try:
+            conn.execute("VACUUM")
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e) or "busy" in str(e):
+                return f"auto_vacuum {mode}: database in use, VACUUM postponed"
+            raise
+        self.auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        return f"auto_vacuum {mode} -> {self.auto_vacuum} (VACUUM)"
+
+    def _quick_check(self, conn):
+        rows = [r[0] for r in conn.execute("PRAGMA quick_check")]
+        self.last_check = rows
+        if rows != ["ok"]:
+            raise sqlite3.DatabaseError("quick_check: " + "; ".join(rows[:10]))
+        return "ok"
+
+    def _analyze(self, conn):
+        conn.execute("ANALYZE")
+        conn.commit()
+        return f"{conn.execute('SELECT COUNT(*) FROM sqlite_stat1').fetchone()[0]} stat rows"
+
+    def _incremental_vacuum(self, conn):
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free or conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return None
+        # executescript steps the pragma to the end; execute() would free a single page
+        conn.executescript(f"PRAGMA incremental_vacuum({self.vacuum_pages});")
+        return f"{free} -> {conn.execute('PRAGMA freelist_count').fetchone()[0]} free pages"
+
+    def _optimize(self, conn):
+        conn.execute("PRAGMA analysis_limit = 400")
+        conn.execute("PRAGMA optimize").fetchall()
+        return "done"
@@ -0,0 +1,83 @@
+"""Schema upgrades applied to an existing database before it is used.
+
+``ensure_schema(db_path)`` runs every idempotent migration once per
+database and process; call it before reading or writing the tables they
+touch (the main window does it at startup, the reports before querying).
+
+``invalidate(db_path)`` is for when the file's contents were replaced
+under the process (``db_backup.restore``). The snapshot may predate some
+migrations, so it forgets what was ensured or cached for that file: the
+migration memos, the reference data cache, the location resolver and the
+report cache. Then it runs ``ensure_schema`` again.
+"""
+import logging
+import os
+import sqlite3
+import sys
+import threading
+
+import count_dates
+import item_keys
+import locations
+import ref_cache
+import report_cache
+import report_delta
+from count_dates import ensure_count_dates
+from count_recompute import ensure_live_view
+from item_keys import ensure_item_keys
+from location_resolver import drop_location_resolver
+from locations import ensure_locations
+from ref_cache import drop_ref_cache, ensure_ref_data
+from report_cache import ensure_change_stamps, new_cache_epoch
+from report_delta import ensure_item_changes
+
+logger = logging.getLogger(__name__)
+
+_ensured = set()
+_ensured_lock = threading.Lock()
+
+
+def _ensure_views(db_path):
+    key = os.path.abspath(db_path)
+    with _ensured_lock:
+        if key in _ensured:
+            return True
+        try:
+            conn = sqlite3.connect(db_path)
+            try:
+                ensure_live_view(conn)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            logger.exception("db_schema: could not create views in %s", db_path)
+            return False
+        _ensured.add(key)
+        return True
+
+
+def ensure_schema(db_path):
+    """Apply the pending migrations. Returns False if any of them failed (details are logged)."""
+    ok = ensure_item_keys(db_path)
+    ok = ensure_locations(db_path) and ok
+    ok = ensure_count_dates(db_path) and ok
+    ok = ensure_change_stamps(db_path) and ok
+    ok = ensure_item_changes(db_path) and ok
+    ok = ensure_ref_data(db_path) and ok
+    if ok:
+        ok = _ensure_views(db_path)
+    return ok
+
+
+def invalidate(db_path):
+    """Forget the migrations and caches of ``db_path`` and apply the migrations again."""
+    key = os.path.abspath(db_path)
+    # every migration module memoizes the same way: _ensured (abspaths) under _ensured_lock
+    for module in (item_keys, locations, count_dates, report_cache, report_delta, ref_cache, sys.modules[__name__]):
+        with module._ensured_lock:
+            module._ensured.discard(key)
+    drop_location_resolver(db_path)
+    drop_ref_cache(db_path)
+    ok = ensure_schema(db_path)
+    new_cache_epoch(db_path)
+    return ok
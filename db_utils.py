@@ -1,5 +1,7 @@
 import sqlite3
 
+from ref_cache import get_ref_cache
+
 DB_NAME = 'inventariovlm.db'
 
 def obtener_deposits(db_name=DB_NAME):
@@ -23,28 +25,68 @@ def obtener_racks(deposit_nombre, db_name=DB_NAME):
     return racks
 
 def get_deposits(db_name=DB_NAME):
+    """[(deposit_id, deposit_description)] from the shared reference-data cache."""
     try:
-        conn = sqlite3.connect(db_name)
-        cur = conn.cursor()
-        cur.execute("SELECT deposit_id, deposit_description FROM deposits ORDER BY deposit_description")
-        deposits = cur.fetchall()
-        conn.close()
-        return deposits
+        return list(get_ref_cache(db_name).get().deposits)
     except Exception:
         return []
 
 def get_racks(db_name=DB_NAME):
-    def inner(deposit_id=None):
+    def inner(deposit_id=None, include_others=False):
+        # deposit_id=None -> every rack; otherwise the racks mapped in deposit_racks
+        # (all racks while the deposit has none), see RefData.racks_for_deposit
         try:
-            conn = sqlite3.connect(db_name)
-            cur = conn.cursor()
-            if deposit_id is not None:
-                cur.execute("SELECT rack_id, rack_description FROM racks WHERE deposit_id = ? ORDER BY rack_id", (deposit_id,))
-            else:
-                cur.execute("SELECT rack_id, rack_description FROM racks ORDER BY rack_id")
-            racks = cur.fetchall()
-            conn.close()
-            return racks
+            data = get_ref_cache(db_name).get()
+            if deposit_id is None:
+                return list(data.racks)
+            return data.racks_for_deposit(deposit_id, include_others)
         except Exception:
             return []
     return inner
+
+def get_counters(db_name=DB_NAME):
+    """Distinct counter names already used in inventory_count ('' for rows without one)."""
+    try:
+        return list(get_ref_cache(db_name).get().counters)
+    except Exception:
+        return []
+
+def load_item_catalog(db_name=DB_NAME):
+    """Load the items table once as {code_item: (description_item, current_inventory, item_id)}."""
+    try:
+        conn = sqlite3.connect(db_name)
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT code_item, description_item, current_inventory, item_id FROM items")
+        except sqlite3.OperationalError:
+            # items todavía sin migrar (ver item_keys)
+            cur.execute("SELECT code_item, description_item, current_inventory, NULL FROM items")
+        catalog = {str(code).strip(): (desc, inv or 0, item_id) for code, desc, inv, item_id in cur.fetchall() if code is not None}
+        conn.close()
+        return catalog
+    except Exception:
+        return {}
+
+def find_item(catalog, code):
+    """Look up a code in the catalog, retrying without leading zeros.
+
+    Returns (stored_code, (description_item, current_inventory, item_id)) or (None, None).
+    """
+    code = (code or "").strip()
+    if code in catalog:
+        return code, catalog[code]
+    alt = code.lstrip("0")
+    if alt and alt in catalog:
+        return alt, catalog[alt]
+    return None, None
+
+def ensure_resumen_indexes(db_name=DB_NAME):
+    """Indexes used by the Resumen viewer to seek on (sort column, id)."""
+    try:
+        conn = sqlite3.connect(db_name)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_icr_code_id ON inventory_count_res (code_item, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_icr_difference_id ON inventory_count_res (difference, id)")
+        conn.commit()
+        conn.close()
+    except Exception:
+        pass
@@ -0,0 +1,180 @@
+"""Integer surrogate key for items.
+
+``items`` had no primary key and every fact table (``inventory_count``,
+``consolidado_csv``, ``inventory_count_res``, ``sales``, ``purchasing``)
+joined to it on the text ``code_item``, whose padding is not consistent
+("0123" vs "123"). ``ensure_item_keys`` migrates the schema once:
+
+* ``items`` is rebuilt with ``item_id INTEGER PRIMARY KEY AUTOINCREMENT``
+  (ids of deleted items are never reused) and a unique ``code_item``; the
+  catalog import now upserts instead of replacing the table, so ids stay
+  stable across imports. Codes are trimmed, so two rows whose codes only
+  differ in spaces become one item (the first one); the rows left out, and
+  those without a code, are copied to ``items_dropped`` and logged, to be
+  checked by hand. The rebuild is one transaction: if it fails (e.g. a
+  user view over ``items`` breaks the rename) ``items`` is left as it was;
+* each fact table gets an indexed ``item_id`` column, backfilled by exact
+  code and then by the code without leading zeros, like ``find_item``;
+* a trigger per fact table fills ``item_id`` for rows inserted without it
+  (CSV importers, SQL scripts, old journal entries), and when ``code_item``
+  is edited.
+
+Guardar passes ``item_id`` from the cached catalog, so the trigger does no
+work for it. ``code_item`` stays in every table as the display code.
+"""
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+FACT_TABLES = ("inventory_count", "consolidado_csv", "inventory_count_res", "sales", "purchasing")
+
+# rows the rebuild leaves out: no code, or a code that repeats an earlier row once trimmed
+_DROPPED_ROWS = """
+SELECT rowid, code_item, description_item, current_inventory
+FROM items
+WHERE code_item IS NULL OR TRIM(code_item) = ''
+   OR rowid NOT IN (SELECT MIN(rowid) FROM items
+                     WHERE code_item IS NOT NULL AND TRIM(code_item) <> ''
+                     GROUP BY TRIM(code_item))
+ORDER BY rowid
+"""
+
+# one transaction: executescript runs each statement on its own, and a failure or a kill between the
+# DROP and the RENAME would leave no items table (_rebuild_items rolls back on error)
+_ITEMS_REBUILD = f"""
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS items_dropped (
+    code_item TEXT,
+    description_item TEXT,
+    current_inventory INTEGER,
+    dropped_at TEXT DEFAULT (datetime('now', 'localtime'))
+);
+INSERT INTO items_dropped (code_item, description_item, current_inventory)
+SELECT code_item, description_item, current_inventory FROM ({_DROPPED_ROWS});
+CREATE TABLE items_new (
+    item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    code_item TEXT NOT NULL UNIQUE,
+    description_item TEXT,
+    current_inventory INTEGER
+);
+INSERT OR IGNORE INTO items_new (code_item, description_item, current_inventory)
+SELECT TRIM(code_item), description_item, current_inventory
+FROM items
+WHERE code_item IS NOT NULL AND TRIM(code_item) <> ''
+ORDER BY rowid;
+DROP TABLE items;
+ALTER TABLE items_new RENAME TO items;
+COMMIT;
+"""
+
+_FACT_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS trg_{t}_item_id_ins AFTER INSERT ON {t}
+WHEN NEW.item_id IS NULL
+BEGIN
+    UPDATE {t} SET item_id = COALESCE(
+        (SELECT item_id FROM items WHERE code_item = NEW.code_item),
+        (SELECT item_id FROM items WHERE code_item = LTRIM(NEW.code_item, '0')))
+     WHERE rowid = NEW.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_{t}_item_id_upd AFTER UPDATE OF code_item ON {t}
+WHEN OLD.code_item IS NOT NEW.code_item
+BEGIN
+    UPDATE {t} SET item_id = COALESCE(
+        (SELECT item_id FROM items WHERE code_item = NEW.code_item),
+        (SELECT item_id FROM items WHERE code_item = LTRIM(NEW.code_item, '0')))
+     WHERE rowid = NEW.rowid;
+END;
+"""
+
+_ensured = set()
+_ensured_lock = threading.Lock()
+
+
+def _columns(conn, table):
+    return {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _rebuild_items(conn):
+    """Run ``_ITEMS_REBUILD`` (all or nothing) and log the rows it copied to ``items_dropped``."""
+    dropped = conn.execute(_DROPPED_ROWS).fetchall()
+    try:
+        conn.executescript(_ITEMS_REBUILD)
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    for _rowid, code, desc, stock in dropped:
+        if code is None or not str(code).strip():
+            logger.warning("item_keys: item without code left out: %r (stock %s)", desc, stock)
+        else:
+            logger.warning("item_keys: item %r (%r, stock %s) repeats code %r once trimmed; left out",
+                           code, desc, stock, str(code).strip())
+    if dropped:
+        logger.warning("item_keys: %d items left out of the rebuild, kept in items_dropped", len(dropped))
+    return dropped
+
+
+def relink_item_ids(conn, tables=FACT_TABLES):
+    """Point fact rows at the current items: rows without item_id or whose item is gone.
+
+    Returns the number of rows updated. Does not commit.
+    """
+    changed = 0
+    for t in tables:
+        if "item_id" not in _columns(conn, t):
+            continue
+        conn.execute(f"""
+            UPDATE {t} SET item_id = NULL
+             WHERE item_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM items i WHERE i.item_id = {t}.item_id)""")
+        cur = conn.execute(f"""
+            UPDATE {t} SET item_id = i.item_id
+              FROM items i
+             WHERE {t}.item_id IS NULL AND i.code_item = {t}.code_item""")
+        changed += cur.rowcount
+        cur = conn.execute(f"""
+            UPDATE {t} SET item_id = i.item_id
+              FROM items i
+             WHERE {t}.item_id IS NULL AND i.code_item = LTRIM({t}.code_item, '0')""")
+        changed += cur.rowcount
+    return changed
+
+
+def ensure_item_keys(db_path):
+    """Migrate items and the fact tables to integer item keys (once per database and process)."""
+    key = os.path.abspath(db_path)
+    with _ensured_lock:
+        if key in _ensured:
+            return True
+        try:
+            conn = sqlite3.connect(db_path)
+            try:
+                item_cols = _columns(conn, "items")
+                if not item_cols:
+                    return False
+                migrated = False
+                if "item_id" not in item_cols:
+                    _rebuild_items(conn)
+                    migrated = True
+                for t in FACT_TABLES:
+                    cols = _columns(conn, t)
+                    if not cols or "code_item" not in cols:
+                        continue
+                    if "item_id" not in cols:
+                        conn.execute(f"ALTER TABLE {t} ADD COLUMN item_id INTEGER REFERENCES items (item_id)")
+                        migrated = True
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{t}_item_id ON {t} (item_id)")
+                    conn.executescript(_FACT_TRIGGERS.format(t=t))
+                if migrated:
+                    linked = relink_item_ids(conn)
+                    logger.info("item_keys: migrated to integer item keys, %d fact rows linked", linked)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            logger.exception("item_keys: could not migrate %s", db_path)
+            return False
+        _ensured.add(key)
+        return True
@@ -0,0 +1,170 @@
+"""Resolve what a user typed (or a CSV contains) to deposit / rack ids.
+
+Editing a record and the CSV importers used to resolve every value with a
+chain of queries (exact id, ``COLLATE NOCASE``, ``LIKE 'x%'``,
+``LIKE '%x%'``...), each on its own connection. ``LocationResolver`` builds
+lookup tables from the ``ref_cache`` snapshot once and answers from memory,
+trying in order:
+
+1. numeric id (``"12"`` -> id 12, if it exists);
+2. exact description, code or number, case-insensitive and trimmed;
+3. prefix of a description: the first match in alphabetical order, found
+   with ``bisect`` on a sorted list;
+4. substring of a description, only when it matches exactly one entry.
+
+For racks, steps 3 and 4 look first among the racks of the given deposit
+(``deposit_racks``) and then among all racks.
+
+Answers are memoized in an LRU. When the reference tables change (new
+``ref_cache`` snapshot) the tables are rebuilt and the LRU is cleared.
+"""
+import bisect
+import os
+import threading
+from functools import lru_cache
+
+from ref_cache import get_ref_cache
+
+
+def _norm(value):
+    return str(value).strip().casefold() if value is not None else ""
+
+
+class _Index:
+    """Lookup tables for one kind of reference (deposits or racks)."""
+
+    def __init__(self, entries, codes):
+        # entries: [(id, description)], codes: {id: code/number}
+        self.by_id = {}
+        self.exact = {}
+        for ref_id, desc in entries:
+            self.by_id[ref_id] = desc or ""
+            # the first id wins on duplicate descriptions, like the old LIMIT 1
+            self.exact.setdefault(_norm(desc), ref_id)
+        for ref_id, code in codes.items():
+            if ref_id in self.by_id and code not in (None, ""):
+                self.exact.setdefault(_norm(code), ref_id)
+        self.exact.pop("", None)
+        self.sorted_names = sorted((_norm(desc), ref_id) for ref_id, desc in entries if _norm(desc))
+        self._keys = [name for name, _ in self.sorted_names]
+
+    def resolve(self, value):
+        text = _norm(value)
+        if not text:
+            return None
+        ref_id = self.resolve_exact(text)
+        if ref_id is not None:
+            return ref_id
+        return self.resolve_partial(text)
+
+    def resolve_exact(self, text):
+        try:
+            ref_id = int(text)
+            if ref_id in self.by_id:
+                return ref_id
+        except ValueError:
+            pass
+        return self.exact.get(text)
+
+    def resolve_partial(self, text):
+        pos = bisect.bisect_left(self._keys, text)
+        if pos < len(self._keys) and self._keys[pos].startswith(text):
+            return self.sorted_names[pos][1]
+        matches = {ref_id for name, ref_id in self.sorted_names if text in name}
+        if len(matches) == 1:
+            return matches.pop()
+        return None
+
+
+class LocationResolver:
+    """Memoized deposit / rack resolution. Use ``get_location_resolver``."""
+
+    def __init__(self, db_path, maxsize=1024):
+        self.db_path = db_path
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.builds = 0
+        self._build(get_ref_cache(db_path).get())
+
+    def _build(self, data):
+        deposits = _Index(data.deposits, data.deposit_numbers)
+        racks = _Index(data.racks, data.rack_codes)
+        self._deposits = deposits
+        self._racks = racks
+        self._racks_by_deposit = {dep_id: _Index(entries, {}) for dep_id, entries in data.racks_by_deposit.items()}
+        self._deposit_lookup = lru_cache(maxsize=self.maxsize)(deposits.resolve)
+        self._rack_lookup = lru_cache(maxsize=self.maxsize)(self._resolve_rack_id)
+        self._snapshot = data
+        self.builds += 1
+
+    def _current(self):
+        data = get_ref_cache(self.db_path).get()
+        if data is not self._snapshot:
+            with self._lock:
+                if data is not self._snapshot:
+                    self._build(data)
+
+    def resolve_deposit(self, value):
+        """Return (deposit_id, deposit_description) or (None, None)."""
+        self._current()
+        dep_id = self._deposit_lookup(value if isinstance(value, str) else str(value or ""))
+        if dep_id is None:
+            return (None, None)
+        return (dep_id, self._deposits.by_id.get(dep_id, ""))
+
+    def _resolve_rack_id(self, value, deposit_id):
+        text = _norm(value)
+        if not text:
+            return None
+        rack_id = self._racks.resolve_exact(text)
+        if rack_id is not None:
+            return rack_id
+        own = self._racks_by_deposit.get(deposit_id)
+        if own is not None:
+            rack_id = own.resolve_partial(text)
+            if rack_id is not None:
+                return rack_id
+        return self._racks.resolve_partial(text)
+
+    def resolve_rack(self, value, deposit_id=None):
+        """Return (rack_id, rack_description) or (None, None).
+
+        Partial names prefer the racks already used in ``deposit_id``.
+        """
+        self._current()
+        rack_id = self._rack_lookup(value if isinstance(value, str) else str(value or ""), deposit_id)
+        if rack_id is None:
+            return (None, None)
+        return (rack_id, self._racks.by_id.get(rack_id, ""))
+
+    def resolve(self, deposit_value, rack_value):
+        """Return (deposit_id, rack_id); either may be None."""
+        dep_id, _ = self.resolve_deposit(deposit_value)
+        rack_id, _ = self.resolve_rack(rack_value, dep_id)
+        return dep_id, rack_id
+
+    def cache_info(self):
+        return {"deposits": self._deposit_lookup.cache_info(), "racks": self._rack_lookup.cache_info(),
+                "builds": self.builds}
+
+
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+
+def get_location_resolver(db_path):
+    """Return the shared ``LocationResolver`` for ``db_path``."""
+    key = os.path.abspath(db_path)
+    with _resolvers_lock:
+        resolver = _resolvers.get(key)
+        if resolver is None:
+            resolver = LocationResolver(key)
+            _resolvers[key] = resolver
+        return resolver
+
+
+def drop_location_resolver(db_path):
+    """Forget the resolver of ``db_path``; the next ``get_location_resolver`` rebuilds it."""
+    with _resolvers_lock:
+        _resolvers.pop(os.path.abspath(db_path), None)
@@ -0,0 +1,122 @@
+"""Location dimension for inventory_count.
+
+Every count row used to carry its location only as the text
+``"{deposit} - {rack}"``; reports grouped and sorted on that string and a
+renamed deposit left old rows with the old name. ``locations`` holds one
+row per (deposit_id, rack_id) with an integer ``location_id`` and the
+display name; ``inventory_count.location_id`` points to it.
+
+* ``ensure_locations`` creates the table, the column, the index and the
+  triggers, and backfills existing rows the first time it runs.
+* New and edited count rows get their ``location_id`` from triggers, so
+  the writers (Guardar, importers, Ver Registros) need no changes.
+* Renaming a deposit or rack refreshes ``display_name``.
+
+The ``location`` text column is still written for the CSV exports and old
+scripts; reports read ``locations.display_name`` and group/sort by
+``location_id``.
+"""
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+_LOCATIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS locations (
+    location_id INTEGER PRIMARY KEY,
+    deposit_id INTEGER NOT NULL,
+    rack_id INTEGER NOT NULL,
+    display_name TEXT NOT NULL DEFAULT '',
+    UNIQUE (deposit_id, rack_id)
+);
+CREATE INDEX IF NOT EXISTS idx_ic_location_id ON inventory_count (location_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_locations_count_ins AFTER INSERT ON inventory_count
+WHEN NEW.deposit_id IS NOT NULL AND NEW.rack_id IS NOT NULL
+BEGIN
+    INSERT OR IGNORE INTO locations (deposit_id, rack_id, display_name)
+    SELECT d.deposit_id, r.rack_id, COALESCE(d.deposit_description, '') || ' - ' || COALESCE(r.rack_description, '')
+    FROM deposits d, racks r
+    WHERE d.deposit_id = NEW.deposit_id AND r.rack_id = NEW.rack_id;
+    UPDATE inventory_count
+       SET location_id = (SELECT location_id FROM locations WHERE deposit_id = NEW.deposit_id AND rack_id = NEW.rack_id)
+     WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_locations_count_upd AFTER UPDATE OF deposit_id, rack_id ON inventory_count
+BEGIN
+    INSERT OR IGNORE INTO locations (deposit_id, rack_id, display_name)
+    SELECT d.deposit_id, r.rack_id, COALESCE(d.deposit_description, '') || ' - ' || COALESCE(r.rack_description, '')
+    FROM deposits d, racks r
+    WHERE d.deposit_id = NEW.deposit_id AND r.rack_id = NEW.rack_id;
+    UPDATE inventory_count
+       SET location_id = (SELECT location_id FROM locations WHERE deposit_id = NEW.deposit_id AND rack_id = NEW.rack_id)
+     WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_locations_deposit_name AFTER UPDATE OF deposit_description ON deposits
+BEGIN
+    UPDATE locations
+       SET display_name = COALESCE(NEW.deposit_description, '') || ' - ' ||
+                          COALESCE((SELECT rack_description FROM racks WHERE rack_id = locations.rack_id), '')
+     WHERE deposit_id = NEW.deposit_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_locations_rack_name AFTER UPDATE OF rack_description ON racks
+BEGIN
+    UPDATE locations
+       SET display_name = COALESCE((SELECT deposit_description FROM deposits WHERE deposit_id = locations.deposit_id), '') ||
+                          ' - ' || COALESCE(NEW.rack_description, '')
+     WHERE rack_id = NEW.rack_id;
+END;
+"""
+
+# ids are handed out in display order, so ORDER BY location_id is alphabetical for existing data
+_LOCATIONS_BACKFILL = """
+INSERT OR IGNORE INTO locations (deposit_id, rack_id, display_name)
+SELECT DISTINCT d.deposit_id, r.rack_id,
+       COALESCE(d.deposit_description, '') || ' - ' || COALESCE(r.rack_description, '')
+FROM inventory_count ic
+JOIN deposits d ON d.deposit_id = ic.deposit_id
+JOIN racks r ON r.rack_id = ic.rack_id
+ORDER BY d.deposit_description, r.rack_description;
+UPDATE inventory_count
+   SET location_id = l.location_id
+  FROM locations l
+ WHERE l.deposit_id = inventory_count.deposit_id
+   AND l.rack_id = inventory_count.rack_id
+   AND inventory_count.location_id IS NOT l.location_id;
+"""
+
+_ensured = set()
+_ensured_lock = threading.Lock()
+
+
+def ensure_locations(db_path):
+    """Create/backfill the location dimension once per database and process."""
+    key = os.path.abspath(db_path)
+    with _ensured_lock:
+        if key in _ensured:
+            return True
+        try:
+            conn = sqlite3.connect(db_path)
+            try:
+                cols = {r[1] for r in conn.execute("PRAGMA table_info(inventory_count)")}
+                if not cols:
+                    return False
+                created = "location_id" not in cols
+                if created:
+                    conn.execute("ALTER TABLE inventory_count ADD COLUMN location_id INTEGER")
+                conn.executescript(_LOCATIONS_SCHEMA)
+                if created:
+                    conn.executescript(_LOCATIONS_BACKFILL)
+                    logger.info("locations: backfilled %d locations",
+                                conn.execute("SELECT COUNT(*) FROM locations").fetchone()[0])
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            logger.exception("locations: could not create the location dimension in %s", db_path)
+            return False
+        _ensured.add(key)
+        return True
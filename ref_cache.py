@@ -0,0 +1,313 @@
+"""Versioned cache of the reference data used by the forms and dialogs.
+
+Deposits, racks and the distinct counter names used to be queried again by
+every combobox and selection dialog, each with its own connection. They
+change rarely, so ``RefDataCache`` keeps one snapshot in memory and only
+reloads it when the underlying tables change.
+
+Change detection has two levels:
+
+* ``PRAGMA data_version`` on a long-lived connection tells whether *any*
+  other connection committed since the last check. When it has not moved,
+  the snapshot is returned without touching any table.
+* ``ref_versions`` holds one counter per reference set, bumped by triggers
+  on ``deposits``, ``racks``, ``deposit_racks`` and (only when a counter
+  name appears or disappears) ``inventory_count``. When ``data_version`` moved, the three
+  counters are compared with the snapshot stamp and only a real change
+  triggers a reload.
+
+``deposit_racks`` is the deposit -> rack relationship (``racks`` has no
+deposit column). It is filled once from the pairs already used in
+``inventory_count`` and kept up to date by triggers on that table, so the
+racks of a deposit are one primary-key range read.
+
+The tables, triggers and the ``counter_name`` index the counters triggers
+look rows up with are installed by ``ensure_ref_data``, one of the
+``db_schema.ensure_schema`` migrations, so every writer that goes through
+it bumps ``ref_versions``, not only the processes that open the cache.
+"""
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+_REF_SCHEMA = """
+-- the counters triggers look a name up on every insert/delete of a count
+CREATE INDEX IF NOT EXISTS idx_inventory_counter ON inventory_count (counter_name);
+
+CREATE TABLE IF NOT EXISTS ref_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO ref_versions (name, version) VALUES ('deposits', 0), ('racks', 0), ('counters', 0), ('deposit_racks', 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_ref_deposits_ins AFTER INSERT ON deposits
+BEGIN UPDATE ref_versions SET version = version + 1 WHERE name = 'deposits'; END;
+CREATE TRIGGER IF NOT EXISTS trg_ref_deposits_upd AFTER UPDATE ON deposits
+BEGIN UPDATE ref_versions SET version = version + 1 WHERE name = 'deposits'; END;
+CREATE TRIGGER IF NOT EXISTS trg_ref_deposits_del AFTER DELETE ON deposits
+BEGIN UPDATE ref_versions SET version = version + 1 WHERE name = 'deposits'; END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ref_racks_ins AFTER INSERT ON racks
+BEGIN UPDATE ref_versions SET version = version + 1 WHERE name = 'racks'; END;
+CREATE TRIGGER IF NOT EXISTS trg_ref_racks_upd AFTER UPDATE ON racks
+BEGIN UPDATE ref_versions SET version = version + 1 WHERE name = 'racks'; END;
+CREATE TRIGGER IF NOT EXISTS trg_ref_racks_del AFTER DELETE ON racks
+BEGIN UPDATE ref_versions SET version = version + 1 WHERE name = 'racks'; END;
+
+-- counters: only bump when a name shows up for the first time or its last row goes away
+CREATE TRIGGER IF NOT EXISTS trg_ref_counters_ins AFTER INSERT ON inventory_count
+WHEN NOT EXISTS (SELECT 1 FROM inventory_count WHERE counter_name IS NEW.counter_name AND id <> NEW.id)
+BEGIN UPDATE ref_versions SET version = version + 1 WHERE name = 'counters'; END;
+CREATE TRIGGER IF NOT EXISTS trg_ref_counters_del AFTER DELETE ON inventory_count
+WHEN NOT EXISTS (SELECT 1 FROM inventory_count WHERE counter_name IS OLD.counter_name)
+BEGIN UPDATE ref_versions SET version = version + 1 WHERE name = 'counters'; END;
+CREATE TRIGGER IF NOT EXISTS trg_ref_counters_upd AFTER UPDATE OF counter_name ON inventory_count
+WHEN OLD.counter_name IS NOT NEW.counter_name
+BEGIN UPDATE ref_versions SET version = version + 1 WHERE name = 'counters'; END;
+"""
+
+_DEPOSIT_RACKS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deposit_racks (
+    deposit_id INTEGER NOT NULL,
+    rack_id INTEGER NOT NULL,
+    PRIMARY KEY (deposit_id, rack_id)
+) WITHOUT ROWID;
+
+-- a pair is recorded the first time a count uses it (OR IGNORE: later rows do not fire the version bump)
+CREATE TRIGGER IF NOT EXISTS trg_deposit_racks_count_ins AFTER INSERT ON inventory_count
+WHEN NEW.deposit_id IS NOT NULL AND NEW.rack_id IS NOT NULL
+BEGIN
+    INSERT OR IGNORE INTO deposit_racks (deposit_id, rack_id)
+    SELECT NEW.deposit_id, NEW.rack_id
+    WHERE EXISTS (SELECT 1 FROM deposits WHERE deposit_id = NEW.deposit_id)
+      AND EXISTS (SELECT 1 FROM racks WHERE rack_id = NEW.rack_id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_deposit_racks_count_upd AFTER UPDATE OF deposit_id, rack_id ON inventory_count
+WHEN NEW.deposit_id IS NOT NULL AND NEW.rack_id IS NOT NULL
+BEGIN
+    INSERT OR IGNORE INTO deposit_racks (deposit_id, rack_id)
+    SELECT NEW.deposit_id, NEW.rack_id
+    WHERE EXISTS (SELECT 1 FROM deposits WHERE deposit_id = NEW.deposit_id)
+      AND EXISTS (SELECT 1 FROM racks WHERE rack_id = NEW.rack_id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_deposit_racks_dep_del AFTER DELETE ON deposits
+BEGIN DELETE FROM deposit_racks WHERE deposit_id = OLD.deposit_id; END;
+CREATE TRIGGER IF NOT EXISTS trg_deposit_racks_rack_del AFTER DELETE ON racks
+BEGIN DELETE FROM deposit_racks WHERE rack_id = OLD.rack_id; END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ref_deposit_racks_ins AFTER INSERT ON deposit_racks
+BEGIN UPDATE ref_versions SET version = version + 1 WHERE name = 'deposit_racks'; END;
+CREATE TRIGGER IF NOT EXISTS trg_ref_deposit_racks_del AFTER DELETE ON deposit_racks
+BEGIN UPDATE ref_versions SET version = version + 1 WHERE name = 'deposit_racks'; END;
+"""
+
+_DEPOSIT_RACKS_BACKFILL = """
+INSERT OR IGNORE INTO deposit_racks (deposit_id, rack_id)
+SELECT DISTINCT ic.deposit_id, ic.rack_id
+FROM inventory_count ic
+JOIN deposits d ON d.deposit_id = ic.deposit_id
+JOIN racks r ON r.rack_id = ic.rack_id
+"""
+
+
+_ensured = set()
+_ensured_lock = threading.Lock()
+
+
+def ensure_ref_versions(conn):
+    """Create the ``ref_versions`` table and its triggers (idempotent)."""
+    conn.executescript(_REF_SCHEMA)
+
+
+def ensure_deposit_racks(conn):
+    """Create ``deposit_racks`` and its triggers; backfill it from inventory_count when new."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'deposit_racks'").fetchone()
+    conn.executescript(_DEPOSIT_RACKS_SCHEMA)
+    if not exists:
+        conn.execute(_DEPOSIT_RACKS_BACKFILL)
+        conn.commit()
+
+
+def ensure_ref_data(db_path):
+    """Install ``ref_versions``, ``deposit_racks`` and their triggers (once per database and process)."""
+    key = os.path.abspath(db_path)
+    with _ensured_lock:
+        if key in _ensured:
+            return True
+        try:
+            conn = sqlite3.connect(db_path)
+            try:
+                existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                if {"inventory_count", "deposits", "racks"} <= existing:
+                    ensure_ref_versions(conn)
+                    ensure_deposit_racks(conn)
+                    conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            logger.exception("ref_cache: could not install ref_versions in %s", db_path)
+            return False
+        _ensured.add(key)
+        return True
+
+
+class RefData:
+    """Immutable snapshot of the reference tables."""
+
+    def __init__(self, version, deposits, racks, counters, deposit_numbers=None, rack_codes=None,
+                 racks_by_deposit=None):
+        self.version = version
+        # [(deposit_id, deposit_description)] ordered by description
+        self.deposits = deposits
+        # [(rack_id, rack_description)] ordered by rack_id
+        self.racks = racks
+        # distinct COALESCE(counter_name, '') ordered by name
+        self.counters = counters
+        # secondary codes typed by users: {deposit_id: deposit_number}, {rack_id: rack_code}
+        self.deposit_numbers = dict(deposit_numbers or {})
+        self.rack_codes = dict(rack_codes or {})
+        # {deposit_id: [(rack_id, rack_description)]} from deposit_racks, ordered by rack_id
+        self.racks_by_deposit = dict(racks_by_deposit or {})
+        self.deposit_by_id = {d[0]: d[1] for d in deposits}
+        self.rack_by_id = {r[0]: r[1] for r in racks}
+        # description (case-insensitive) -> id; first id wins on duplicates
+        self.deposit_id_by_description = {}
+        for dep_id, desc in deposits:
+            self.deposit_id_by_description.setdefault(str(desc or '').strip().casefold(), dep_id)
+        self.rack_id_by_description = {}
+        for rack_id, desc in racks:
+            self.rack_id_by_description.setdefault(str(desc or '').strip().casefold(), rack_id)
+
+    def deposit_name(self, deposit_id):
+        return self.deposit_by_id.get(deposit_id)
+
+    def rack_name(self, rack_id):
+        return self.rack_by_id.get(rack_id)
+
+    def racks_for_deposit(self, deposit_id, include_others=False):
+        """Racks used in ``deposit_id``; all racks when it has none yet.
+
+        With ``include_others`` the remaining racks follow the deposit's own,
+        so a rack can still be chosen for a deposit it was never counted in.
+        """
+        own = self.racks_by_deposit.get(deposit_id)
+        if not own:
+            return list(self.racks)
+        if not include_others:
+            return list(own)
+        own_ids = {r[0] for r in own}
+        return list(own) + [r for r in self.racks if r[0] not in own_ids]
+
+
+class RefDataCache:
+    """Process-wide cache for one database file. Use ``get_ref_cache``."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = None
+        self._data = None
+        self._data_version = None
+        self._has_triggers = False
+        self.loads = 0
+
+    def _connection(self):
+        if self._conn is None:
+            # normally already done by ensure_schema; memoized, so this is only a set lookup
+            ensure_ref_data(self.db_path)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            # read-only database or missing tables: fall back to data_version only
+            self._has_triggers = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_ref_counters_ins'").fetchone() is not None
+        return self._conn
+
+    def _stamp(self, conn):
+        if not self._has_triggers:
+            return None
+        rows = conn.execute("SELECT name, version FROM ref_versions").fetchall()
+        return tuple(sorted(rows))
+
+    def _load(self, conn, stamp):
+        deposits = conn.execute(
+            "SELECT deposit_id, deposit_description FROM deposits ORDER BY deposit_description").fetchall()
+        racks = conn.execute("SELECT rack_id, rack_description FROM racks ORDER BY rack_id").fetchall()
+        counters = [r[0] for r in conn.execute(
+            "SELECT DISTINCT COALESCE(counter_name, '') FROM inventory_count ORDER BY 1").fetchall()]
+        try:
+            deposit_numbers = dict(conn.execute("SELECT deposit_id, deposit_number FROM deposits").fetchall())
+            rack_codes = dict(conn.execute("SELECT rack_id, rack_code FROM racks").fetchall())
+        except sqlite3.Error:
+            # older databases without the code columns
+            deposit_numbers, rack_codes = {}, {}
+        racks_by_deposit = {}
+        try:
+            for dep_id, rack_id, desc in conn.execute(
+                    "SELECT dr.deposit_id, r.rack_id, r.rack_description FROM deposit_racks dr "
+                    "JOIN racks r ON r.rack_id = dr.rack_id ORDER BY dr.deposit_id, dr.rack_id"):
+                racks_by_deposit.setdefault(dep_id, []).append((rack_id, desc))
+        except sqlite3.Error:
+            racks_by_deposit = {}
+        self.loads += 1
+        logger.debug("RefDataCache: loaded %d deposits, %d racks, %d counters (stamp %s)",
+                     len(deposits), len(racks), len(counters), stamp)
+        return RefData(stamp, deposits, racks, counters, deposit_numbers, rack_codes, racks_by_deposit)
+
+    def get(self):
+        """Return the current snapshot, reloading it only if the tables changed."""
+        with self._lock:
+            try:
+                conn = self._connection()
+                data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+                if self._data is not None and data_version == self._data_version:
+                    return self._data
+                stamp = self._stamp(conn)
+                if self._data is None or stamp is None or stamp != self._data.version:
+                    self._data = self._load(conn, stamp)
+                self._data_version = data_version
+            except Exception:
+                logger.exception("RefDataCache: error refreshing reference data")
+                if self._data is None:
+                    return RefData(None, [], [], [])
+            return self._data
+
+    def invalidate(self):
+        """Force a reload on the next ``get`` (e.g. after writing through this process' own connection)."""
+        with self._lock:
+            self._data = None
+            self._data_version = None
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except Exception:
+                    pass
+                self._conn = None
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_ref_cache(db_path):
+    """Return the shared ``RefDataCache`` for ``db_path``."""
+    key = os.path.abspath(db_path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = RefDataCache(key)
+            _caches[key] = cache
+        return cache
+
+
+def drop_ref_cache(db_path):
+    """Close and forget the cache of ``db_path``; the next ``get_ref_cache`` starts afresh."""
+    with _caches_lock:
+        cache = _caches.pop(os.path.abspath(db_path), None)
+    if cache is not None:
+        cache.close()
@@ -0,0 +1,175 @@
+"""Headless report API.
+
+Every PDF report is a ``build_<name>(db_path, output_path, **params)``
+function in ``ui_pdf_report`` / ``ui_pdf_report_resumen``: no Tk, errors
+are raised as ``ReportError`` and the result is a stats dict
+(``path``, ``rows``, ``pages``). The ``generate_pdf_report_*`` functions
+behind the buttons only ask for the parameters with dialogs and call the
+builder through ``_run_report``.
+
+``run_report(name, db_path, output_path, **params)`` runs a report by name
+(see ``REPORTS``) and adds ``report`` and ``seconds`` to the stats, so
+reports can be generated in batch on a machine without a display::
+
+    python -m report_api list
+    python -m report_api report diferencias_resumen --deposits 1,2 --out x.pdf
+    python -m report_api report item_conteo --mode detalle --from 2026-02-01 --to 2026-02-15 --out ic.pdf
+    python -m report_api report conteos --out conteos.xlsx
+    python -m report_api pack --by-deposit --by-counter
+
+The extension of ``--out`` picks the format: ``.csv``, ``.xlsx`` and
+``.html`` write the same rows without the PDF layout (``report_export``).
+(``pack`` is the end-of-day report pack, see ``report_pack``.)
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+
+from count_filters import parse_filter_date
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB = "inventariovlm.db"
+
+
+class ReportError(Exception):
+    """A report could not be generated; the message is meant for the user."""
+
+
+class EmptyReportError(ReportError):
+    """There is nothing to report (informational, not a failure)."""
+
+
+# name -> (module, builder, accepted params, title)
+REPORTS = {
+    "conteos": ("ui_pdf_report", "build_conteos", (), "Conteos por depósito y rack"),
+    "por_contador": ("ui_pdf_report", "build_por_contador", ("counters", "date_from", "date_to"), "Reporte por Contador"),
+    "por_deposito": ("ui_pdf_report", "build_por_deposito", ("deposits", "date_from", "date_to"), "Reporte por Depósito"),
+    "verificacion": ("ui_pdf_report", "build_verificacion", (), "Reporte Verificación"),
+    "diferencias": ("ui_pdf_report", "build_diferencias", (), "Diferencias por item y ubicación"),
+    "diferencias_por_item": ("ui_pdf_report", "build_diferencias_por_item", (), "Diferencias por Item"),
+    "diferencias_item_detalle": ("ui_pdf_report", "build_diferencias_item_detalle", ("item_code",), "Diferencias Item Detalle"),
+    "diferencias_threshold": ("ui_pdf_report", "build_diferencias_threshold", ("threshold",), "Diferencias > X"),
+    "diferencias_cambios": ("ui_pdf_report", "build_diferencias_cambios", ("threshold",), "Diferencias (cambios)"),
+    "diferencias_por_counter": ("ui_pdf_report", "build_diferencias_por_counter", ("min_diff", "max_diff"), "Diferencias por Counter/Loc/Item"),
+    "diferencias_resumen": ("ui_pdf_report_resumen", "build_diferencias_resumen", ("deposits",), "Diferencias Resumen"),
+    "item_conteo": ("ui_pdf_report_resumen", "build_item_conteo", ("mode", "deposits", "date_from", "date_to"), "Item Conteo"),
+    "inventario_por_ubicacion": ("ui_pdf_report_resumen", "build_inventario_por_ubicacion",
+                                 ("deposits", "include_qty", "date_from", "date_to"), "Inventario por Ubicación"),
+    "nocode_items": ("ui_pdf_report_resumen", "build_nocode_items", (), "Registros Sin codigo"),
+    "items_not_in_inventory": ("ui_pdf_report_resumen", "build_items_not_in_inventory", (), "Items no en Inventario"),
+    "verificacion_remarks": ("ui_pdf_report_resumen", "build_verificacion_remarks", (), "Verificación (Remarks)"),
+}
+
+
+def get_builder(name):
+    """The ``build_*`` function of report ``name``; raises ReportError if unknown."""
+    try:
+        module, func, _params, _title = REPORTS[name]
+    except KeyError:
+        raise ReportError(f"Reporte desconocido: {name}") from None
+    return getattr(importlib.import_module(module), func)
+
+
+def run_report(name, db_path, output_path, **params):
+    """Generate report ``name`` into ``output_path``. Returns the builder stats plus ``report`` and ``seconds``.
+
+    Params that are None are left to the builder defaults; params the report
+    does not take raise ReportError.
+    """
+    builder = get_builder(name)
+    accepted = REPORTS[name][2]
+    params = {k: v for k, v in params.items() if v is not None}
+    unknown = sorted(set(params) - set(accepted))
+    if unknown:
+        raise ReportError(f"El reporte {name} no admite: {', '.join(unknown)}")
+    out_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    stats = builder(db_path, output_path, **params)
+    stats = dict(stats or {}, report=name, seconds=round(time.perf_counter() - start, 3))
+    logger.info("report_api: %s -> %s (%s rows, %.2f s)", name, output_path, stats.get("rows"), stats["seconds"])
+    return stats
+
+
+def _int_list(text):
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def _str_list(text):
+    return [x.strip() for x in text.split(",") if x.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reportes sin interfaz gráfica")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="listar los reportes y sus parámetros")
+    p_rep = sub.add_parser("report", help="generar un reporte")
+    p_rep.add_argument("name", choices=sorted(REPORTS))
+    p_rep.add_argument("--db", default=DEFAULT_DB, help="ruta de la base de datos")
+    p_rep.add_argument("--out", required=True, help="archivo de salida (.pdf, .csv, .xlsx o .html)")
+    p_rep.add_argument("--deposits", type=_int_list, help="deposit_id separados por coma")
+    p_rep.add_argument("--counters", type=_str_list, help="contadores separados por coma")
+    p_rep.add_argument("--from", dest="date_from", type=parse_filter_date, help="fecha inicial (YYYY-MM-DD, inclusive)")
+    p_rep.add_argument("--to", dest="date_to", type=parse_filter_date, help="fecha final (YYYY-MM-DD, inclusive)")
+    p_rep.add_argument("--item", dest="item_code", help="código de item")
+    p_rep.add_argument("--threshold", type=int, help="|diferencia| mayor que")
+    p_rep.add_argument("--min", dest="min_diff", type=int, help="|diferencia| mínima")
+    p_rep.add_argument("--max", dest="max_diff", type=int, help="|diferencia| máxima")
+    p_rep.add_argument("--mode", choices=("detalle", "resumen"), help="modo de item_conteo")
+    p_rep.add_argument("--include-qty", dest="include_qty", action="store_true", default=None,
+                       help="inventario_por_ubicacion: incluir cantidades")
+    p_pack = sub.add_parser("pack", help="paquete de reportes en paralelo (carpeta con fecha e index.csv)")
+    p_pack.add_argument("--db", default=DEFAULT_DB, help="ruta de la base de datos")
+    p_pack.add_argument("--reports", type=_str_list, help="reportes separados por coma (por defecto los del menú)")
+    p_pack.add_argument("--by-deposit", action="store_true", help="además, un PDF por depósito")
+    p_pack.add_argument("--by-counter", action="store_true", help="además, un PDF por contador")
+    p_pack.add_argument("--workers", type=int, help="procesos (por defecto, uno por núcleo)")
+    p_pack.add_argument("--dest", help="carpeta base (por defecto reports/ junto a la base de datos)")
+    p_pack.add_argument("--format", dest="fmt", choices=("pdf", "csv", "xlsx", "html"), default="pdf",
+                        help="formato de los archivos (por defecto pdf)")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for name, (_module, _func, params, title) in sorted(REPORTS.items()):
+            print(f"{name:<26}  {title:<34}  {', '.join(params) or '-'}")
+        return 0
+
+    if args.command == "pack":
+        from report_pack import PACK_REPORTS, generate_pack
+        names = args.reports or PACK_REPORTS
+        unknown = [n for n in names if n not in REPORTS]
+        if unknown:
+            print(f"Error: reportes desconocidos: {', '.join(unknown)}", file=sys.stderr)
+            return 1
+        folder, results = generate_pack(args.db, names, args.by_deposit, args.by_counter, args.dest, args.workers,
+                                        progress=lambda done, total, st: print(f"[{done}/{total}] {st.get('path')}"
+                                                                               f" {st.get('error') or ''}", flush=True),
+                                        fmt=args.fmt)
+        failed = [r for r in results if r.get("error")]
+        print(f"{len(results) - len(failed)} reportes en {folder}" + (f", {len(failed)} con error" if failed else ""))
+        return 1 if failed else 0
+
+    params = {k: getattr(args, k) for k in ("deposits", "counters", "date_from", "date_to", "item_code",
+                                            "threshold", "min_diff", "max_diff", "mode", "include_qty")}
+    try:
+        stats = run_report(args.name, args.db, args.out, **params)
+    except EmptyReportError as e:
+        print(e, file=sys.stderr)
+        return 0
+    except ReportError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(stats, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # run the imported module so ReportError is the class the report modules raise
+    import report_api
+    sys.exit(report_api.main())
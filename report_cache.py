@@ -0,0 +1,285 @@
+"""Cache of report query results, keyed on the data they were read from.
+
+Generating a report twice, or two reports that read the same aggregate
+(``diferencias_por_item`` and ``diferencias_threshold``), ran the same SQL
+again. ``fetch_rows(db_path, name, sql, params)`` keeps the rows under
+``(name, sql, params, stamp)`` where the stamp says which data they came
+from:
+
+* ``ensure_change_stamps`` adds the table ``data_versions`` (one counter
+  per tracked table) and triggers that bump the counter on every insert,
+  update and delete, whoever the writer is (the app, the Scripts, a DB
+  browser);
+* the stamp is the counters plus ``PRAGMA schema_version``. It is re-read
+  only when ``PRAGMA data_version`` of the cache's own read connection says
+  another connection committed, so a repeat run with no writes in between
+  does not touch the tables at all;
+* ``data_versions`` also holds a random epoch (row ``EPOCH_ROW``).
+  ``new_cache_epoch`` rewrites it when the file gets another history
+  (``db_backup.restore`` rolls it back to older counters), so counters that
+  reach the same values again on the new timeline do not match the results
+  stored for the old one. It also drops those results.
+
+Rows are kept in memory in a size-bounded LRU. With ``disk_dir`` set
+(``configure_report_cache``) they are also pickled there, so the worker
+processes of a report pack and later runs reuse them; a stale file is
+replaced when the same query is stored with a newer stamp.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+TRACKED_TABLES = ("inventory_count", "items", "inventory_count_res", "nocode_items", "deposits", "racks",
+                  "locations", "consolidado_csv", "sales", "purchasing")
+
+# data_versions row holding the epoch of the file's history, not a table counter
+EPOCH_ROW = "~epoch"
+
+_STAMP_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS trg_{t}_dv_ins AFTER INSERT ON {t}
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE table_name = '{t}';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_{t}_dv_upd AFTER UPDATE ON {t}
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE table_name = '{t}';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_{t}_dv_del AFTER DELETE ON {t}
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE table_name = '{t}';
+END;
+"""
+
+_ensured = set()
+_ensured_lock = threading.Lock()
+
+
+def ensure_change_stamps(db_path):
+    """Create ``data_versions`` and the counter triggers (once per database and process)."""
+    key = os.path.abspath(db_path)
+    with _ensured_lock:
+        if key in _ensured:
+            return True
+        try:
+            conn = sqlite3.connect(db_path)
+            try:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS data_versions (
+                        table_name TEXT PRIMARY KEY,
+                        version INTEGER NOT NULL DEFAULT 0
+                    )""")
+                conn.execute("INSERT OR IGNORE INTO data_versions (table_name, version) VALUES (?, abs(random()))",
+                             (EPOCH_ROW,))
+                existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                for t in TRACKED_TABLES:
+                    if t not in existing:
+                        continue
+                    conn.execute("INSERT OR IGNORE INTO data_versions (table_name) VALUES (?)", (t,))
+                    conn.executescript(_STAMP_TRIGGERS.format(t=t))
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            logger.exception("report_cache: could not install change stamps in %s", db_path)
+            return False
+        _ensured.add(key)
+        return True
+
+
+class ReportCache:
+    """LRU of query results (``max_bytes`` of pickled rows), optionally mirrored in ``disk_dir``."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (size, rows)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._readers = {}  # db -> [connection, data_version, stamp]
+
+    def stamp(self, db_path):
+        """Current data stamp of ``db_path``; re-read only after another connection committed."""
+        key = os.path.abspath(db_path)
+        with self._lock:
+            reader = self._readers.get(key)
+            if reader is None:
+                conn = sqlite3.connect(db_path, check_same_thread=False)
+                reader = self._readers[key] = [conn, None, None]
+            conn = reader[0]
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != reader[1] or reader[2] is None:
+                try:
+                    counters = conn.execute("SELECT table_name, version FROM data_versions ORDER BY table_name").fetchall()
+                except sqlite3.OperationalError:
+                    counters = None  # no stamps installed: nothing can be cached safely
+                schema = conn.execute("PRAGMA schema_version").fetchone()[0]
+                reader[1] = version
+                reader[2] = (schema, tuple(counters)) if counters is not None else None
+            return reader[2]
+
+    def fetch(self, db_path, name, sql, params=()):
+        """Rows of ``sql`` with ``params``, from the cache when the data has not changed since."""
+        params = tuple(params or ())
+        stamp = self.stamp(db_path)
+        if stamp is None:
+            return self._query(db_path, sql, params)
+        query_key = (os.path.abspath(db_path), name, sql, params)
+        key = query_key + (stamp,)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[1])
+        rows = self._load(query_key, stamp)
+        if rows is None:
+            self.misses += 1
+            rows = self._query(db_path, sql, params)
+            blob = pickle.dumps(rows, pickle.HIGHEST_PROTOCOL)
+            self._save(query_key, stamp, blob)
+        else:
+            self.hits += 1
+            blob = pickle.dumps(rows, pickle.HIGHEST_PROTOCOL)
+        self._remember(key, len(blob), rows)
+        return list(rows)
+
+    def clear(self, db_path=None):
+        """Drop the results in memory (of ``db_path`` only, if given)."""
+        with self._lock:
+            if db_path is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            db = os.path.abspath(db_path)
+            for key in [k for k in self._entries if k[0] == db]:
+                self._bytes -= self._entries.pop(key)[0]
+
+    def close(self):
+        with self._lock:
+            for conn, _version, _stamp in self._readers.values():
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._readers.clear()
+
+    # --- internals ---
+
+    @staticmethod
+    def _query(db_path, sql, params):
+        conn = sqlite3.connect(db_path)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def _remember(self, key, size, rows):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[0]
+            self._entries[key] = (size, rows)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _key, (old_size, _rows) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+
+    @staticmethod
+    def _digest(value):
+        return hashlib.sha1(repr(value).encode("utf-8")).hexdigest()[:20]
+
+    def _paths(self, query_key, stamp):
+        prefix = self._digest(query_key)
+        return prefix, os.path.join(self.disk_dir, f"{prefix}-{self._digest(stamp)}.pkl")
+
+    def _load(self, query_key, stamp):
+        if not self.disk_dir:
+            return None
+        _prefix, path = self._paths(query_key, stamp)
+        try:
+            with open(path, "rb") as fh:
+                return pickle.load(fh)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("report_cache: ignoring unreadable %s", path)
+            return None
+
+    def _save(self, query_key, stamp, blob):
+        if not self.disk_dir:
+            return
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            prefix, path = self._paths(query_key, stamp)
+            tmp = f"{path}.{os.getpid()}.part"
+            with open(tmp, "wb") as fh:
+                fh.write(blob)
+            os.replace(tmp, path)
+            # results of the same query from older data are never read again
+            for name in os.listdir(self.disk_dir):
+                if name.startswith(prefix + "-") and name.endswith(".pkl") and os.path.join(self.disk_dir, name) != path:
+                    try:
+                        os.remove(os.path.join(self.disk_dir, name))
+                    except OSError:
+                        pass
+        except OSError:
+            logger.warning("report_cache: could not write to %s", self.disk_dir)
+
+
+_cache = ReportCache()
+
+
+def get_report_cache():
+    return _cache
+
+
+def configure_report_cache(disk_dir=None, max_bytes=None):
+    """Set the disk directory (None = memory only) and/or the memory budget of the shared cache."""
+    _cache.disk_dir = disk_dir
+    if max_bytes is not None:
+        _cache.max_bytes = max_bytes
+
+
+def default_cache_dir(db_path):
+    return os.path.splitext(os.path.abspath(db_path))[0] + "-report-cache"
+
+
+def new_cache_epoch(db_path):
+    """Give ``db_path`` a new epoch and drop the cached results of it, in memory and on disk.
+
+    Call it after the file was replaced by another history (a restore).
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        with conn:
+            conn.execute("UPDATE data_versions SET version = abs(random()) WHERE table_name = ?", (EPOCH_ROW,))
+    except sqlite3.OperationalError:
+        pass  # no stamps yet: ensure_change_stamps creates a fresh epoch
+    finally:
+        conn.close()
+    _cache.clear(db_path)
+    for folder in {default_cache_dir(db_path), _cache.disk_dir}:
+        if not folder or not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            if name.endswith(".pkl"):
+                try:
+                    os.remove(os.path.join(folder, name))
+                except OSError:
+                    pass
+    logger.info("report_cache: new epoch for %s, cached results dropped", db_path)
+
+
+def fetch_rows(db_path, name, sql, params=()):
+    """``get_report_cache().fetch(...)``: rows of a report query, cached on the data stamp."""
+    return _cache.fetch(db_path, name, sql, params)
@@ -0,0 +1,252 @@
+"""Per-item difference fingerprints and the "changes since the last run" report.
+
+On recount days the per-item difference reports (Diferencias por Items,
+Diferencias > X) are run again and again, and every run aggregates and
+lays out every item although only a few were recounted in between. Here:
+
+* ``ensure_item_changes`` adds the table ``item_changes`` (one row per item
+  key with the sequence number of its last change) and triggers that bump
+  it on every insert, delete and relevant update of ``inventory_count``
+  (count columns, item) and ``items`` (``current_inventory``), whoever the
+  writer is. The item key is the grouping key of the per-item aggregate,
+  ``COALESCE(item_id, code_item)``. The largest sequence number is the
+  high-water mark of the data;
+* each run of a per-item report stores a fingerprint per item in
+  ``report_fingerprints`` (total, current stock, difference and number of
+  count rows, plus the code for display) and the mark it was read at in
+  ``report_runs`` (``save_fingerprints``; nothing is written when the mark
+  has not moved since the stored one);
+* ``changes_since_last_run`` reads only the item keys changed after the
+  stored mark, aggregates only their rows (by the ``item_id`` and
+  ``code_item`` indexes), compares with the stored fingerprints and
+  returns the items whose values changed with the previous and current
+  ones, then moves the baseline forward for just those items. A repeated
+  run costs O(changed items) instead of O(all items).
+
+The per-item SQL is passed in as a template with a ``{where}`` placeholder
+(alias ``ic`` for ``inventory_count``) returning rows ``(item, description,
+boxes, loose, total, current, difference, rows, item_key)``.
+"""
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# row layout of the per-item SQL
+ITEM, TOTAL, CURRENT, DIFFERENCE, ROWS, KEY = 0, 4, 5, 6, 7, 8
+
+# item keys per IN (...) list, below SQLite's old 999 parameter limit
+_CHUNK = 400
+
+_ITEM_CHANGES_DDL = """
+CREATE TABLE IF NOT EXISTS item_changes (
+    item_key PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_item_changes_seq ON item_changes (seq);
+CREATE TABLE IF NOT EXISTS report_fingerprints (
+    report TEXT NOT NULL,
+    item_key,
+    item TEXT,
+    total INTEGER,
+    current_inventory INTEGER,
+    difference INTEGER,
+    row_count INTEGER,
+    PRIMARY KEY (report, item_key)
+);
+CREATE TABLE IF NOT EXISTS report_runs (
+    report TEXT PRIMARY KEY,
+    high_water INTEGER NOT NULL,
+    run_at TEXT NOT NULL
+);
+"""
+
+# item_key has no type so it keeps ints (item_id) and text (code_item) apart, like the GROUP BY does
+_MARK = "INSERT INTO item_changes (item_key, seq) " \
+        "SELECT {key}, (SELECT COALESCE(MAX(seq), 0) + 1 FROM item_changes) WHERE {cond} " \
+        "ON CONFLICT (item_key) DO UPDATE SET seq = excluded.seq;"
+
+_ITEM_CHANGE_TRIGGERS = f"""
+CREATE TRIGGER IF NOT EXISTS trg_item_changes_ic_ins AFTER INSERT ON inventory_count
+BEGIN
+    {_MARK.format(key="COALESCE(NEW.item_id, NEW.code_item)", cond="1")}
+END;
+CREATE TRIGGER IF NOT EXISTS trg_item_changes_ic_upd
+AFTER UPDATE OF item_id, code_item, total, boxunittotal, magazijn ON inventory_count
+WHEN OLD.item_id IS NOT NEW.item_id OR OLD.code_item IS NOT NEW.code_item OR OLD.total IS NOT NEW.total
+     OR OLD.boxunittotal IS NOT NEW.boxunittotal OR OLD.magazijn IS NOT NEW.magazijn
+BEGIN
+    {_MARK.format(key="COALESCE(NEW.item_id, NEW.code_item)", cond="1")}
+    -- the row moved to another item: the old one changed too
+    {_MARK.format(key="COALESCE(OLD.item_id, OLD.code_item)",
+                     cond="COALESCE(OLD.item_id, OLD.code_item) IS NOT COALESCE(NEW.item_id, NEW.code_item)")}
+END;
+CREATE TRIGGER IF NOT EXISTS trg_item_changes_ic_del AFTER DELETE ON inventory_count
+BEGIN
+    {_MARK.format(key="COALESCE(OLD.item_id, OLD.code_item)", cond="1")}
+END;
+CREATE TRIGGER IF NOT EXISTS trg_item_changes_items_upd AFTER UPDATE OF current_inventory ON items
+WHEN OLD.current_inventory IS NOT NEW.current_inventory
+BEGIN
+    {_MARK.format(key="NEW.item_id", cond="1")}
+END;
+CREATE TRIGGER IF NOT EXISTS trg_item_changes_items_del AFTER DELETE ON items
+BEGIN
+    {_MARK.format(key="OLD.item_id", cond="1")}
+END;
+"""
+
+_ensured = set()
+_ensured_lock = threading.Lock()
+
+
+def ensure_item_changes(db_path):
+    """Create the change, fingerprint and run tables and the triggers (once per database and process)."""
+    key = os.path.abspath(db_path)
+    with _ensured_lock:
+        if key in _ensured:
+            return True
+        try:
+            conn = sqlite3.connect(db_path)
+            try:
+                existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                conn.executescript(_ITEM_CHANGES_DDL)
+                if {"inventory_count", "items"} <= existing:
+                    conn.executescript(_ITEM_CHANGE_TRIGGERS)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            logger.exception("report_delta: could not install item change tracking in %s", db_path)
+            return False
+        _ensured.add(key)
+        return True
+
+
+def current_mark(db_path):
+    """High-water mark of the data now (read it *before* the rows it goes with)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return _mark(conn)
+    finally:
+        conn.close()
+
+
+def _mark(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM item_changes").fetchone()[0]
+
+
+def _fingerprint(row):
+    return (row[TOTAL], row[CURRENT], row[DIFFERENCE], row[ROWS])
+
+
+def _store(conn, report, rows):
+    conn.executemany(
+        "INSERT OR REPLACE INTO report_fingerprints "
+        "(report, item_key, item, total, current_inventory, difference, row_count) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((report, r[KEY], r[ITEM]) + _fingerprint(r) for r in rows))
+
+
+def _set_run(conn, report, mark):
+    conn.execute("INSERT OR REPLACE INTO report_runs (report, high_water, run_at) "
+                 "VALUES (?, ?, datetime('now', 'localtime'))", (report, mark))
+
+
+def save_fingerprints(db_path, report, rows, mark):
+    """Store ``rows`` (every item, read at ``mark``) as the baseline of ``report``."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        run = conn.execute("SELECT high_water FROM report_runs WHERE report = ?", (report,)).fetchone()
+        if run is not None and run[0] == mark:
+            return False  # no item changed since the stored baseline
+        with conn:
+            conn.execute("DELETE FROM report_fingerprints WHERE report = ?", (report,))
+            _store(conn, report, rows)
+            _set_run(conn, report, mark)
+        logger.debug("report_delta: %s baseline of %d items at %d", report, len(rows), mark)
+        return True
+    finally:
+        conn.close()
+
+
+def _chunks(values):
+    for i in range(0, len(values), _CHUNK):
+        yield values[i:i + _CHUNK]
+
+
+def _current_rows(conn, sql, keys):
+    """Per-item rows of ``sql`` for just ``keys``, by key."""
+    rows = {}
+    ids = [k for k in keys if isinstance(k, int)]
+    codes = [k for k in keys if not isinstance(k, int)]
+    for part in _chunks(ids):
+        where = f"WHERE ic.item_id IN ({', '.join('?' * len(part))})"
+        rows.update((r[KEY], r) for r in conn.execute(sql.format(where=where), part))
+    for part in _chunks(codes):
+        where = f"WHERE ic.item_id IS NULL AND ic.code_item IN ({', '.join('?' * len(part))})"
+        rows.update((r[KEY], r) for r in conn.execute(sql.format(where=where), part))
+    return rows
+
+
+def _previous(conn, report, keys):
+    prev = {}
+    for part in _chunks(keys):
+        prev.update((r[0], r[1:]) for r in conn.execute(
+            "SELECT item_key, item, total, current_inventory, difference, row_count FROM report_fingerprints "
+            f"WHERE report = ? AND item_key IN ({', '.join('?' * len(part))})", [report] + part))
+    return prev
+
+
+def changes_since_last_run(db_path, report, sql):
+    """Items of ``report`` whose values changed since its last run; moves the baseline forward.
+
+    Returns ``(since, changes)``: ``since`` is the time of the previous run
+    (None on the first one, which only stores the baseline) and ``changes``
+    a list of ``(previous, current)``; ``previous`` is ``(item, total,
+    current, difference, rows)`` or None for a new item and ``current`` the
+    per-item row or None when the item has no count rows any more.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        # write lock first: the keys, the rows and the new mark belong to the same data
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            mark = _mark(conn)
+            run = conn.execute("SELECT high_water, run_at FROM report_runs WHERE report = ?", (report,)).fetchone()
+            if run is None:
+                conn.execute("DELETE FROM report_fingerprints WHERE report = ?", (report,))
+                _store(conn, report, conn.execute(sql.format(where="")).fetchall())
+                _set_run(conn, report, mark)
+                conn.commit()
+                return None, []
+            high_water, since = run
+            keys = [r[0] for r in conn.execute("SELECT item_key FROM item_changes WHERE seq > ?", (high_water,))]
+            current = _current_rows(conn, sql, keys)
+            previous = _previous(conn, report, keys)
+            changes = []
+            gone = []
+            for k in keys:
+                cur, prev = current.get(k), previous.get(k)
+                if cur is None and prev is None:
+                    continue
+                if cur is not None and prev is not None and _fingerprint(cur) == tuple(prev[1:]):
+                    continue
+                changes.append((prev, cur))
+                if cur is None:
+                    gone.append(k)
+            _store(conn, report, [cur for _prev, cur in changes if cur is not None])
+            for part in _chunks(gone):
+                conn.execute(f"DELETE FROM report_fingerprints WHERE report = ? AND item_key IN "
+                             f"({', '.join('?' * len(part))})", [report] + part)
+            _set_run(conn, report, mark)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        logger.debug("report_delta: %s: %d keys touched since %d, %d changed", report, len(keys), high_water,
+                     len(changes))
+        return since, changes
+    finally:
+        conn.close()
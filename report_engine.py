@@ -0,0 +1,298 @@
+"""Declarative PDF reports.
+
+Each report used to be its own ``build_*`` function repeating the same
+steps: run the SQL, group the rows with nested dicts, format every cell
+with ``_fmt_int``/``str``, build a ``TableStyle``, guess the numeric
+columns from the header text and lay out headings and page breaks. A
+report is now a ``ReportSpec`` and ``render(spec, db_path, output_path,
+**params)`` is the one rendering path for all of them:
+
+* ``Column(header, index, width, fmt, max_len, align, total)``: where the
+  value comes from in the row and how it is shown. ``fmt`` is "text",
+  "str" (``str(v or 0)``), "int" (``fmt_int``), "abs_int", "opt_int" (blank
+  for None) or a function
+  (see ``report_format``, which formats the cells a column at a time);
+  number formats are right-aligned unless ``align`` says otherwise;
+* ``Group(index, label, style, space, page_break, default, max_len)``: one
+  heading level. Rows must come ordered by the group keys: groups are the
+  runs of equal keys, so grouping is a single pass and ``{count}`` in the
+  label is the size of the run;
+* the rows come from ``sql`` (static), ``query(ctx) -> (sql, args)`` or
+  ``load(db_path, ctx) -> rows``, through the report cache. ``ctx`` holds
+  the params plus ``db_path``; ``load`` may add values for ``title``,
+  ``columns`` or ``empty_text``, which can be functions of ``ctx``.
+
+Per spec the column formatters and the table style are built once and
+kept; the paragraph styles are shared by all reports.
+
+reportlab is imported inside the functions, so the first report of a
+session also paid for the imports, the stylesheet and the font setup.
+``warm_up()`` does that ahead of time (the main window calls it on a
+background thread once it is up and idle) by rendering a one-row document
+into memory, which goes through the same code as a real report.
+"""
+import io
+import logging
+import os
+import time
+
+from db_schema import ensure_schema
+from count_filters import date_range_label
+from report_api import ReportError
+from report_cache import fetch_rows
+from report_export import export_rows, output_format
+from report_format import NUMERIC_FORMATS, cell_formatter, fmt_int, format_rows
+from report_jobs import track_doc
+
+logger = logging.getLogger(__name__)
+
+PAGE_MARGIN = 18
+HEADER_BG = "#d3d3d3"
+
+
+class Column:
+    __slots__ = ("header", "index", "width", "fmt", "max_len", "align", "total", "format")
+
+    def __init__(self, header, index, width, fmt="text", max_len=None, align=None, total=False):
+        self.header = header
+        self.index = index
+        self.width = width
+        self.fmt = fmt
+        self.max_len = max_len
+        self.align = align or ("RIGHT" if fmt in NUMERIC_FORMATS else "LEFT")
+        # sum the raw values into a total row under the table
+        self.total = total
+        self.format = cell_formatter(fmt, max_len)
+
+
+class Group:
+    __slots__ = ("index", "label", "style", "space", "page_break", "default", "max_len", "name")
+
+    def __init__(self, index, label, style="Heading2", space=6, page_break=False, default=None, max_len=None,
+                 name=None):
+        self.index = index
+        self.label = label  # format string with {value} and {count}
+        self.style = style
+        self.space = space
+        # page break between sibling groups (not after the last one)
+        self.page_break = page_break
+        self.default = default
+        self.max_len = max_len
+        # column header in CSV/XLSX; by default the label up to the ':'
+        self.name = name or label.split(":")[0].strip()
+
+    def key(self, row):
+        value = row[self.index]
+        if self.default is not None:
+            value = value or self.default
+        if self.max_len:
+            value = str(value or "")[:self.max_len]
+        return value
+
+    def runs(self, rows, lo, hi):
+        """[(key, start, end)]: the runs of equal keys in ``rows[lo:hi]``."""
+        runs = []
+        start = lo
+        key = self.key(rows[lo])
+        for i in range(lo + 1, hi):
+            k = self.key(rows[i])
+            if k != key:
+                runs.append((key, start, i))
+                key, start = k, i
+        runs.append((key, start, hi))
+        return runs
+
+
+class ReportSpec:
+    """A report: where its rows come from and how they are laid out."""
+
+    def __init__(self, name, title, columns, sql=None, query=None, load=None, cache_name=None, groups=(),
+                 font_size=8, empty_text="No hay registros para reportar.", check=None):
+        self.name = name
+        self.title = title
+        self.columns = columns
+        self.sql = sql
+        self.query = query
+        self.load = load
+        self.cache_name = cache_name or name
+        self.groups = tuple(groups)
+        self.font_size = font_size
+        self.empty_text = empty_text
+        # check(params) raises ReportError for missing/invalid params, before touching the database
+        self.check = check
+        self._compiled = None
+
+    def fetch(self, db_path, ctx):
+        if self.load is not None:
+            return self.load(db_path, ctx)
+        if self.query is not None:
+            sql, args = self.query(ctx)
+            return fetch_rows(db_path, self.cache_name, sql, args)
+        return fetch_rows(db_path, self.cache_name, self.sql)
+
+    def compiled(self, ctx):
+        """(columns, table style commands); cached unless the columns depend on ctx."""
+        if self._compiled is not None:
+            return self._compiled
+        columns = self.columns(ctx) if callable(self.columns) else self.columns
+        compiled = (columns, _table_commands(columns, self.font_size))
+        if not callable(self.columns):
+            self._compiled = compiled
+        return compiled
+
+
+def _table_commands(columns, font_size):
+    from reportlab.lib import colors
+    cmds = [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor(HEADER_BG)),
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("FONTSIZE", (0, 0), (-1, -1), font_size),
+        ("LEFTPADDING", (0, 0), (-1, -1), 4),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 4),
+    ]
+    for i, col in enumerate(columns):
+        if col.align != "LEFT":
+            cmds.append(("ALIGN", (i, 1), (i, -1), col.align))
+    return cmds
+
+
+_styles = None
+
+
+def paragraph_styles():
+    """The reportlab sample stylesheet, built once."""
+    global _styles
+    if _styles is None:
+        from reportlab.lib.styles import getSampleStyleSheet
+        _styles = getSampleStyleSheet()
+    return _styles
+
+
+def _table_flowables(rows, columns, commands):
+    from reportlab.platypus import Table, TableStyle
+    from report_tables import ChunkedTable
+
+    data = [[c.header for c in columns]]
+    data.extend(format_rows(rows, columns))
+    table = ChunkedTable(data, repeatRows=1, hAlign="LEFT", colWidths=[c.width for c in columns])
+    table.setStyle(commands)
+    flowables = [table]
+    if any(c.total for c in columns):
+        sums = [fmt_int(sum((r[c.index] or 0) for r in rows)) if c.total else "" for c in columns]
+        if not columns[0].total:
+            sums[0] = "Total"
+        totals = Table([sums], hAlign="LEFT", colWidths=[c.width for c in columns])
+        totals.setStyle(TableStyle([cmd for cmd in commands if cmd[0] != "BACKGROUND"] + [
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            *[("ALIGN", (i, 0), (i, 0), c.align) for i, c in enumerate(columns) if c.align != "LEFT"],
+        ]))
+        flowables.append(totals)
+    return flowables
+
+
+def _group_story(story, rows, lo, hi, level, groups, table):
+    from reportlab.platypus import PageBreak, Paragraph, Spacer
+
+    group = groups[level]
+    style = paragraph_styles()[group.style]
+    runs = group.runs(rows, lo, hi)
+    for n, (key, start, end) in enumerate(runs):
+        story.append(Paragraph(group.label.format(value=key, count=end - start), style))
+        story.append(Spacer(1, group.space))
+        if level + 1 < len(groups):
+            _group_story(story, rows, start, end, level + 1, groups, table)
+        else:
+            story.extend(table(rows[start:end]))
+            story.append(Spacer(1, 8))
+        if group.page_break and n < len(runs) - 1:
+            story.append(PageBreak())
+
+
+def warm_up():
+    """Import and set up the reporting stack (reportlab, styles, fonts, openpyxl). Returns the seconds taken."""
+    start = time.perf_counter()
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+    styles = paragraph_styles()
+    columns = [Column("Texto", 0, 80), Column("Número", 1, 60, "int")]
+    doc = SimpleDocTemplate(io.BytesIO(), pagesize=landscape(A4), rightMargin=PAGE_MARGIN, leftMargin=PAGE_MARGIN,
+                            topMargin=PAGE_MARGIN, bottomMargin=PAGE_MARGIN)
+    # Helvetica / Helvetica-Bold in the heading, header row and body, as in the reports
+    story = [Paragraph("warm-up", styles["Heading1"]), Paragraph("warm-up", styles["Normal"]), Spacer(1, 8)]
+    story.extend(_table_flowables([("x", 1)], columns, _table_commands(columns, 8)))
+    doc.build(story)
+    try:
+        import openpyxl  # noqa: F401  (XLSX export)
+    except ImportError:
+        pass
+    seconds = time.perf_counter() - start
+    logger.info("report_engine: reporting stack warmed up in %.2f s", seconds)
+    return seconds
+
+
+def render(spec, db_path, output_path, **params):
+    """Generate ``spec`` into ``output_path``. Returns ``{"path", "rows", "pages"}``; raises ReportError.
+
+    ``.csv``, ``.xlsx`` and ``.html`` paths get the same rows without the PDF
+    layout (see ``report_export``); their ``pages`` is None.
+    """
+    if spec.check is not None:
+        spec.check(params)
+    if not os.path.exists(db_path):
+        raise ReportError(f"No se encontró la base de datos: {db_path}")
+    ensure_schema(db_path)
+
+    ctx = dict(params, db_path=db_path)
+    try:
+        rows = spec.fetch(db_path, ctx)
+    except ReportError:
+        raise
+    except Exception as e:
+        raise ReportError(f"Error al leer la base de datos: {e}") from e
+
+    columns, commands = spec.compiled(ctx)
+    title = spec.title(ctx) if callable(spec.title) else spec.title
+    subtitle = None
+    if ctx.get("date_from") or ctx.get("date_to"):
+        subtitle = date_range_label(ctx.get("date_from"), ctx.get("date_to"))
+
+    fmt = output_format(output_path)
+    if fmt != "pdf":
+        try:
+            export_rows(fmt, output_path, spec, ctx, title, subtitle, columns, rows)
+        except ReportError:
+            raise
+        except Exception as e:
+            raise ReportError(f"Error al generar el archivo: {e}") from e
+        return {"path": output_path, "rows": len(rows), "pages": None}
+
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+    styles = paragraph_styles()
+    doc = SimpleDocTemplate(output_path, pagesize=landscape(A4), rightMargin=PAGE_MARGIN, leftMargin=PAGE_MARGIN,
+                            topMargin=PAGE_MARGIN, bottomMargin=PAGE_MARGIN)
+    story = [Paragraph(title, styles["Heading1"])]
+    if subtitle:
+        story.append(Paragraph(subtitle, styles["Normal"]))
+    story.append(Spacer(1, 8))
+
+    if not rows:
+        empty_text = spec.empty_text(ctx) if callable(spec.empty_text) else spec.empty_text
+        story.append(Paragraph(empty_text, styles["Normal"]))
+    elif spec.groups:
+        _group_story(story, rows, 0, len(rows), 0, spec.groups,
+                     lambda part: _table_flowables(part, columns, commands))
+    else:
+        story.extend(_table_flowables(rows, columns, commands))
+
+    track_doc(doc)
+    try:
+        doc.build(story)
+    except Exception as e:
+        raise ReportError(f"Error al generar el PDF: {e}") from e
+    logger.debug("report_engine: %s -> %s (%d rows, %d pages)", spec.name, output_path, len(rows), doc.page)
+    return {"path": output_path, "rows": len(rows), "pages": doc.page}
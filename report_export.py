@@ -0,0 +1,201 @@
+"""CSV, XLSX and HTML output for the report specs.
+
+A PDF spends almost all of its time in the reportlab layout, and for a
+review in a spreadsheet only the rows are needed. ``report_engine.render``
+picks the output from the file extension (``.csv``, ``.xlsx``, ``.html``;
+anything else is a PDF) and these writers take the same rows (same query,
+filters and order) without any layout:
+
+* CSV: streamed row by row with ``csv.writer`` (utf-8-sig, like
+  ``index.csv`` of the report pack);
+* XLSX: openpyxl write-only mode (rows are written out as they come,
+  nothing is kept per cell), bold header, frozen first row and autofilter;
+* HTML: one self-contained file (inline CSS) laid out like the PDF: title,
+  group headings and one table per group.
+
+In CSV and XLSX the group levels become the first columns, one row per
+record, so the sheet can be filtered and pivoted; numbers are written as
+numbers (rounded like the PDF shows them) and text is not truncated.
+"""
+import csv
+import html
+import logging
+import re
+
+from report_api import ReportError
+from report_format import format_column, to_int
+from report_jobs import track_rows
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {".csv": "csv", ".xlsx": "xlsx", ".html": "html", ".htm": "html"}
+
+# filetypes for the save dialogs of the report buttons (PDF first, the default)
+REPORT_FILETYPES = [
+    ("PDF", "*.pdf"),
+    ("CSV", "*.csv"),
+    ("Excel", "*.xlsx"),
+    ("HTML", "*.html"),
+]
+
+# progress / cancel check every this many rows
+_STEP = 2000
+
+
+def output_format(path):
+    """'csv', 'xlsx', 'html' or 'pdf' for an output path, by extension."""
+    lower = str(path).lower()
+    for ext, fmt in EXPORT_FORMATS.items():
+        if lower.endswith(ext):
+            return fmt
+    return "pdf"
+
+
+def _raw(col):
+    """Cell value for CSV/XLSX: numbers as numbers, full text."""
+    if callable(col.fmt):
+        return col.fmt
+    if col.fmt == "int":
+        return lambda v: to_int(v or 0)
+    if col.fmt == "abs_int":
+        return lambda v: abs(to_int(v or 0))
+    if col.fmt == "opt_int":
+        return lambda v: None if v is None else to_int(v)
+    if col.fmt == "str":
+        return lambda v: v or 0
+    return lambda v: v or ""
+
+
+def _flat_rows(rows, columns, groups):
+    keys = [g.key for g in groups]
+    cells = [(c.index, _raw(c)) for c in columns]
+    total = len(rows)
+    for n, r in enumerate(rows):
+        if n % _STEP == 0:
+            track_rows(n, total)
+        yield [k(r) for k in keys] + [f(r[i]) for i, f in cells]
+
+
+def _header(columns, groups):
+    return [g.name for g in groups] + [c.header for c in columns]
+
+
+def write_csv(path, columns, groups, rows):
+    with open(path, "w", newline="", encoding="utf-8-sig") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(_header(columns, groups))
+        writer.writerows(_flat_rows(rows, columns, groups))
+
+
+def write_xlsx(path, sheet_name, columns, groups, rows):
+    try:
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+        from openpyxl.styles import Font
+        from openpyxl.utils import get_column_letter
+    except ImportError:
+        raise ReportError("No se encontró 'openpyxl'. Instala openpyxl (ej: pip install openpyxl)") from None
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(re.sub(r"[\[\]:*?/\\]", "_", sheet_name)[:31] or "Reporte")
+    header = _header(columns, groups)
+    # column widths from the PDF widths (points; a character is about 6)
+    widths = [20] * len(groups) + [max(8, c.width / 6) for c in columns]
+    for i, w in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = w
+    ws.freeze_panes = "A2"
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(header))}{len(rows) + 1}"
+    bold = Font(bold=True)
+    cells = []
+    for h in header:
+        cell = WriteOnlyCell(ws, value=h)
+        cell.font = bold
+        cells.append(cell)
+    ws.append(cells)
+    for row in _flat_rows(rows, columns, groups):
+        ws.append([ILLEGAL_CHARACTERS_RE.sub("", v) if isinstance(v, str) else v for v in row])
+    wb.save(path)
+
+
+_HTML_HEAD = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: Helvetica, Arial, sans-serif; font-size: {font_size}pt; margin: 18px; }}
+table {{ border-collapse: collapse; margin-bottom: 8px; }}
+th, td {{ border: 0.5px solid grey; padding: 2px 4px; vertical-align: middle; }}
+th {{ background: #d3d3d3; text-align: left; }}
+td.n {{ text-align: right; }}
+tfoot td {{ font-weight: bold; }}
+</style>
+</head>
+<body>
+"""
+
+
+def write_html(path, title, subtitle, columns, groups, rows, font_size, empty_text):
+    esc = html.escape
+    numeric = [c.align != "LEFT" for c in columns]
+    head = "<thead><tr>" + "".join(f"<th>{esc(c.header)}</th>" for c in columns) + "</tr></thead>\n"
+    total = len(rows)
+    done = [0]
+
+    def table(out, lo, hi):
+        part = rows[lo:hi]
+        # same cells as the PDF, without the truncation for the page width
+        cols = [format_column([r[c.index] for r in part], c.fmt) for c in columns]
+        out.write("<table>\n" + head + "<tbody>\n")
+        for n, cells in enumerate(zip(*cols)):
+            if (done[0] + n) % _STEP == 0:
+                track_rows(done[0] + n, total)
+            out.write("<tr>" + "".join(f'<td class="n">{esc(str(v))}</td>' if num else f"<td>{esc(str(v))}</td>"
+                                       for v, num in zip(cells, numeric)) + "</tr>\n")
+        out.write("</tbody>\n")
+        if any(c.total for c in columns):
+            sums = [format_column([sum((r[c.index] or 0) for r in part)], "int")[0] if c.total else "" for c in columns]
+            if not columns[0].total:
+                sums[0] = "Total"
+            out.write("<tfoot><tr>" + "".join(f'<td class="n">{esc(s)}</td>' if num else f"<td>{esc(s)}</td>"
+                                              for s, num in zip(sums, numeric)) + "</tr></tfoot>\n")
+        out.write("</table>\n")
+        done[0] += hi - lo
+
+    def section(out, lo, hi, level):
+        group = groups[level]
+        tag = f"h{group.style[-1]}" if group.style[-1:].isdigit() else "h3"
+        for key, start, end in group.runs(rows, lo, hi):
+            out.write(f"<{tag}>{esc(group.label.format(value=key, count=end - start))}</{tag}>\n")
+            if level + 1 < len(groups):
+                section(out, start, end, level + 1)
+            else:
+                table(out, start, end)
+
+    with open(path, "w", encoding="utf-8") as out:
+        out.write(_HTML_HEAD.format(title=esc(title), font_size=font_size))
+        out.write(f"<h1>{esc(title)}</h1>\n")
+        if subtitle:
+            out.write(f"<p>{esc(subtitle)}</p>\n")
+        if not rows:
+            out.write(f"<p>{esc(empty_text)}</p>\n")
+        elif groups:
+            section(out, 0, len(rows), 0)
+        else:
+            table(out, 0, len(rows))
+        out.write("</body>\n</html>\n")
+
+
+def export_rows(fmt, path, spec, ctx, title, subtitle, columns, rows):
+    """Write ``rows`` of ``spec`` as ``fmt`` ('csv', 'xlsx' or 'html') to ``path``."""
+    if fmt == "csv":
+        write_csv(path, columns, spec.groups, rows)
+    elif fmt == "xlsx":
+        write_xlsx(path, spec.name, columns, spec.groups, rows)
+    elif fmt == "html":
+        empty_text = spec.empty_text(ctx) if callable(spec.empty_text) else spec.empty_text
+        write_html(path, title, subtitle, columns, spec.groups, rows, spec.font_size, empty_text)
+    else:
+        raise ValueError(f"unknown export format: {fmt!r}")
+    logger.debug("report_export: %s -> %s (%d rows)", spec.name, path, len(rows))
@@ -0,0 +1,128 @@
+"""Column-wise cell formatting for the PDF reports.
+
+A report cell used to be formatted one value at a time: ``fmt_int`` does a
+``float()`` parse, ``round``, ``int``, an f-string and a ``replace`` for
+every number, which is most of the data preparation time of the big
+reports. ``format_rows(rows, columns)`` formats a whole column at once
+instead and returns the finished row lists for the table:
+
+* integer columns ("int", "abs_int") go through NumPy: one float array per
+  column, rounded in bulk, and only the *distinct* values are formatted
+  with the thousands separator (a count column has few of them), then
+  spread back with the ``np.unique`` inverse index. Columns that NumPy
+  cannot take as numbers (text, huge ints) use ``fmt_int`` per cell;
+* text columns are truncated with one comprehension per column;
+* "str" and custom formats are mapped over the column;
+* the cyclic garbage collector is paused while the rows are built: with
+  hundreds of thousands of new lists it otherwise runs full collections
+  over and over and takes more time than the formatting itself.
+
+Without NumPy every column is mapped with the per-cell formatters, same
+output. ``format_rows_per_cell`` is the old row-by-row path, kept as the
+reference (see ``Scripts/bench_report_format.py``).
+"""
+import gc
+from operator import itemgetter
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+NUMERIC_FORMATS = ("int", "str", "abs_int", "opt_int")
+
+# int64 limit; beyond it (or for non-finite values) fmt_int's own handling applies
+_INT64_MAX = 2.0 ** 63
+
+
+def to_int(x):
+    """A number or numeric string rounded to int; 0 when it is not a number."""
+    try:
+        return int(round(float(x)))
+    except Exception:
+        try:
+            return int(x)
+        except Exception:
+            return 0
+
+
+def fmt_int(x):
+    """Format a value as integer with thousands separator (dot).
+
+    Accepts numbers or strings; returns a string.
+    """
+    return f"{to_int(x):,}".replace(',', '.')
+
+
+def cell_formatter(fmt, max_len=None):
+    """The per-cell function for a column format ("text", "str", "int", "abs_int", "opt_int" or a function)."""
+    if callable(fmt):
+        return fmt
+    if fmt == "int":
+        return lambda v: fmt_int(v or 0)
+    if fmt == "abs_int":
+        # rounding is symmetric, so this is fmt_int(abs(v)) that also takes text like fmt_int does
+        return lambda v: fmt_int(v or 0).lstrip('-')
+    if fmt == "str":
+        return lambda v: str(v or 0)
+    if fmt == "opt_int":
+        # like "int", but a missing value (None) stays blank instead of 0
+        return lambda v: "" if v is None else fmt_int(v)
+    if fmt != "text":
+        raise ValueError(f"unknown column format: {fmt!r}")
+    if max_len:
+        return lambda v: str(v or "")[:max_len]
+    return lambda v: v or ""
+
+
+def _int_column(values, absolute):
+    """``fmt_int`` of a whole column (``abs`` first when ``absolute``); None if NumPy cannot take it."""
+    try:
+        arr = np.array([0 if v is None else v for v in values], dtype=np.float64)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    # fmt_int turns NaN/inf into 0
+    arr[~np.isfinite(arr)] = 0
+    # np.rint rounds half to even, like round()
+    arr = np.rint(np.abs(arr) if absolute else arr)
+    if arr.size and np.abs(arr).max() >= _INT64_MAX:
+        return None
+    uniq, inverse = np.unique(arr.astype(np.int64), return_inverse=True)
+    texts = np.array([f"{n:,}".replace(',', '.') for n in uniq.tolist()], dtype=object)
+    return texts[inverse.reshape(-1)].tolist()
+
+
+def format_column(values, fmt, max_len=None):
+    """The formatted cells of one column (a list of raw values)."""
+    if np is not None and fmt in ("int", "abs_int"):
+        out = _int_column(values, fmt == "abs_int")
+        if out is not None:
+            return out
+    if fmt == "text":
+        if max_len:
+            return [str(v or "")[:max_len] for v in values]
+        return [v or "" for v in values]
+    return list(map(cell_formatter(fmt, max_len), values))
+
+
+def format_rows(rows, columns):
+    """Finished table rows (lists of cells) for ``columns`` (objects with ``index``, ``fmt``, ``max_len``)."""
+    if not rows:
+        return []
+    # Only lists of strings are built here, which cannot form cycles, but allocating
+    # hundreds of thousands of them triggers a full collection over and over (most
+    # of the time for a big report), so the cyclic GC is paused meanwhile.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        cols = [format_column(list(map(itemgetter(c.index), rows)), c.fmt, c.max_len) for c in columns]
+        return list(map(list, zip(*cols)))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def format_rows_per_cell(rows, columns):
+    """The same rows formatted one cell at a time (reference path)."""
+    pairs = [(c.index, cell_formatter(c.fmt, c.max_len)) for c in columns]
+    return [[fmt(r[i]) for i, fmt in pairs] for r in rows]
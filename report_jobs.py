@@ -0,0 +1,226 @@
+"""Report jobs rendered on a worker thread.
+
+The ``generate_pdf_report_*`` buttons used to run the query and
+``doc.build`` on the Tk thread, and the window froze ("Not Responding")
+while a long report rendered. The buttons now only ask for their
+parameters and ``submit`` the ``build_*`` function here; jobs run one at a
+time, in order, on a daemon thread while the form stays usable.
+
+Progress is per phase: ``query`` until the layout starts, then ``layout``
+(fraction of the story laid out) and ``pages`` (pages written). Builders
+report it by calling ``track_doc(doc)`` before ``doc.build``; outside a
+job (CLI, report pack) that does nothing. CSV/XLSX/HTML exports report
+``export`` with ``track_rows``. ``cancel()`` stops the running job at its
+next progress step and deletes the partial file.
+
+``on_done(job)`` callbacks are delivered by ``pump()``, which the main
+window calls from its Tk loop (like ``change_bus.pump``).
+
+Every job records ``seconds`` from ``submit`` to the end (wait in the queue
+included). The first report of the session is logged at INFO, to compare
+the time-to-first-report with and without ``report_engine.warm_up``.
+"""
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_ids = itertools.count(1)
+_local = threading.local()
+
+
+class ReportCancelled(Exception):
+    """Raised inside ``doc.build`` when the job was cancelled."""
+
+
+class ReportJob:
+    """One queued report. ``state``: queued, running, done, error or cancelled."""
+
+    def __init__(self, title, builder, db_path, output_path, params, on_done):
+        self.id = next(_ids)
+        self.title = title
+        self.builder = builder
+        self.db_path = db_path
+        self.output_path = output_path
+        self.params = params
+        self.on_done = on_done
+        self.state = "queued"
+        self.phase = None
+        self.fraction = None
+        self.pages = 0
+        self.result = None
+        self.error = None
+        self.submitted = time.monotonic()
+        self.seconds = None
+        self._flowables = 0
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def describe(self):
+        """Short Spanish status for the main window."""
+        if self.state == "queued":
+            return "en cola"
+        if self.phase == "pages":
+            return f"página {self.pages}"
+        if self.phase == "layout":
+            return f"maquetando {int((self.fraction or 0) * 100)}%"
+        if self.phase == "export":
+            return f"exportando {int((self.fraction or 0) * 100)}%"
+        return "consultando datos"
+
+    def _on_doc_progress(self, typ, value):
+        # reportlab progress callback, called from inside doc.build on the worker thread
+        if self._cancel.is_set():
+            raise ReportCancelled()
+        if typ == "STARTED":
+            self.phase = "layout"
+        elif typ == "SIZE_EST":
+            self._flowables = value or 0
+        elif typ == "PROGRESS" and self._flowables:
+            self.fraction = min(value / self._flowables, 1.0)
+        elif typ == "PAGE":
+            self.phase = "pages"
+            self.pages = value
+
+
+def track_doc(doc):
+    """Report the layout and page progress of ``doc`` to the running job, if any."""
+    job = getattr(_local, "job", None)
+    if job is not None:
+        doc.setProgressCallBack(job._on_doc_progress)
+
+
+def track_rows(done, total):
+    """Progress of a CSV/XLSX/HTML export (``report_export``); raises ReportCancelled if the job was cancelled."""
+    job = getattr(_local, "job", None)
+    if job is None:
+        return
+    if job._cancel.is_set():
+        raise ReportCancelled()
+    job.phase = "export"
+    job.fraction = done / total if total else 1.0
+
+
+class ReportJobQueue:
+    """Runs report jobs in submission order on one daemon thread."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._finished = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = []
+        self._current = None
+        self._thread = None
+        self._idle = threading.Event()
+        self._idle.set()
+        self._first = True
+
+    def submit(self, title, builder, db_path, output_path, params=None, on_done=None):
+        """Queue ``builder(db_path, output_path, **params)``. Returns the ReportJob."""
+        job = ReportJob(title, builder, db_path, output_path, dict(params or {}), on_done)
+        with self._lock:
+            self._pending.append(job)
+            self._idle.clear()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ReportJobs", daemon=True)
+                self._thread.start()
+        self._queue.put(job)
+        return job
+
+    def current(self):
+        return self._current
+
+    def pending(self):
+        """Jobs waiting behind the running one."""
+        with self._lock:
+            return [j for j in self._pending if j is not self._current]
+
+    def cancel(self, job=None):
+        """Cancel ``job`` (default: the running one)."""
+        job = job or self._current
+        if job is not None:
+            job.cancel()
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = list(self._pending)
+        for job in jobs:
+            job.cancel()
+
+    def wait_idle(self, timeout=None):
+        """Block until every submitted job has finished (scripts and shutdown)."""
+        return self._idle.wait(timeout)
+
+    def pump(self):
+        """Deliver ``on_done`` for finished jobs (call from the Tk loop)."""
+        while True:
+            try:
+                job = self._finished.get_nowait()
+            except queue.Empty:
+                return
+            if job.on_done is not None:
+                try:
+                    job.on_done(job)
+                except Exception:
+                    logger.exception("report_jobs: on_done of %s failed", job.title)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            self._current = job
+            try:
+                self._execute(job)
+            finally:
+                job.seconds = time.monotonic() - job.submitted
+                if self._first and job.state == "done":
+                    self._first = False
+                    logger.info("report_jobs: first report of the session (%s) in %.2f s", job.title, job.seconds)
+                else:
+                    logger.debug("report_jobs: %s %s in %.2f s", job.title, job.state, job.seconds)
+                with self._lock:
+                    self._current = None
+                    self._pending.remove(job)
+                    if not self._pending:
+                        self._idle.set()
+                self._finished.put(job)
+
+    def _execute(self, job):
+        if job.cancelled:
+            job.state = "cancelled"
+            return
+        job.state = "running"
+        job.phase = "query"
+        _local.job = job
+        try:
+            job.result = job.builder(job.db_path, job.output_path, **job.params)
+            job.state = "done"
+        except Exception as e:
+            if job.cancelled:
+                job.state = "cancelled"
+                try:
+                    os.remove(job.output_path)
+                except OSError:
+                    pass
+            else:
+                logger.exception("report_jobs: %s failed", job.title)
+                job.state = "error"
+                job.error = e
+        finally:
+            _local.job = None
+
+
+_jobs = ReportJobQueue()
+
+
+def get_report_jobs():
+    return _jobs
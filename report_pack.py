@@ -0,0 +1,149 @@
+"""End-of-day report pack.
+
+At close every report of the "Ejecutar reporte" dropdown used to be run
+one by one through its dialogs. ``generate_pack`` renders a list of
+reports (``report_api`` names), optionally one extra PDF per deposit and
+per counter for the reports that take those filters, on a process pool:
+``doc.build`` is pure Python, so threads would share one core while
+processes run one report per core and the pack takes about as long as
+its slowest report.
+
+Everything goes into ``reports/pack_<YYYYmmdd_HHMMSS>/`` next to the
+database, with ``index.csv`` listing each file, its parameters, rows,
+pages, seconds and error (if any). A failing report does not stop the
+others.
+
+``fmt`` ("csv", "xlsx" or "html" instead of "pdf") writes the same files
+in that format, without the PDF layout (see ``report_export``).
+
+Command line::
+
+    python -m report_api pack [--db inventariovlm.db] [--reports a,b] [--by-deposit] [--by-counter] [--workers N]
+                              [--format pdf|csv|xlsx|html]
+"""
+import csv
+import logging
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from db_schema import ensure_schema
+from report_api import REPORTS, run_report
+from report_cache import configure_report_cache, default_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# the reports of the ui_main dropdown that need no per-run input, in its order
+PACK_REPORTS = (
+    "por_deposito",
+    "por_contador",
+    "verificacion",
+    "verificacion_remarks",
+    "diferencias",
+    "diferencias_resumen",
+    "nocode_items",
+    "items_not_in_inventory",
+    "diferencias_por_item",
+    "diferencias_threshold",
+    "diferencias_por_counter",
+    "inventario_por_ubicacion",
+    "item_conteo",
+)
+
+INDEX_COLUMNS = ("file", "report", "title", "params", "rows", "pages", "seconds", "error")
+
+
+def pack_dir(db_path):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "reports")
+
+
+def _slug(value):
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", str(value)).strip("_") or "sin_nombre"
+
+
+def plan_pack(db_path, names=PACK_REPORTS, by_deposit=False, by_counter=False, fmt="pdf"):
+    """[(file_name, report, params)] for the pack: each report once, plus the per-deposit/counter splits."""
+    deposits, counters = [], []
+    conn = sqlite3.connect(db_path)
+    try:
+        if by_deposit:
+            deposits = [r[0] for r in conn.execute(
+                "SELECT DISTINCT deposit_id FROM inventory_count WHERE deposit_id IS NOT NULL ORDER BY deposit_id")]
+        if by_counter:
+            counters = [r[0] for r in conn.execute(
+                "SELECT DISTINCT counter_name FROM inventory_count WHERE counter_name IS NOT NULL ORDER BY counter_name")]
+    finally:
+        conn.close()
+    jobs = []
+    for name in names:
+        accepted = REPORTS[name][2]
+        jobs.append((f"{name}.{fmt}", name, {}))
+        if "deposits" in accepted:
+            jobs.extend((f"{name}_dep{_slug(d)}.{fmt}", name, {"deposits": [d]}) for d in deposits)
+        if "counters" in accepted:
+            jobs.extend((f"{name}_{_slug(c)}.{fmt}", name, {"counters": [c]}) for c in counters)
+    return jobs
+
+
+def _run_job(name, db_path, output_path, params):
+    # runs in a worker process; errors are returned so the rest of the pack goes on
+    try:
+        return run_report(name, db_path, output_path, **params)
+    except Exception as e:
+        logger.exception("report_pack: %s failed", output_path)
+        return {"report": name, "path": output_path, "error": str(e) or e.__class__.__name__}
+
+
+def generate_pack(db_path, names=PACK_REPORTS, by_deposit=False, by_counter=False, dest_dir=None,
+                  workers=None, progress=None, fmt="pdf"):
+    """Render the pack into a new timestamped folder. Returns (folder, [stats per file]).
+
+    ``progress(done, total, stats)`` is called, in the calling thread, as each file finishes.
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(db_path)
+    # migrations once here, so the workers only read
+    ensure_schema(db_path)
+    jobs = plan_pack(db_path, names, by_deposit, by_counter, fmt)
+    folder = os.path.join(dest_dir or pack_dir(db_path), f"pack_{datetime.now():%Y%m%d_%H%M%S}")
+    os.makedirs(folder, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    start = time.perf_counter()
+    results = {}
+    # the workers share query results through the on-disk report cache
+    with ProcessPoolExecutor(max_workers=workers, initializer=configure_report_cache,
+                             initargs=(default_cache_dir(db_path),)) as pool:
+        futures = {pool.submit(_run_job, name, db_path, os.path.join(folder, file_name), params): (file_name, name, params)
+                   for file_name, name, params in jobs}
+        for fut in as_completed(futures):
+            file_name, name, params = futures[fut]
+            try:
+                stats = fut.result()
+            except Exception as e:  # worker process died
+                stats = {"report": name, "error": str(e) or e.__class__.__name__}
+            results[file_name] = stats
+            if progress is not None:
+                progress(len(results), len(jobs), stats)
+    elapsed = time.perf_counter() - start
+    ordered = []
+    with open(os.path.join(folder, "index.csv"), "w", newline="", encoding="utf-8-sig") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(INDEX_COLUMNS)
+        for file_name, name, params in jobs:
+            stats = results.get(file_name, {})
+            ordered.append(dict(stats, file=file_name))
+            writer.writerow([
+                file_name if not stats.get("error") else "",
+                name,
+                REPORTS[name][3],
+                "; ".join(f"{k}={','.join(map(str, v)) if isinstance(v, list) else v}" for k, v in params.items()),
+                stats.get("rows", ""),
+                stats.get("pages", ""),
+                stats.get("seconds", ""),
+                stats.get("error", ""),
+            ])
+    logger.info("report_pack: %d files in %s (%.1f s, %d workers)", len(jobs), folder, elapsed, workers)
+    return folder, ordered
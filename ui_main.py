@@ -1,14 +1,28 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 from tkcalendar import DateEntry
-from db_utils import get_deposits, get_racks
+from db_utils import get_deposits, get_racks, get_counters, load_item_catalog, find_item
+from count_writer import CountWriter
+from db_maintenance import MaintenanceService
+from db_backup import snapshot, snapshot_before, rotate
+from report_cache import configure_report_cache, default_cache_dir
+from report_jobs import get_report_jobs
+import change_bus
+from ref_cache import get_ref_cache
+from location_resolver import get_location_resolver
+from db_schema import ensure_schema
+from item_keys import relink_item_ids
+from count_recompute import stage_stock_levels, apply_stock_levels, recompute_counts, COUNT_SOURCE
 from ui_registros import mostrar_registros, mostrar_registros_resumen
 import pandas as pd
 from datetime import datetime
 import sys
 import os
 import sqlite3
+import threading
+import time
 import logging
+import multiprocessing
 
 # Basic logging configuration: change to DEBUG during development to enable debug messages
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
@@ -69,73 +83,10 @@ def main():
         cur = conn.cursor()
         insertados = 0
         failures = []
-        # helper: resolve deposit and rack values
-        def resolve_deposit(value):
-            """Return (deposit_id, deposit_description) or (None, None) if not found."""
-            if value is None or (isinstance(value, str) and value.strip() == ""):
-                return (None, None)
-            # try numeric id
-            try:
-                vid = int(str(value))
-                cur.execute("SELECT deposit_id, deposit_description FROM deposits WHERE deposit_id = ?", (vid,))
-                r = cur.fetchone()
-                if r:
-                    return (r[0], r[1] or '')
-            except Exception:
-                pass
-            # try by description (case-insensitive)
-            try:
-                cur.execute("SELECT deposit_id, deposit_description FROM deposits WHERE lower(deposit_description)=lower(?)", (str(value).strip(),))
-                r = cur.fetchone()
-                if r:
-                    return (r[0], r[1] or '')
-            except Exception:
-                pass
-            # try partial match
-            try:
-                cur.execute("SELECT deposit_id, deposit_description FROM deposits WHERE deposit_description LIKE ?", (f"%{str(value).strip()}%",))
-                r = cur.fetchone()
-                if r:
-                    return (r[0], r[1] or '')
-            except Exception:
-                pass
-            return (None, None)
-
-        def resolve_rack(value, deposit_id=None):
-            """Return (rack_id, rack_description) or (None, None) if not found."""
-            if value is None or (isinstance(value, str) and value.strip() == ""):
-                return (None, None)
-            # try numeric id
-            try:
-                vid = int(str(value))
-                cur.execute("SELECT rack_id, rack_description FROM racks WHERE rack_id = ?", (vid,))
-                r = cur.fetchone()
-                if r:
-                    return (r[0], r[1] or '')
-            except Exception:
-                pass
-            # try by description with deposit context
-            try:
-                if deposit_id:
-                    cur.execute("SELECT rack_id, rack_description FROM racks WHERE deposit_id = ? AND lower(rack_description)=lower(?)", (deposit_id, str(value).strip()))
-                    r = cur.fetchone()
-                    if r:
-                        return (r[0], r[1] or '')
-                cur.execute("SELECT rack_id, rack_description FROM racks WHERE lower(rack_description)=lower(?)", (str(value).strip(),))
-                r = cur.fetchone()
-                if r:
-                    return (r[0], r[1] or '')
-            except Exception:
-                pass
-            # try partial match
-            try:
-                cur.execute("SELECT rack_id, rack_description FROM racks WHERE rack_description LIKE ?", (f"%{str(value).strip()}%",))
-                r = cur.fetchone()
-                if r:
-                    return (r[0], r[1] or '')
-            except Exception:
-                pass
-            return (None, None)
+        # deposit / rack values are resolved in memory (see location_resolver)
+        resolver = get_location_resolver(DB_NAME)
+        resolve_deposit = resolver.resolve_deposit
+        resolve_rack = resolver.resolve_rack
 
         for idx, row in df.iterrows():
                 # Always insert new records even if duplicates exist (allow multiple records)
@@ -255,6 +206,8 @@ def main():
             except Exception as e:
                 print(f"No se pudo escribir el log de importación: {e}")
 
+        if insertados:
+            maintenance.request_analyze()
         msg = f"Importación completada. Registros insertados: {insertados}."
         if failures:
             msg += f" Fallos: {len(failures)}. Log: {fail_path}"
@@ -334,64 +287,10 @@ def main():
         insertados = 0
         failures = []
 
-        def resolve_deposit(value):
-            if value is None or (isinstance(value, str) and value.strip() == ""):
-                return (None, None)
-            try:
-                vid = int(str(value))
-                cur.execute("SELECT deposit_id, deposit_description FROM deposits WHERE deposit_id = ?", (vid,))
-                r = cur.fetchone()
-                if r:
-                    return (r[0], r[1] or '')
-            except Exception:
-                pass
-            try:
-                cur.execute("SELECT deposit_id, deposit_description FROM deposits WHERE lower(deposit_description)=lower(?)", (str(value).strip(),))
-                r = cur.fetchone()
-                if r:
-                    return (r[0], r[1] or '')
-            except Exception:
-                pass
-            try:
-                cur.execute("SELECT deposit_id, deposit_description FROM deposits WHERE deposit_description LIKE ?", (f"%{str(value).strip()}%",))
-                r = cur.fetchone()
-                if r:
-                    return (r[0], r[1] or '')
-            except Exception:
-                pass
-            return (None, None)
-
-        def resolve_rack(value, deposit_id=None):
-            if value is None or (isinstance(value, str) and value.strip() == ""):
-                return (None, None)
-            try:
-                vid = int(str(value))
-                cur.execute("SELECT rack_id, rack_description FROM racks WHERE rack_id = ?", (vid,))
-                r = cur.fetchone()
-                if r:
-                    return (r[0], r[1] or '')
-            except Exception:
-                pass
-            try:
-                if deposit_id:
-                    cur.execute("SELECT rack_id, rack_description FROM racks WHERE deposit_id = ? AND lower(rack_description)=lower(?)", (deposit_id, str(value).strip()))
-                    r = cur.fetchone()
-                    if r:
-                        return (r[0], r[1] or '')
-                cur.execute("SELECT rack_id, rack_description FROM racks WHERE lower(rack_description)=lower(?)", (str(value).strip(),))
-                r = cur.fetchone()
-                if r:
-                    return (r[0], r[1] or '')
-            except Exception:
-                pass
-            try:
-                cur.execute("SELECT rack_id, rack_description FROM racks WHERE rack_description LIKE ?", (f"%{str(value).strip()}%",))
-                r = cur.fetchone()
-                if r:
-                    return (r[0], r[1] or '')
-            except Exception:
-                pass
-            return (None, None)
+        # deposit / rack values are resolved in memory (see location_resolver)
+        resolver = get_location_resolver(DB_NAME)
+        resolve_deposit = resolver.resolve_deposit
+        resolve_rack = resolver.resolve_rack
 
         for idx, row in df.iterrows():
             # Resolve deposit/rack if present, but do not abort on failure; insert anyway with defaults
@@ -482,6 +381,8 @@ def main():
             except Exception as e:
                 print(f"No se pudo escribir el log de importación consolidado: {e}")
 
+        if insertados:
+            maintenance.request_analyze()
         msg = f"Importación consolidado completada. Registros insertados: {insertados}."
         if failures:
             msg += f" Fallos: {len(failures)}. Log: {fail_path}"
@@ -494,6 +395,149 @@ def main():
     # Increase height by ~2 cm (approx. 80 pixels) to show more options
     root.geometry("640x500")
 
+    # Migraciones de esquema (item_id, location_id); antes del catálogo y del
+    # writer para que los registros recuperados del diario usen el esquema nuevo
+    ensure_schema(DB_NAME)
+
+    # Catálogo de items en memoria (Guardar valida contra él sin ir a la BD)
+    item_catalog = load_item_catalog(DB_NAME)
+
+    def reload_item_catalog():
+        item_catalog.clear()
+        item_catalog.update(load_item_catalog(DB_NAME))
+
+    # Los registros de Guardar se escriben en segundo plano, en lotes
+    count_writer = CountWriter(DB_NAME)
+    try:
+        replayed = count_writer.start()
+        if replayed:
+            logger.info("Recovered %d unsaved records from the Guardar journal", replayed)
+    except Exception as e:
+        logger.exception("Could not start the Guardar writer")
+        messagebox.showerror("Error", f"No se pudo iniciar el guardado en segundo plano: {e}")
+
+    def respaldo_previo(action, on_done):
+        # Snapshot antes de una acción destructiva, en un hilo aparte con un diálogo modal de progreso;
+        # la acción sigue en on_done (hilo de Tk) cuando el respaldo terminó o el usuario decide continuar sin él
+        win = tk.Toplevel(root)
+        win.title("Respaldo")
+        win.transient(root)
+        win.resizable(False, False)
+        win.protocol("WM_DELETE_WINDOW", lambda: None)
+        estado = tk.StringVar(value="Creando respaldo de la base de datos...")
+        ttk.Label(win, textvariable=estado).pack(padx=16, pady=(12, 6))
+        barra = ttk.Progressbar(win, length=280, mode="indeterminate")
+        barra.pack(padx=16, pady=(0, 12))
+        barra.start(15)
+        win.grab_set()
+        state = {"done": False, "path": None, "remaining": 0, "total": 0}
+
+        def _progress(status, remaining, total):
+            state["remaining"], state["total"] = remaining, total
+
+        def _run():
+            try:
+                state["path"] = snapshot_before(DB_NAME, action, progress=_progress)
+            finally:
+                state["done"] = True
+
+        def _poll():
+            if not state["done"]:
+                # la copia es un solo paso; después se comprime
+                if state["total"] and not state["remaining"]:
+                    estado.set("Comprimiendo respaldo...")
+                root.after(100, _poll)
+                return
+            barra.stop()
+            win.grab_release()
+            win.destroy()
+            if state["path"] or messagebox.askyesno("Respaldo", "No se pudo crear el respaldo previo de la base de datos.\n¿Continuar de todos modos?", parent=root):
+                on_done()
+
+        threading.Thread(target=_run, name="DbSnapshotBefore", daemon=True).start()
+        root.after(100, _poll)
+
+    # Snapshot periódico (rotación horaria/diaria), en un hilo aparte
+    SNAPSHOT_MS = 3600000
+
+    def snapshot_periodico():
+        def _run():
+            try:
+                snapshot(DB_NAME, kind="auto")
+                rotate(DB_NAME)
+            except Exception:
+                logger.exception("Periodic snapshot failed")
+        threading.Thread(target=_run, name="DbSnapshot", daemon=True).start()
+        root.after(SNAPSHOT_MS, snapshot_periodico)
+
+    root.after(60000, snapshot_periodico)
+
+    # Resultados de las consultas de reportes: en memoria y en disco, compartidos con el paquete de reportes
+    configure_report_cache(default_cache_dir(DB_NAME))
+    report_jobs = get_report_jobs()
+
+    # Mantenimiento de la BD en segundo plano (quick_check, ANALYZE, incremental_vacuum, optimize)
+    maintenance = MaintenanceService(DB_NAME)
+    maintenance.start()
+
+    def flush_pending_counts():
+        # Make queued Guardar records visible before reading inventory_count
+        try:
+            if count_writer.flush():
+                return True
+        except Exception:
+            logger.exception("Error flushing pending Guardar records")
+        error = f"\n\nError: {count_writer.last_error}" if count_writer.last_error else ""
+        messagebox.showwarning(
+            "Aviso", f"{count_writer.pending} registros de Guardar todavía no están en la base de datos; "
+                     "no aparecen en listados ni reportes. Quedan en el diario y se recuperarán al volver a "
+                     f"abrir la aplicación.{error}", parent=root)
+        return False
+
+    def on_close():
+        try:
+            if not count_writer.stop():
+                messagebox.showwarning("Aviso", "Algunos registros no se pudieron guardar; se recuperarán al volver a abrir la aplicación.", parent=root)
+        except Exception:
+            logger.exception("Error stopping the Guardar writer")
+        try:
+            # un reporte a medias no sirve: se cancela y se borra su PDF
+            report_jobs.cancel_all()
+            report_jobs.wait_idle(5)
+        except Exception:
+            logger.exception("Error stopping report jobs")
+        try:
+            maintenance.stop()
+        except Exception:
+            logger.exception("Error stopping database maintenance")
+        root.destroy()
+
+    root.protocol("WM_DELETE_WINDOW", on_close)
+
+    def pump_changes():
+        # entrega las notificaciones publicadas desde hilos en segundo plano
+        change_bus.pump()
+        root.after(200, pump_changes)
+
+    root.after(200, pump_changes)
+
+    # Inactividad: sin teclado ni ratón durante IDLE_MS se compacta la BD poco a poco
+    IDLE_MS = 120000
+    last_input = [time.monotonic()]
+
+    def _note_input(event=None):
+        last_input[0] = time.monotonic()
+
+    root.bind_all("<Any-KeyPress>", _note_input, add="+")
+    root.bind_all("<Any-ButtonPress>", _note_input, add="+")
+
+    def check_idle():
+        if (time.monotonic() - last_input[0]) * 1000 >= IDLE_MS:
+            maintenance.idle()
+        root.after(IDLE_MS, check_idle)
+
+    root.after(IDLE_MS, check_idle)
+
     # --- Widgets principales ---
     frm = ttk.Frame(root, padding=10)
     frm.pack(fill="both", expand=True)
@@ -556,7 +600,18 @@ def main():
     entry_remark.grid(row=11, column=1, columnspan=2, sticky="w", padx=2)
     # Nombre del contador
     ttk.Label(frm, text="Contador:").grid(row=0, column=0, sticky="e")
-    combo_name = ttk.Combobox(frm, values=["LUZMERY", "MALINA", "VICTORIA"], width=18)
+    default_counters = ["LUZMERY", "MALINA", "VICTORIA"]
+
+    def counters_display():
+        # Contadores por defecto + los ya usados en inventory_count (desde la caché de referencia)
+        names = list(default_counters)
+        for c in get_counters(DB_NAME):
+            if c and c not in names:
+                names.append(c)
+        return names
+
+    combo_name = ttk.Combobox(frm, values=counters_display(), width=18,
+                              postcommand=lambda: combo_name.configure(values=counters_display()))
     combo_name.grid(row=0, column=1, sticky="w")
 
 
@@ -566,9 +621,9 @@ def main():
     date_entry.grid(row=1, column=1, sticky="w")
 
     # Deposit y Rack
-    deposits_list = get_deposits()
+    deposits_list = get_deposits(DB_NAME)
     deposits_display = [d[1] for d in deposits_list]
-    racks_list = get_racks()()  # Llama get_racks() para obtener inner, luego inner() para la lista
+    racks_list = get_racks(DB_NAME)()  # Llama get_racks() para obtener inner, luego inner() para la lista
     racks_display = [r[1] for r in racks_list] if racks_list and len(racks_list[0]) > 1 else [r[0] for r in racks_list]
     # Si la descripción sigue vacía, usar rack_code
     if all(not val for val in racks_display):
@@ -580,6 +635,32 @@ def main():
     combo_rack = ttk.Combobox(frm, values=racks_display, state="readonly", width=14)
     combo_rack.grid(row=3, column=1, sticky="w")
 
+    def refresh_reference_combos():
+        # La caché solo recarga si deposits/racks cambiaron; las listas se
+        # actualizan en el lugar porque guardar() las indexa por posición.
+        new_deps = get_deposits(DB_NAME)
+        if new_deps != deposits_list:
+            sel = combo_deposit.get()
+            deposits_list[:] = new_deps
+            combo_deposit.configure(values=[d[1] for d in deposits_list])
+            combo_deposit.set(sel if sel in combo_deposit.cget('values') else "")
+        new_racks = racks_for_selected_deposit()
+        if new_racks != racks_list:
+            sel = combo_rack.get()
+            racks_list[:] = new_racks
+            combo_rack.configure(values=[r[1] or r[0] for r in racks_list])
+            combo_rack.set(sel if sel in combo_rack.cget('values') else "")
+
+    def racks_for_selected_deposit():
+        # racks del depósito elegido primero (deposit_racks), luego el resto
+        idx = combo_deposit.current()
+        if idx < 0 or idx >= len(deposits_list):
+            return get_racks(DB_NAME)()
+        return get_racks(DB_NAME)(deposits_list[idx][0], include_others=True)
+
+    combo_deposit.configure(postcommand=refresh_reference_combos)
+    combo_rack.configure(postcommand=refresh_reference_combos)
+
     # Código
     ttk.Label(frm, text="Producto:").grid(row=4, column=0, sticky="e")
     entry_code = ttk.Entry(frm, width=18)
@@ -641,10 +722,13 @@ def main():
     entry_win.bind("<Return>", on_winkel_enter)
 
     def on_deposit_change(event=None):
-        # Ya no se actualiza racks por depósito, racks es independiente
-        pass
-    combo_deposit.bind("<<ComboboxSelected>>", on_deposit_change)
-
+        # Los racks usados en el depósito aparecen primero en la lista
+        new_racks = racks_for_selected_deposit()
+        if new_racks != racks_list:
+            sel = combo_rack.get()
+            racks_list[:] = new_racks
+            combo_rack.configure(values=[r[1] or r[0] for r in racks_list])
+            combo_rack.set(sel if sel in combo_rack.cget('values') else "")
     combo_deposit.bind("<<ComboboxSelected>>", on_deposit_change)
 
     # Location label
@@ -792,7 +876,7 @@ def main():
         except Exception:
             pass
     try:
-        combo_deposit.bind('<<ComboboxSelected>>', update_guardar_state)
+        combo_deposit.bind('<<ComboboxSelected>>', update_guardar_state, add='+')
     except Exception:
         try:
             combo_deposit.bind('<FocusOut>', update_guardar_state)
@@ -845,39 +929,18 @@ def main():
         df["code_item"] = df["code_item"].astype(str).str.strip()
         df["current_inventory"] = pd.to_numeric(df["current_inventory"].replace("", "0"), errors="coerce").fillna(0).astype(int)
 
-        # Ensure backups directory exists and back up 'items' table before changes
+        # Snapshot de la BD antes de cambiar items (backups/snapshots); la actualización sigue al terminar
+        respaldo_previo("stock-update", lambda: _aplicar_current_inventory(df))
+
+    def _aplicar_current_inventory(df):
         backup_dir = os.path.join(os.getcwd(), "backups")
         os.makedirs(backup_dir, exist_ok=True)
         conn = sqlite3.connect(DB_NAME)
         try:
-            try:
-                df_items_backup = pd.read_sql_query("SELECT * FROM items", conn)
-                ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-                backup_path = os.path.join(backup_dir, f"items_backup_{ts}.csv")
-                df_items_backup.to_csv(backup_path, index=False)
-            except Exception:
-                # If backup fails, continue but warn in console
-                print("Advertencia: no se pudo crear respaldo de 'items' antes de la actualización")
-
-            cur = conn.cursor()
-            updated = 0
-            not_found = []
-            for _, row in df.iterrows():
-                code = str(row["code_item"]).strip()
-                val = int(row["current_inventory"])
-                cur.execute("SELECT 1 FROM items WHERE code_item = ?", (code,))
-                if cur.fetchone():
-                    cur.execute("UPDATE items SET current_inventory = ? WHERE code_item = ?", (val, code))
-                    updated += 1
-                    continue
-                alt = code.lstrip("0")
-                if alt:
-                    cur.execute("SELECT 1 FROM items WHERE code_item = ?", (alt,))
-                    if cur.fetchone():
-                        cur.execute("UPDATE items SET current_inventory = ? WHERE code_item = ?", (val, alt))
-                        updated += 1
-                        continue
-                not_found.append(code)
+            # Staging + UPDATE ... FROM: items y los conteos de los items que cambiaron
+            not_found = stage_stock_levels(conn, df[["code_item", "current_inventory"]].itertuples(index=False, name=None))
+            updated, changed = apply_stock_levels(conn)
+            recomputed = recompute_counts(conn)
             conn.commit()
         except Exception as e:
             conn.rollback()
@@ -885,6 +948,7 @@ def main():
             conn.close()
             return
         conn.close()
+        reload_item_catalog()
 
         # Save not_found list to backups for review
         ts2 = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -897,7 +961,12 @@ def main():
             except Exception:
                 print("Advertencia: no se pudo escribir la lista de códigos no encontrados en backups")
 
-        summary = f"Registros actualizados: {updated}"
+        if recomputed:
+            change_bus.publish("inventory_count", "reload")
+        maintenance.request_analyze()
+
+        summary = f"Registros actualizados: {updated} ({changed} con cambios)"
+        summary += f"\nConteos recalculados: {recomputed}"
         if not_found:
             summary += f"\nCódigos no encontrados: {len(not_found)} (guardados en {nf_path})"
         messagebox.showinfo("Actualización completada", summary, parent=root)
@@ -911,6 +980,14 @@ def main():
         boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, updated_date).
         The user is asked whether to clear existing rows before inserting.
         """
+        flush_pending_counts()
+        clear = messagebox.askyesno("Confirmar", "¿Borrar registros existentes en 'inventory_count_res' antes de generar?\n(Si no, se agregarán nuevas filas)", parent=root)
+        if clear:
+            respaldo_previo("clear-res", lambda: _generar_res(True))
+        else:
+            _generar_res(False)
+
+    def _generar_res(clear):
         try:
             conn = sqlite3.connect(DB_NAME)
             cur = conn.cursor()
@@ -920,6 +997,7 @@ def main():
                 CREATE TABLE IF NOT EXISTS inventory_count_res (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     code_item TEXT(10) NOT NULL REFERENCES items (code_item),
+                    item_id INTEGER REFERENCES items (item_id),
                     description_item TEXT,
                     boxqty INTEGER DEFAULT 0,
                     boxunitqty INTEGER DEFAULT 0,
@@ -934,8 +1012,6 @@ def main():
                 )
             ''')
 
-            # Ask whether to clear existing data
-            clear = messagebox.askyesno("Confirmar", "¿Borrar registros existentes en 'inventory_count_res' antes de generar?\n(Si no, se agregarán nuevas filas)", parent=root)
             if clear:
                 cur.execute("DELETE FROM inventory_count_res")
 
@@ -968,7 +1044,7 @@ def main():
             # Aggregate values from inventory_count, and also include sales and purchasing sums by code_item
             # sales and purchasing are expected to be tables with at least (code_item, qty)
             cur.execute('''
-                SELECT ic.code_item AS code_item,
+                SELECT COALESCE(MAX(i.code_item), MAX(ic.code_item)) AS code_item,
                        COALESCE(SUM(ic.boxqty),0) AS boxqty,
                        COALESCE(SUM(ic.boxunitqty),0) AS boxunitqty,
                        COALESCE(SUM(ic.boxunittotal),0) AS boxunittotal,
@@ -978,16 +1054,17 @@ def main():
                        MAX(COALESCE(i.description_item, '')) AS description_item,
                        MAX(COALESCE(i.current_inventory,0)) AS current_inventory,
                        COALESCE(s.sales_qty, 0) AS sales_qty,
-                       COALESCE(p.purchasing_qty, 0) AS purchasing_qty
+                       COALESCE(p.purchasing_qty, 0) AS purchasing_qty,
+                       ic.item_id AS item_id
                   FROM inventory_count ic
-                  LEFT JOIN items i ON i.code_item = ic.code_item
+                  LEFT JOIN items i ON i.item_id = ic.item_id
                   LEFT JOIN (
-                      SELECT code_item, SUM(sales_qty) AS sales_qty FROM sales GROUP BY code_item
-                  ) s ON s.code_item = ic.code_item
+                      SELECT item_id, SUM(sales_qty) AS sales_qty FROM sales GROUP BY item_id
+                  ) s ON s.item_id = ic.item_id
                   LEFT JOIN (
-                      SELECT code_item, SUM(purchasing_qty) AS purchasing_qty FROM purchasing GROUP BY code_item
-                  ) p ON p.code_item = ic.code_item
-                 GROUP BY ic.code_item
+                      SELECT item_id, SUM(purchasing_qty) AS purchasing_qty FROM purchasing GROUP BY item_id
+                  ) p ON p.item_id = ic.item_id
+                 GROUP BY COALESCE(ic.item_id, ic.code_item)
             ''')
             rows = cur.fetchall()
             if not rows:
@@ -1012,25 +1089,29 @@ def main():
                 purchasing_qty = int(r[10] or 0)
                 total_calc = total + purchasing_qty - sales_qty
                 difference = current_inventory - total_calc
+                item_id = r[11]
 
                 if has_total_calc:
                     cur.execute(
                         '''INSERT INTO inventory_count_res
-                           (code_item, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, total_calc, updated_date)
-                           VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)''',
-                        (code_item, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, total_calc, ts)
+                           (code_item, item_id, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, total_calc, updated_date)
+                           VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)''',
+                        (code_item, item_id, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, total_calc, ts)
                     )
                 else:
                     cur.execute(
                         '''INSERT INTO inventory_count_res
-                           (code_item, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, updated_date)
-                           VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)''',
-                        (code_item, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, ts)
+                           (code_item, item_id, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, updated_date)
+                           VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)''',
+                        (code_item, item_id, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, sales_qty, purchasing_qty, ts)
                     )
                 inserted += 1
 
             conn.commit()
             conn.close()
+            # las ventanas Resumen abiertas recargan la tabla regenerada
+            change_bus.publish("inventory_count_res", "reload")
+            maintenance.request_analyze()
             messagebox.showinfo("OK", f"Se insertaron {inserted} registros en inventory_count_res", parent=root)
         except Exception as e:
             try:
@@ -1048,7 +1129,7 @@ def main():
     msg_guardado = tk.StringVar()
     lbl_guardado = ttk.Label(frm, textvariable=msg_guardado, foreground="green")
     lbl_guardado.grid(row=20, column=2, padx=8, sticky="w")
-    btn_registros = ttk.Button(frm, text="Ver Registros", command=lambda: mostrar_registros(root))
+    btn_registros = ttk.Button(frm, text="Ver Registros", command=lambda: (flush_pending_counts(), mostrar_registros(root)))
     btn_registros.grid(row=22, column=1, pady=8)
     btn_registros_resumen = ttk.Button(frm, text="Ver Registros Resumen", command=lambda: mostrar_registros_resumen(root))
     btn_registros_resumen.grid(row=22, column=2, pady=8, padx=6)
@@ -1065,6 +1146,7 @@ def main():
         "Reporte Items no en Inventario",
         "Reporte Diferencias por Items",
         "Reporte Diferencias > X",
+        "Reporte Diferencias (cambios)",
         "Reporte Diferencias por Counter-Loc-Item",
         "Reporte Diferencia Item Detalle",
         "Reporte Inventario por Ubicacion",
@@ -1076,6 +1158,7 @@ def main():
         sel = cmb_rpt_main.get().strip()
         if not sel:
             return
+        flush_pending_counts()
         # store selected report name on root so report generators can suggest a filename
         try:
             root._selected_report_name = sel
@@ -1108,6 +1191,8 @@ def main():
                         raise
             elif "verific" in key:
                 rpt.generate_pdf_report_verificacion(root, db_path=DB_NAME)
+            elif "cambios" in key:
+                rpt.generate_pdf_report_diferencias_cambios(root, db_path=DB_NAME)
             elif "diferencias>" in key or "diferencias>x" in key or ">x" in key:
                 rpt.generate_pdf_report_diferencias_threshold(root, db_path=DB_NAME)
             elif "counterlocitem" in key or "counterlocitem" in key:
@@ -1196,6 +1281,125 @@ def main():
     cmb_rpt_main.grid(row=23, column=1, padx=6, pady=8, sticky="w")
     btn_rpt_main.grid(row=23, column=2, padx=6, pady=8, sticky="w")
 
+    # Paquete de reportes de cierre: todos los reportes seleccionados en paralelo, en una carpeta con fecha
+    def paquete_reportes():
+        from report_api import REPORTS
+        from report_pack import PACK_REPORTS, generate_pack
+
+        win = tk.Toplevel(root)
+        win.title("Paquete de reportes")
+        win.transient(root)
+        win.grab_set()
+        ttk.Label(win, text="Reportes a generar:").grid(row=0, column=0, columnspan=2, padx=8, pady=(8, 4), sticky="w")
+        sel_vars = {}
+        for i, name in enumerate(PACK_REPORTS):
+            var = tk.IntVar(value=1)
+            ttk.Checkbutton(win, text=REPORTS[name][3], variable=var).grid(row=1 + i // 2, column=i % 2, padx=8, sticky="w")
+            sel_vars[name] = var
+        next_row = 2 + len(PACK_REPORTS) // 2
+        var_dep = tk.IntVar(value=0)
+        var_cnt = tk.IntVar(value=0)
+        ttk.Checkbutton(win, text="Además, un PDF por depósito", variable=var_dep).grid(row=next_row, column=0, padx=8, pady=(8, 0), sticky="w")
+        ttk.Checkbutton(win, text="Además, un PDF por contador", variable=var_cnt).grid(row=next_row, column=1, padx=8, pady=(8, 0), sticky="w")
+        estado = tk.StringVar()
+        ttk.Label(win, textvariable=estado).grid(row=next_row + 1, column=0, columnspan=2, padx=8, pady=4, sticky="w")
+        frm_btn = ttk.Frame(win)
+        frm_btn.grid(row=next_row + 2, column=0, columnspan=2, pady=8)
+
+        def _generar():
+            names = [n for n, v in sel_vars.items() if v.get()]
+            if not names:
+                messagebox.showwarning("Aviso", "Seleccione al menos un reporte.", parent=win)
+                return
+            flush_pending_counts()
+            btn_gen.state(["disabled"])
+            state = {"done": 0, "total": 0, "result": None, "error": None}
+
+            def _progress(done, total, stats):
+                state["done"], state["total"] = done, total
+
+            def _run():
+                try:
+                    state["result"] = generate_pack(DB_NAME, names, bool(var_dep.get()), bool(var_cnt.get()), progress=_progress)
+                except Exception as e:
+                    logger.exception("Report pack failed")
+                    state["error"] = e
+
+            def _poll():
+                alive = win.winfo_exists()
+                if state["result"] is None and state["error"] is None:
+                    if state["total"] and alive:
+                        estado.set(f"Generando... {state['done']}/{state['total']}")
+                    root.after(300, _poll)
+                    return
+                if alive:
+                    win.destroy()
+                if state["error"] is not None:
+                    messagebox.showerror("Error", f"Error al generar el paquete de reportes: {state['error']}", parent=root)
+                    return
+                folder, results = state["result"]
+                failed = [r for r in results if r.get("error")]
+                msg = f"{len(results) - len(failed)} reportes generados en:\n{folder}"
+                if failed:
+                    msg += f"\n\n{len(failed)} con error (ver index.csv)."
+                messagebox.showinfo("Paquete de reportes", msg, parent=root)
+                try:
+                    if os.name == "nt":
+                        os.startfile(folder)
+                except Exception:
+                    pass
+
+            estado.set("Generando...")
+            threading.Thread(target=_run, name="ReportPack", daemon=True).start()
+            root.after(300, _poll)
+
+        btn_gen = ttk.Button(frm_btn, text="Generar", command=_generar)
+        btn_gen.pack(side="left", padx=6)
+        ttk.Button(frm_btn, text="Cancelar", command=win.destroy).pack(side="left", padx=6)
+
+    btn_pack = ttk.Button(frm, text="Paquete de reportes", command=paquete_reportes)
+    btn_pack.grid(row=24, column=2, padx=6, pady=8, sticky="w")
+
+    # Reportes en segundo plano: estado del trabajo actual, cola y cancelación
+    rpt_estado = tk.StringVar()
+    lbl_rpt_estado = ttk.Label(frm, textvariable=rpt_estado, foreground="blue")
+    lbl_rpt_estado.grid(row=25, column=1, padx=6, sticky="w")
+    btn_rpt_cancel = ttk.Button(frm, text="Cancelar reporte", command=lambda: report_jobs.cancel())
+    btn_rpt_cancel.grid(row=25, column=2, padx=6, pady=8, sticky="w")
+    btn_rpt_cancel.grid_remove()
+
+    def pump_report_jobs():
+        report_jobs.pump()
+        job = report_jobs.current()
+        if job is None:
+            rpt_estado.set("")
+            btn_rpt_cancel.grid_remove()
+        else:
+            en_cola = len(report_jobs.pending())
+            texto = f"{job.title}: {'cancelando...' if job.cancelled else job.describe()}"
+            if en_cola:
+                texto += f" ({en_cola} en cola)"
+            rpt_estado.set(texto)
+            btn_rpt_cancel.grid()
+        root.after(250, pump_report_jobs)
+
+    root.after(250, pump_report_jobs)
+
+    # Precalentar los reportes (reportlab, estilos, fuentes) en un hilo aparte cuando la ventana ya está
+    # visible y sin eventos pendientes, para que el primer reporte no pague las importaciones
+    WARMUP_MS = 1500
+
+    def precalentar_reportes():
+        def _run():
+            try:
+                from report_engine import warm_up
+                warm_up()
+            except Exception:
+                logger.exception("Report warm-up failed")
+        threading.Thread(target=_run, name="ReportWarmup", daemon=True).start()
+
+    root.after(WARMUP_MS, lambda: root.after_idle(precalentar_reportes))
+
     # Botón para generar reporte PDF (usa ui_pdf_report.add_pdf_report_button)
     # Try to load the main reports module; if it's broken, prefer the small resumen module.
     try:
@@ -1371,9 +1575,33 @@ def main():
             df["current_inventory"] = pd.to_numeric(df["current_inventory"].replace("", "0"), errors="coerce").fillna(0).astype(int)
         else:
             df["current_inventory"] = 0
+        df = df[df["code_item"] != ""].drop_duplicates("code_item")
+        respaldo_previo("catalog-import", lambda: _importar_catalogo(df))
+
+    def _importar_catalogo(df):
+        # Upsert: los item_id existentes se conservan (las tablas de hechos apuntan a ellos)
+        ensure_schema(DB_NAME)
         conn = sqlite3.connect(DB_NAME)
-        df[["code_item", "description_item", "current_inventory"]].to_sql("items", conn, if_exists="replace", index=False)
-        conn.close()
+        try:
+            conn.executemany(
+                "INSERT INTO items (code_item, description_item, current_inventory) VALUES (?, ?, ?) "
+                "ON CONFLICT(code_item) DO UPDATE SET description_item = excluded.description_item, "
+                "current_inventory = excluded.current_inventory",
+                df[["code_item", "description_item", "current_inventory"]].itertuples(index=False, name=None))
+            # Los códigos que ya no vienen en el CSV se eliminan, como antes con el reemplazo
+            conn.execute("CREATE TEMP TABLE catalog_codes (code_item TEXT PRIMARY KEY)")
+            conn.executemany("INSERT INTO catalog_codes VALUES (?)", ((c,) for c in df["code_item"]))
+            conn.execute("DELETE FROM items WHERE code_item NOT IN (SELECT code_item FROM catalog_codes)")
+            relink_item_ids(conn)
+            # el stock nuevo también vale para la copia guardada en los conteos
+            recomputed = recompute_counts(conn, all_items=True)
+            conn.commit()
+        finally:
+            conn.close()
+        reload_item_catalog()
+        if recomputed:
+            change_bus.publish("inventory_count", "reload")
+        maintenance.request_analyze()
         messagebox.showinfo("OK", "Catálogo importado correctamente")
 
     def buscar_item(event=None):
@@ -1383,6 +1611,7 @@ def main():
         if not code:
             logger.debug('buscar_item: empty code, returning')
             return
+        flush_pending_counts()
         conn = sqlite3.connect(DB_NAME)
         cur = conn.cursor()
         cur.execute("SELECT description_item, current_inventory FROM items WHERE code_item = ?", (code,))
@@ -1542,37 +1771,28 @@ def main():
         if not name or not code:
             messagebox.showerror("Error", "Faltan datos")
             return
-        conn = sqlite3.connect(DB_NAME)
-        cur = conn.cursor()
         # Ya no se valida si el código existe en inventory_count; se permite múltiples registros para el mismo code_item
-        cur.execute("SELECT current_inventory FROM items WHERE code_item = ?", (code,))
-        row = cur.fetchone()
-        stored_code = code
-        if not row:
-            alt = code.lstrip("0")
-            if alt:
-                cur.execute("SELECT current_inventory FROM items WHERE code_item = ?", (alt,))
-                row = cur.fetchone()
-                if row:
-                    stored_code = alt
-        if not row:
+        stored_code, item = find_item(item_catalog, code)
+        if not item:
             messagebox.showerror("Error", "Código inválido")
-            conn.close()
             return
-        actual = row[0]
-        boxqty = int(entry_boxqty.get())
-        boxunitqty = int(entry_boxunitqty.get())
-        boxunittotal = boxqty * boxunitqty
+        actual = item[1]
         total = boxunittotal + magazijn + winkel
         diff = total - actual
         remark = entry_remark.get().strip()[:100]
-        cur.execute("""
-            INSERT INTO inventory_count
-            (counter_name, code_item, magazijn, winkel, total, current_inventory, difference, count_date, location, deposit_id, rack_id, boxqty, boxunitqty, boxunittotal, remarks)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (name, stored_code, magazijn, winkel, total, actual, diff, selected_date.isoformat(), location, deposit_id, rack_id, boxqty, boxunitqty, boxunittotal, remark))
-        conn.commit()
-        conn.close()
+        try:
+            count_writer.submit({
+                "counter_name": name, "code_item": stored_code, "magazijn": magazijn, "winkel": winkel,
+                "total": total, "current_inventory": actual, "difference": diff,
+                "count_date": selected_date.isoformat(), "location": location,
+                "deposit_id": deposit_id, "rack_id": rack_id, "boxqty": boxqty,
+                "boxunitqty": boxunitqty, "boxunittotal": boxunittotal, "remarks": remark,
+                "item_id": item[2],
+            })
+        except Exception as e:
+            logger.exception("guardar: could not queue record")
+            messagebox.showerror("Error", f"No se pudo guardar el registro: {e}")
+            return
         entry_code.delete(0, tk.END)
         entry_desc.config(state="normal"); entry_desc.delete(0, tk.END); entry_desc.config(state="readonly")
         entry_boxqty.delete(0, tk.END); entry_boxqty.insert(0, "0")
@@ -1587,6 +1807,7 @@ def main():
         root.after(2000, lambda: msg_guardado.set(""))
 
     def export_data():
+        flush_pending_counts()
         # Ask deposits selection from resumen helper if available
         sel_deps = None
         try:
@@ -1607,11 +1828,7 @@ def main():
                 return None
 
             try:
-                conn = sqlite3.connect(db_path)
-                cur = conn.cursor()
-                cur.execute("SELECT DISTINCT COALESCE(counter_name, '') FROM inventory_count ORDER BY 1")
-                counters = [c[0] for c in cur.fetchall() if c is not None]
-                conn.close()
+                counters = get_counters(db_path)
             except Exception:
                 return None
 
@@ -1728,15 +1945,10 @@ def main():
         suggested_parts = []
         if sel_deps:
             try:
-                conn_tmp = sqlite3.connect(DB_NAME)
-                cur_tmp = conn_tmp.cursor()
+                ref = get_ref_cache(DB_NAME).get()
                 # total deposits to detect "all"
-                cur_tmp.execute("SELECT COUNT(*) FROM deposits")
-                total_deps = cur_tmp.fetchone()[0] or 0
-                placeholders = ','.join('?' for _ in sel_deps)
-                cur_tmp.execute(f"SELECT deposit_description FROM deposits WHERE deposit_id IN ({placeholders})", tuple(sel_deps))
-                fetched = [r[0] for r in cur_tmp.fetchall()]
-                conn_tmp.close()
+                total_deps = len(ref.deposits)
+                fetched = [ref.deposit_name(d) for d in sel_deps]
                 if total_deps > 0 and len(sel_deps) == total_deps:
                     suggested_parts.append('Dep_all')
                 else:
@@ -1748,11 +1960,7 @@ def main():
         if sel_counters:
             try:
                 # detect if all counters selected
-                conn_tmp = sqlite3.connect(DB_NAME)
-                cur_tmp = conn_tmp.cursor()
-                cur_tmp.execute("SELECT COUNT(DISTINCT COALESCE(counter_name,'')) FROM inventory_count")
-                total_counters = cur_tmp.fetchone()[0] or 0
-                conn_tmp.close()
+                total_counters = len(get_counters(DB_NAME))
                 if total_counters > 0 and len(sel_counters) == total_counters:
                     suggested_parts.append('Counter_all')
                 else:
@@ -1771,7 +1979,7 @@ def main():
         conn = sqlite3.connect(DB_NAME)
         try:
             # Build base SQL and apply optional filters for deposits and counters
-            base_sql = '''
+            base_sql = f'''
                   SELECT c.id, c.counter_name, c.code_item,
                       COALESCE(i.description_item, '') AS description_item,
                       c.boxqty, c.boxunitqty, c.boxunittotal,
@@ -1779,8 +1987,8 @@ def main():
                       c.remarks,
                       d.deposit_description AS deposit_name, r.rack_description AS rack_name,
                       c.location, c.count_date
-                FROM inventory_count c
-                LEFT JOIN items i ON i.code_item = c.code_item
+                FROM {COUNT_SOURCE} c
+                LEFT JOIN items i ON i.item_id = c.item_id
                 LEFT JOIN deposits d ON d.deposit_id = c.deposit_id
                 LEFT JOIN racks r ON r.rack_id = c.rack_id
             '''
@@ -1850,4 +2058,6 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    # el paquete de reportes usa procesos; necesario en el ejecutable de PyInstaller
+    multiprocessing.freeze_support()
     main()
@@ -1,7 +1,19 @@
 import os
 import sqlite3
 from typing import Optional
-from tkinter import filedialog, messagebox
+try:
+    from tkinter import filedialog, messagebox
+except ImportError:  # headless: only the build_* functions are usable
+    filedialog = messagebox = None
+
+from ref_cache import get_ref_cache
+from report_api import ReportError, EmptyReportError
+from report_cache import fetch_rows
+from report_engine import Column, ReportSpec, render
+from report_export import REPORT_FILETYPES
+from report_jobs import get_report_jobs
+from count_filters import build_count_where
+from ui_pdf_report import VERIFICACION_GROUPS, verificacion_columns
 
 DEFAULT_DB = "inventariovlm.db"
 import logging
@@ -27,7 +39,7 @@ def _asksave(parent: Optional[object], default_name: Optional[str] = None) -> Op
                 base = 'reporte'
         else:
             base = None
-        return filedialog.asksaveasfilename(parent=parent, defaultextension='.pdf', initialfile=base, filetypes=[('PDF files', '*.pdf')])
+        return filedialog.asksaveasfilename(parent=parent, defaultextension='.pdf', initialfile=base, filetypes=REPORT_FILETYPES)
     except Exception:
         return None
 
@@ -56,6 +68,30 @@ def _ensure_reportlab(parent: Optional[object] = None) -> bool:
         return False
 
 
+def _run_report(parent, builder, db_path: str, file_path: str, **params):
+    """Queue a ``build_*`` report on the report worker for a Tk button.
+
+    When it finishes (delivered by ``report_jobs.pump``) errors go to a
+    messagebox and the PDF is opened. Returns the ReportJob.
+    """
+    def _done(job):
+        if job.state == 'cancelled':
+            return
+        if job.state == 'error':
+            if isinstance(job.error, EmptyReportError):
+                messagebox.showinfo('Info', str(job.error), parent=parent)
+            elif isinstance(job.error, ReportError):
+                messagebox.showerror('Error', str(job.error), parent=parent)
+            else:
+                messagebox.showerror('Error', f'Error al generar el reporte: {job.error}', parent=parent)
+            return
+        _open_pdf_file(file_path, parent=parent)
+        messagebox.showinfo('OK', f'Reporte generado: {file_path}', parent=parent)
+
+    title = getattr(parent, '_selected_report_name', None) or builder.__name__
+    return get_report_jobs().submit(title, builder, db_path, file_path, params, on_done=_done)
+
+
 def _ask_select_deposits(parent, db_path: str):
     """Show a modal dialog with deposit checkboxes and return selected deposit_ids or None.
 
@@ -69,11 +105,7 @@ def _ask_select_deposits(parent, db_path: str):
         return None
 
     try:
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-        cur.execute("SELECT deposit_id, deposit_description FROM deposits ORDER BY deposit_description")
-        deps = cur.fetchall()
-        conn.close()
+        deps = list(get_ref_cache(db_path).get().deposits)
     except Exception:
         return None
 
@@ -173,96 +205,69 @@ def _ask_select_deposits(parent, db_path: str):
     return sel_ids
 
 
-def generate_pdf_report_diferencias_resumen(parent, db_path: str = DEFAULT_DB):
-    """Generate the differences summary report.
-
-    Prompts the user to select deposits (checkbox dialog). If deposits are selected
-    the report aggregates from `inventory_count`, otherwise it uses
-    `inventory_count_res`.
-    """
-
-    # Ask deposits first
+def _deposit_label(db_path, deposits):
+    """' (Depósito A, Depósito B)' for titles; '' without deposits."""
+    if not deposits:
+        return ''
     try:
-        sel_deps = _ask_select_deposits(parent, db_path)
+        ref = get_ref_cache(db_path).get()
+        descs = [ref.deposit_name(d) for d in deposits if ref.deposit_name(d)]
+        return ' (' + ', '.join(descs or [str(d) for d in deposits]) + ')'
     except Exception:
-        sel_deps = None
-
-    # Ask for file path
-    file_path = _asksave(parent)
-    if not file_path:
-        return
-    if not _ensure_reportlab(parent):
-        return
-
-    if not os.path.exists(db_path):
-        messagebox.showerror('Error', f'No se encontró la base de datos: {db_path}', parent=parent)
-        return
-
-    rows = []
-    deposit_label = ''
-    try:
+        return ' (' + ', '.join(str(d) for d in deposits) + ')'
+
+
+def _diferencias_resumen_load(db_path, ctx):
+    deposits = ctx.get('deposits')
+    ctx['deposit_label'] = _deposit_label(db_path, deposits)
+    if deposits:
+        placeholders = ','.join('?' for _ in deposits)
+        sql = '''
+            SELECT COALESCE(MAX(i.code_item), MAX(ic.code_item)) AS code_item,
+                   MAX(COALESCE(i.description_item, '')) AS description_item,
+                   COALESCE(SUM(ic.total),0) AS total,
+                   COALESCE(s.sales_qty,0) AS sales_qty,
+                   COALESCE(p.purchasing_qty,0) AS purchasing_qty,
+                   (COALESCE(SUM(ic.total),0) + COALESCE(p.purchasing_qty,0) - COALESCE(s.sales_qty,0)) AS total_calc,
+                   MAX(COALESCE(i.current_inventory,0)) AS current_inventory,
+                   (MAX(COALESCE(i.current_inventory,0)) - (COALESCE(SUM(ic.total),0) + COALESCE(p.purchasing_qty,0) - COALESCE(s.sales_qty,0))) AS difference
+              FROM inventory_count ic
+              LEFT JOIN items i ON i.item_id = ic.item_id
+              LEFT JOIN (
+                  SELECT item_id, SUM(sales_qty) AS sales_qty FROM sales GROUP BY item_id
+              ) s ON s.item_id = ic.item_id
+              LEFT JOIN (
+                  SELECT item_id, SUM(purchasing_qty) AS purchasing_qty FROM purchasing GROUP BY item_id
+              ) p ON p.item_id = ic.item_id
+             WHERE ic.deposit_id IN (%s)
+             GROUP BY COALESCE(ic.item_id, ic.code_item)
+        ''' % (placeholders)
+        rows = fetch_rows(db_path, 'diferencias_resumen', sql, tuple(deposits))
+    else:
         conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-
-        if sel_deps:
-            placeholders = ','.join('?' for _ in sel_deps)
-            try:
-                cur.execute(f"SELECT deposit_description FROM deposits WHERE deposit_id IN ({placeholders})", tuple(sel_deps))
-                descs = [d[0] for d in cur.fetchall() if d and d[0]]
-                deposit_label = ' (' + ', '.join(descs or [str(d) for d in sel_deps]) + ')'
-            except Exception:
-                deposit_label = ' (' + ', '.join(str(d) for d in sel_deps) + ')'
-
-            sql = '''
-                SELECT ic.code_item AS code_item,
-                       MAX(COALESCE(i.description_item, '')) AS description_item,
-                       COALESCE(SUM(ic.total),0) AS total,
-                       COALESCE(s.sales_qty,0) AS sales_qty,
-                       COALESCE(p.purchasing_qty,0) AS purchasing_qty,
-                       (COALESCE(SUM(ic.total),0) + COALESCE(p.purchasing_qty,0) - COALESCE(s.sales_qty,0)) AS total_calc,
-                       MAX(COALESCE(i.current_inventory,0)) AS current_inventory,
-                       (MAX(COALESCE(i.current_inventory,0)) - (COALESCE(SUM(ic.total),0) + COALESCE(p.purchasing_qty,0) - COALESCE(s.sales_qty,0))) AS difference
-                  FROM inventory_count ic
-                  LEFT JOIN items i ON i.code_item = ic.code_item
-                  LEFT JOIN (
-                      SELECT code_item, SUM(sales_qty) AS sales_qty FROM sales GROUP BY code_item
-                  ) s ON s.code_item = ic.code_item
-                  LEFT JOIN (
-                      SELECT code_item, SUM(purchasing_qty) AS purchasing_qty FROM purchasing GROUP BY code_item
-                  ) p ON p.code_item = ic.code_item
-                 WHERE ic.deposit_id IN (%s)
-                 GROUP BY ic.code_item
-            ''' % (placeholders)
-            cur.execute(sql, tuple(sel_deps))
-            rows = cur.fetchall()
+        try:
+            cols = [c[1] for c in conn.execute('PRAGMA table_info(inventory_count_res)').fetchall()]
+        finally:
+            conn.close()
+        sel_cols = ['code_item']
+        sel_cols.append('description_item' if 'description_item' in cols else "'' AS description_item")
+        sel_cols.append('total' if 'total' in cols else '0 AS total')
+        sel_cols.append('sales_qty' if 'sales_qty' in cols else '0 AS sales_qty')
+        sel_cols.append('purchasing_qty' if 'purchasing_qty' in cols else '0 AS purchasing_qty')
+        sel_cols.append('total_calc' if 'total_calc' in cols else '0 AS total_calc')
+        sel_cols.append('current_inventory' if 'current_inventory' in cols else '0 AS current_inventory')
+
+        if 'difference' in cols:
+            diff_expr = 'difference'
+        elif 'total_calc' in cols and 'current_inventory' in cols:
+            diff_expr = '(current_inventory - total_calc)'
+        elif 'total' in cols and 'current_inventory' in cols:
+            diff_expr = '(current_inventory - total)'
         else:
-            cur.execute('PRAGMA table_info(inventory_count_res)')
-            cols = [c[1] for c in cur.fetchall()]
-            sel_cols = ['code_item']
-            sel_cols.append('description_item' if 'description_item' in cols else "'' AS description_item")
-            sel_cols.append('total' if 'total' in cols else '0 AS total')
-            sel_cols.append('sales_qty' if 'sales_qty' in cols else '0 AS sales_qty')
-            sel_cols.append('purchasing_qty' if 'purchasing_qty' in cols else '0 AS purchasing_qty')
-            sel_cols.append('total_calc' if 'total_calc' in cols else '0 AS total_calc')
-            sel_cols.append('current_inventory' if 'current_inventory' in cols else '0 AS current_inventory')
-
-            if 'difference' in cols:
-                diff_expr = 'difference'
-            elif 'total_calc' in cols and 'current_inventory' in cols:
-                diff_expr = '(current_inventory - total_calc)'
-            elif 'total' in cols and 'current_inventory' in cols:
-                diff_expr = '(current_inventory - total)'
-            else:
-                diff_expr = '0'
+            diff_expr = '0'
 
-            sql = f"SELECT {', '.join(sel_cols)}, {diff_expr} AS difference FROM inventory_count_res"
-            cur.execute(sql)
-            rows = cur.fetchall()
-
-        conn.close()
-    except Exception as e:
-        messagebox.showerror('Error', f'Error al leer la base de datos: {e}', parent=parent)
-        return
+        sql = f"SELECT {', '.join(sel_cols)}, {diff_expr} AS difference FROM inventory_count_res"
+        rows = fetch_rows(db_path, 'diferencias_resumen', sql)
 
     # Ensure ordering by absolute difference desc
     try:
@@ -272,92 +277,60 @@ def generate_pdf_report_diferencias_resumen(parent, db_path: str = DEFAULT_DB):
             rows = sorted(rows, key=lambda r: abs(float(r[-1])) if r and len(r) else 0, reverse=True)
         except Exception:
             pass
+    return rows
 
-    # Build PDF
-    from reportlab.lib.pagesizes import A4, landscape
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 
-    styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    normal = styles['Normal']
+def _diferencias_resumen_title(ctx):
+    if ctx.get('deposits'):
+        return f"Reporte Diferencias - Resumen{ctx['deposit_label']}"
+    return 'Reporte Diferencias - Resumen (inventory_count_res)'
 
-    doc = SimpleDocTemplate(file_path, pagesize=landscape(A4), rightMargin=18, leftMargin=18, topMargin=18, bottomMargin=18)
-    story = []
-    if sel_deps:
-        story.append(Paragraph(f'Reporte Diferencias - Resumen{deposit_label}', title_style))
-    else:
-        story.append(Paragraph('Reporte Diferencias - Resumen (inventory_count_res)', title_style))
-    story.append(Spacer(1, 8))
-
-    headers = ['Código', 'Descripción', 'Total', 'Sales', 'Purchasing', 'Total_calc', 'Actual', 'Diferencia']
-    data = [headers]
-    for r in rows:
-        # normalize length
-        vals = list(r)
-        # pad to expected length
-        while len(vals) < 8:
-            vals.append('')
-        def _fmt_int(x):
-            try:
-                # convert to number and round to int
-                n = int(round(float(x)))
-            except Exception:
-                try:
-                    n = int(x)
-                except Exception:
-                    n = 0
-            # format with thousands separator as dot
-            s = f"{n:,}".replace(",", ".")
-            return s
-
-        data.append([
-            vals[0] or '',
-            (vals[1] or '')[:200],
-            _fmt_int(vals[2]),
-            _fmt_int(vals[3]),
-            _fmt_int(vals[4]),
-            _fmt_int(vals[5]),
-            _fmt_int(vals[6]),
-            _fmt_int(abs(vals[7] or 0))
-        ])
 
-    if len(data) == 1:
-        story.append(Paragraph('No hay registros para reportar.', normal))
-    else:
-        table = Table(data, repeatRows=1, hAlign='LEFT', colWidths=[80, 360, 60, 60, 60, 60, 60, 60])
-        tbl_style = TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d3d3d3')),
-            ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('LEFTPADDING', (0, 0), (-1, -1), 4),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-        ])
-        try:
-            hdrs = data[0] if data else []
-            numeric_keys = ('total', 'caja', 'cajas', 'inventario', 'actual', 'sueltos', 'sales', 'purchas', 'qty', 'cant', 'magazijn', 'winkel', 'tot', 'dif', 'difer', 'difference')
-            ncols = [i for i, h in enumerate(hdrs) if any(k in str(h).lower() for k in numeric_keys)]
-            for i in ncols:
-                try:
-                    tbl_style.add('ALIGN', (i, 1), (i, -1), 'RIGHT')
-                except Exception:
-                    pass
-        except Exception:
-            pass
-        table.setStyle(tbl_style)
-        story.append(table)
+DIFERENCIAS_RESUMEN_SPEC = ReportSpec(
+    'diferencias_resumen', _diferencias_resumen_title,
+    [
+        Column('Código', 0, 80),
+        Column('Descripción', 1, 360, max_len=200),
+        Column('Total', 2, 60, 'int'),
+        Column('Sales', 3, 60, 'int'),
+        Column('Purchasing', 4, 60, 'int'),
+        Column('Total_calc', 5, 60, 'int'),
+        Column('Actual', 6, 60, 'int'),
+        Column('Diferencia', 7, 60, 'abs_int'),
+    ],
+    load=_diferencias_resumen_load, font_size=9)
+
+
+def build_diferencias_resumen(db_path: str, output_path: str, deposits=None) -> dict:
+    """Differences summary; with ``deposits`` it aggregates ``inventory_count``, otherwise ``inventory_count_res``.
+
+    Returns ``{"path", "rows", "pages"}``; raises ReportError.
+    """
+    return render(DIFERENCIAS_RESUMEN_SPEC, db_path, output_path, deposits=deposits)
+
+
+def generate_pdf_report_diferencias_resumen(parent, db_path: str = DEFAULT_DB):
+    """Generate the differences summary report.
+
+    Prompts the user to select deposits (checkbox dialog). If deposits are selected
+    the report aggregates from `inventory_count`, otherwise it uses
+    `inventory_count_res`.
+    """
 
+    # Ask deposits first
     try:
-        doc.build(story)
-    except Exception as e:
-        messagebox.showerror('Error', f'Error al generar el PDF: {e}', parent=parent)
+        sel_deps = _ask_select_deposits(parent, db_path)
+    except Exception:
+        sel_deps = None
+
+    # Ask for file path
+    file_path = _asksave(parent)
+    if not file_path:
+        return
+    if not _ensure_reportlab(parent):
         return
 
-    _open_pdf_file(file_path, parent=parent)
-    messagebox.showinfo('OK', f'Reporte PDF generado: {file_path}', parent=parent)
+    _run_report(parent, build_diferencias_resumen, db_path, file_path, deposits=sel_deps)
 
 
 def add_pdf_report_diferencias_resumen_button(parent_frame, db_path: str = DEFAULT_DB, button_text: str = 'Diferencias Resumen'):
@@ -436,9 +409,81 @@ def _ask_item_conteo_mode(parent) -> Optional[str]:
     return sel
 
 
-def generate_pdf_report_item_conteo(parent, db_path: str = DEFAULT_DB):
+def _item_conteo_check(params):
+    mode = params.get('mode')
+    if mode not in ('detalle', 'resumen'):
+        raise ReportError(f'Modo inválido: {mode} (detalle o resumen)')
+
+
+def _item_conteo_query(ctx):
+    if ctx['mode'] == 'detalle':
+        sql = ("select ic.code_item as item, ic.count_date, COALESCE(l.display_name, ic.location) AS Ubicacion, "
+               "i.description_item as item_description, ic.total "
+               "from inventory_count ic JOIN items i ON i.item_id = ic.item_id "
+               "LEFT JOIN locations l ON l.location_id = ic.location_id " )
+    else:
+        sql = ("select i.code_item as item, max(i.description_item) as item_description, sum(ic.total) as Total "
+               "from inventory_count ic JOIN items i ON i.item_id = ic.item_id ")
+    date_where, params = build_count_where({"date_from": ctx.get('date_from'), "date_to": ctx.get('date_to')}, alias="ic")
+    where_clauses = ["ic.total != 0"]
+    if date_where:
+        where_clauses.append(date_where)
+    deposits = ctx.get('deposits')
+    if deposits:
+        placeholders = ','.join('?' for _ in deposits)
+        where_clauses.append(f"ic.deposit_id IN ({placeholders})")
+        params += tuple(deposits)
+    sql += ' WHERE ' + ' AND '.join(where_clauses)
+    if ctx['mode'] == 'detalle':
+        sql += ' ORDER BY ic.code_item, ic.count_date, ic.location_id'
+    else:
+        sql += ' GROUP BY ic.item_id ORDER BY item'
+    return sql, params
+
+
+def _item_conteo_title(ctx):
+    return f"Item Conteo - {ctx['mode'].capitalize()}" + _deposit_label(ctx['db_path'], ctx.get('deposits'))
+
+
+# one spec per mode (different columns); both share the query and the 'item_conteo' cache entry
+ITEM_CONTEO_SPECS = {
+    # narrower widths so the detalle table fits comfortably on a landscape A4
+    'detalle': ReportSpec(
+        'item_conteo', _item_conteo_title,
+        [
+            Column('Código', 0, 80),
+            Column('Fecha', 1, 110),
+            Column('Ubicación', 2, 140, max_len=80),
+            Column('Descripción', 3, 370, max_len=140),
+            Column('Total', 4, 80, 'int'),
+        ],
+        query=_item_conteo_query, check=_item_conteo_check),
+    'resumen': ReportSpec(
+        'item_conteo', _item_conteo_title,
+        [
+            Column('Código', 0, 120),
+            Column('Descripción', 1, 540, max_len=200),
+            Column('Total', 2, 120, 'int'),
+        ],
+        query=_item_conteo_query, check=_item_conteo_check),
+}
+
+
+def build_item_conteo(db_path: str, output_path: str, mode='resumen', deposits=None, date_from=None, date_to=None) -> dict:
+    """'Item Conteo' report; ``mode`` is 'detalle' or 'resumen'.
+
+    Returns ``{"path", "rows", "pages"}``; raises ReportError.
+    """
+    _item_conteo_check({'mode': mode})
+    return render(ITEM_CONTEO_SPECS[mode], db_path, output_path, mode=mode, deposits=deposits,
+                  date_from=date_from, date_to=date_to)
+
+
+def generate_pdf_report_item_conteo(parent, db_path: str = DEFAULT_DB, date_from=None, date_to=None):
     """Generate 'Item Conteo' report in detalle or resumen mode as requested by the user.
 
+    ``date_from``/``date_to`` ('YYYY-MM-DD' or date, both inclusive) restrict the counts by date.
+
         Detail SQL:
             select ic.code_item item,
                          ic.count_date,
@@ -475,140 +520,7 @@ def generate_pdf_report_item_conteo(parent, db_path: str = DEFAULT_DB):
         return
     if not _ensure_reportlab(parent):
         return
-    if not os.path.exists(db_path):
-        messagebox.showerror('Error', f'No se encontró la base de datos: {db_path}', parent=parent)
-        return
-
-    try:
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-
-        if mode == 'detalle':
-            sql = ("select ic.code_item as item, ic.count_date, ic.location AS Ubicacion, "
-                   "i.description_item as item_description, ic.total "
-                   "from inventory_count ic JOIN items i ON i.code_item = ic.code_item " )
-            params = ()
-            where_clauses = ["ic.total != 0"]
-            if sel_deps:
-                placeholders = ','.join('?' for _ in sel_deps)
-                where_clauses.append(f"ic.deposit_id IN ({placeholders})")
-                params = tuple(sel_deps)
-            if where_clauses:
-                sql += ' WHERE ' + ' AND '.join(where_clauses)
-            sql += ' ORDER BY ic.code_item, ic.count_date, ic.location'
-            cur.execute(sql, params)
-            rows = cur.fetchall()
-            headers = ['Código', 'Fecha', 'Ubicación', 'Descripción', 'Total']
-        else:
-            sql = ("select ic.code_item as item, max(i.description_item) as item_description, sum(ic.total) as Total "
-                   "from inventory_count ic JOIN items i ON i.code_item = ic.code_item ")
-            params = ()
-            where_clauses = ["ic.total != 0"]
-            if sel_deps:
-                placeholders = ','.join('?' for _ in sel_deps)
-                where_clauses.append(f"ic.deposit_id IN ({placeholders})")
-                params = tuple(sel_deps)
-            if where_clauses:
-                sql += ' WHERE ' + ' AND '.join(where_clauses)
-            sql += ' GROUP BY ic.code_item ORDER BY ic.code_item'
-            cur.execute(sql, params)
-            rows = cur.fetchall()
-            headers = ['Código', 'Descripción', 'Total']
-
-        conn.close()
-    except Exception as e:
-        messagebox.showerror('Error', f'Error al leer la base de datos: {e}', parent=parent)
-        return
-
-    # Build PDF
-    from reportlab.lib.pagesizes import A4, landscape
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-
-    styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    normal = styles['Normal']
-
-    doc = SimpleDocTemplate(file_path, pagesize=landscape(A4), rightMargin=18, leftMargin=18, topMargin=18, bottomMargin=18)
-    story = []
-    dep_label = ''
-    if sel_deps:
-        try:
-            conn2 = sqlite3.connect(db_path)
-            cur2 = conn2.cursor()
-            cur2.execute(f"SELECT deposit_description FROM deposits WHERE deposit_id IN ({','.join(['?']*len(sel_deps))})", tuple(sel_deps))
-            descs = [d[0] for d in cur2.fetchall() if d and d[0]]
-            dep_label = ' (' + ', '.join(descs or [str(d) for d in sel_deps]) + ')'
-            conn2.close()
-        except Exception:
-            dep_label = ' (' + ', '.join(str(d) for d in sel_deps) + ')'
-
-    title = f"Item Conteo - {mode.capitalize()}" + (dep_label or '')
-    story.append(Paragraph(title, title_style))
-    story.append(Spacer(1, 8))
-
-    data = [headers]
-
-    def _fmt_int(x):
-        try:
-            n = int(round(float(x)))
-        except Exception:
-            try:
-                n = int(x)
-            except Exception:
-                n = 0
-        return f"{n:,}".replace(',', '.')
-
-    for r in rows:
-        vals = list(r)
-        if mode == 'detalle':
-            # item, count_date, location, description, total
-            # truncate description to keep table compact
-            data.append([vals[0] or '', vals[1] or '', (vals[2] or '')[:80], (vals[3] or '')[:140], _fmt_int(vals[4])])
-        else:
-            data.append([vals[0] or '', (vals[1] or '')[:200], _fmt_int(vals[2])])
-
-    if len(data) == 1:
-        story.append(Paragraph('No hay registros para reportar.', normal))
-    else:
-        # choose col widths
-        if mode == 'detalle':
-            # narrower widths so the table fits comfortably on a landscape A4
-            col_widths = [80, 110, 140, 370, 80]
-        else:
-            col_widths = [120, 540, 120]
-        table = Table(data, repeatRows=1, hAlign='LEFT', colWidths=col_widths)
-        tbl_style = TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d3d3d3')),
-            ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('LEFTPADDING', (0, 0), (-1, -1), 4),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-        ])
-        # align numeric (total) columns to the right
-        try:
-            if mode == 'detalle':
-                # total is last column (index 4)
-                tbl_style.add('ALIGN', (4, 1), (4, -1), 'RIGHT')
-            else:
-                # resumen: total is column index 2
-                tbl_style.add('ALIGN', (2, 1), (2, -1), 'RIGHT')
-        except Exception:
-            pass
-        table.setStyle(tbl_style)
-        story.append(table)
-
-    try:
-        doc.build(story)
-    except Exception as e:
-        messagebox.showerror('Error', f'Error al generar el PDF: {e}', parent=parent)
-        return
-
-    _open_pdf_file(file_path, parent=parent)
-    messagebox.showinfo('OK', f'Reporte PDF generado: {file_path}', parent=parent)
+    _run_report(parent, build_item_conteo, db_path, file_path, mode=mode, deposits=sel_deps, date_from=date_from, date_to=date_to)
 
 
 def add_pdf_report_item_conteo_button(parent_frame, db_path: str = DEFAULT_DB, button_text: str = 'Item Conteo'):
@@ -685,12 +597,81 @@ def _ask_include_quantities(parent) -> Optional[bool]:
     return sel
 
 
-def generate_pdf_report_inventario_por_ubicacion(parent, db_path: str = DEFAULT_DB):
+def _inventario_query(ctx):
+    # build base SQL
+    cols = [
+        'COALESCE(l.display_name, ic.location) AS Ubicacion',
+        'ic.code_item AS Codigo',
+        "COALESCE(i.description_item, '') AS Descripcion",
+    ]
+    if ctx.get('include_qty'):
+        cols.extend([
+            'ic.total AS Inventario',
+            'i.current_inventory AS Actual_total_item'
+        ])
+
+    sql = (f"SELECT {', '.join(cols)} FROM inventory_count ic JOIN items i ON i.item_id = ic.item_id"
+           " LEFT JOIN locations l ON l.location_id = ic.location_id")
+    date_where, params = build_count_where({"date_from": ctx.get('date_from'), "date_to": ctx.get('date_to')}, alias="ic")
+    where_clauses = [date_where] if date_where else []
+    deposits = ctx.get('deposits')
+    if deposits:
+        placeholders = ','.join('?' for _ in deposits)
+        where_clauses.append(f"ic.deposit_id IN ({placeholders})")
+        params += tuple(deposits)
+    if where_clauses:
+        sql += " WHERE " + " AND ".join(where_clauses)
+
+    sql += " ORDER BY ic.location_id, ic.code_item, ic.count_date"
+    logger.debug('Executing SQL for inventario_por_ubicacion: %s params=%s', sql, params)
+    return sql, params
+
+
+def _inventario_title(ctx):
+    return 'Reporte Inventario por Ubicación' + _deposit_label(ctx['db_path'], ctx.get('deposits'))
+
+
+# keyed by include_qty
+INVENTARIO_POR_UBICACION_SPECS = {
+    True: ReportSpec(
+        'inventario_por_ubicacion', _inventario_title,
+        [
+            Column('Ubicación', 0, 200),
+            Column('Código', 1, 80),
+            Column('Descripción', 2, 360, max_len=200),
+            Column('Inventario', 3, 80, 'int'),
+            Column('Actual Total (Item)', 4, 80, 'int'),
+        ],
+        query=_inventario_query),
+    # more compact widths so the table fits comfortably on landscape A4
+    False: ReportSpec(
+        'inventario_por_ubicacion', _inventario_title,
+        [
+            Column('Ubicación', 0, 260),
+            Column('Código', 1, 100),
+            # truncate description more aggressively for the compact layout
+            Column('Descripción', 2, 420, max_len=160),
+        ],
+        query=_inventario_query),
+}
+
+
+def build_inventario_por_ubicacion(db_path: str, output_path: str, deposits=None, include_qty=False, date_from=None, date_to=None) -> dict:
+    """Inventario por ubicación; ``include_qty`` añade las columnas de cantidades.
+
+    Returns ``{"path", "rows", "pages"}``; raises ReportError.
+    """
+    return render(INVENTARIO_POR_UBICACION_SPECS[bool(include_qty)], db_path, output_path, deposits=deposits,
+                  include_qty=bool(include_qty), date_from=date_from, date_to=date_to)
+
+
+def generate_pdf_report_inventario_por_ubicacion(parent, db_path: str = DEFAULT_DB, date_from=None, date_to=None):
     """Genera un PDF listando por ubicación: Ubicación, Código, Descripción.
 
     Opcionalmente muestra también las columnas `Inventario` (ic.total) y
     `Actual_total_item` (i.current_inventory) si el usuario lo solicita.
-    Se permite filtrar por depósitos (multi-select).
+    Se permite filtrar por depósitos (multi-select) y por rango de fechas
+    (``date_from``/``date_to``, 'YYYY-MM-DD' o date, ambos inclusive).
     """
     # ask deposits
     try:
@@ -710,137 +691,7 @@ def generate_pdf_report_inventario_por_ubicacion(parent, db_path: str = DEFAULT_
         return
     if not _ensure_reportlab(parent):
         return
-    if not os.path.exists(db_path):
-        messagebox.showerror('Error', f'No se encontró la base de datos: {db_path}', parent=parent)
-        return
-
-    try:
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-
-        # build base SQL
-        cols = [
-            'ic.location AS Ubicacion',
-            'ic.code_item AS Codigo',
-            "COALESCE(i.description_item, '') AS Descripcion",
-        ]
-        if include_qty:
-            cols.extend([
-                'ic.total AS Inventario',
-                'i.current_inventory AS Actual_total_item'
-            ])
-
-        sql = f"SELECT {', '.join(cols)} FROM inventory_count ic JOIN items i ON i.code_item = ic.code_item"
-        params = ()
-        if sel_deps:
-            placeholders = ','.join('?' for _ in sel_deps)
-            sql += f" WHERE ic.deposit_id IN ({placeholders})"
-            params = tuple(sel_deps)
-
-        sql += " ORDER BY ic.location, ic.code_item, ic.count_date"
-        logger.debug('Executing SQL for inventario_por_ubicacion: %s params=%s', sql, params)
-        cur.execute(sql, params)
-        rows = cur.fetchall()
-        conn.close()
-    except Exception as e:
-        messagebox.showerror('Error', f'Error al leer la base de datos: {e}', parent=parent)
-        return
-
-    # Build PDF
-    from reportlab.lib.pagesizes import A4, landscape
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-
-    styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    normal = styles['Normal']
-
-    doc = SimpleDocTemplate(file_path, pagesize=landscape(A4), rightMargin=18, leftMargin=18, topMargin=18, bottomMargin=18)
-    story = []
-    dep_label = ''
-    if sel_deps:
-        try:
-            conn2 = sqlite3.connect(db_path)
-            cur2 = conn2.cursor()
-            cur2.execute(f"SELECT deposit_description FROM deposits WHERE deposit_id IN ({','.join(['?']*len(sel_deps))})", tuple(sel_deps))
-            descs = [d[0] for d in cur2.fetchall() if d and d[0]]
-            dep_label = ' (' + ', '.join(descs or [str(d) for d in sel_deps]) + ')'
-            conn2.close()
-        except Exception:
-            dep_label = ' (' + ', '.join(str(d) for d in sel_deps) + ')'
-
-    story.append(Paragraph('Reporte Inventario por Ubicación' + dep_label, title_style))
-    story.append(Spacer(1, 8))
-
-    # headers and table data
-    if include_qty:
-        headers = ['Ubicación', 'Código', 'Descripción', 'Inventario', 'Actual Total (Item)']
-        col_widths = [200, 80, 360, 80, 80]
-    else:
-        # more compact widths so the table fits comfortably on landscape A4
-        headers = ['Ubicación', 'Código', 'Descripción']
-        col_widths = [260, 100, 420]
-
-    data = [headers]
-
-    def _fmt_int(x):
-        try:
-            n = int(round(float(x)))
-        except Exception:
-            try:
-                n = int(x)
-            except Exception:
-                n = 0
-        return f"{n:,}".replace(',', '.')
-
-    for r in rows:
-        if include_qty:
-            # r: Ubicacion, Codigo, Descripcion, Inventario, Actual_total_item
-            u = r[0] or ''
-            c = r[1] or ''
-            dsc = (r[2] or '')[:200]
-            inv = _fmt_int(r[3])
-            actual = _fmt_int(r[4])
-            data.append([u, c, dsc, inv, actual])
-        else:
-            u = r[0] or ''
-            c = r[1] or ''
-            # truncate description more aggressively for the compact layout
-            dsc = (r[2] or '')[:160]
-            data.append([u, c, dsc])
-
-    if len(data) == 1:
-        story.append(Paragraph('No hay registros para reportar.', normal))
-    else:
-        table = Table(data, repeatRows=1, hAlign='LEFT', colWidths=col_widths)
-        tbl_style = TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d3d3d3')),
-            ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('LEFTPADDING', (0, 0), (-1, -1), 4),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-        ])
-        # align numeric columns to the right when quantities are included
-        try:
-            if include_qty:
-                # 'Inventario' is column index 3 and 'Actual_total_item' is index 4
-                tbl_style.add('ALIGN', (3, 1), (4, -1), 'RIGHT')
-        except Exception:
-            pass
-        table.setStyle(tbl_style)
-        story.append(table)
-
-    try:
-        doc.build(story)
-    except Exception as e:
-        messagebox.showerror('Error', f'Error al generar el PDF: {e}', parent=parent)
-        return
-
-    _open_pdf_file(file_path, parent=parent)
-    messagebox.showinfo('OK', f'Reporte PDF generado: {file_path}', parent=parent)
+    _run_report(parent, build_inventario_por_ubicacion, db_path, file_path, deposits=sel_deps, include_qty=include_qty, date_from=date_from, date_to=date_to)
 
 
 def add_pdf_report_inventario_por_ubicacion_button(parent_frame, db_path: str = DEFAULT_DB, button_text: str = 'Inventario por Ubicación'):
@@ -861,6 +712,46 @@ def add_pdf_report_inventario_por_ubicacion_button(parent_frame, db_path: str =
             btn.pack(pady=8)
         return btn
 
+
+def _nocode_load(db_path, ctx):
+    # the columns are whatever the table has
+    conn = sqlite3.connect(db_path)
+    try:
+        cols = [c[1] for c in conn.execute("PRAGMA table_info(nocode_items)").fetchall()]
+    finally:
+        conn.close()
+    if not cols:
+        raise EmptyReportError('La tabla `nocode_items` no existe o está vacía.')
+    ctx['columns'] = cols
+    return fetch_rows(db_path, 'nocode_items', f"SELECT {', '.join(cols)} FROM nocode_items ORDER BY rowid ASC")
+
+
+def _nocode_cell(v):
+    s = '' if v is None else str(v)
+    # truncate long text
+    if len(s) > 200:
+        s = s[:197] + '...'
+    return s
+
+
+def _nocode_columns(ctx):
+    cols = ctx['columns']
+    # approximate col widths over the 780pt of the page
+    col_width = max(40, int(780 / max(1, len(cols))))
+    return [Column(c.replace('_', ' ').title(), i, col_width, _nocode_cell) for i, c in enumerate(cols)]
+
+
+NOCODE_ITEMS_SPEC = ReportSpec('nocode_items', 'Registros Sin codigo (nocode_items)', _nocode_columns, load=_nocode_load)
+
+
+def build_nocode_items(db_path: str, output_path: str) -> dict:
+    """Registros de la tabla `nocode_items`.
+
+    Returns ``{"path", "rows", "pages"}``; raises ReportError.
+    """
+    return render(NOCODE_ITEMS_SPEC, db_path, output_path)
+
+
 def generate_pdf_report_nocode_items(parent, db_path: str = DEFAULT_DB):
     """Genera un PDF con los registros de la tabla `nocode_items`.
     La función adapta las columnas disponibles y muestra una tabla simple.
@@ -876,84 +767,7 @@ def generate_pdf_report_nocode_items(parent, db_path: str = DEFAULT_DB):
         return
     if not _ensure_reportlab(parent):
         return
-    if not os.path.exists(db_path):
-        messagebox.showerror('Error', f'No se encontró la base de datos: {db_path}', parent=parent)
-        return
-
-    try:
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-        # get columns
-        cur.execute("PRAGMA table_info(nocode_items)")
-        cols_info = cur.fetchall()
-        if not cols_info:
-            messagebox.showinfo('Info', 'La tabla `nocode_items` no existe o está vacía.', parent=parent)
-            conn.close()
-            return
-        cols = [c[1] for c in cols_info]
-        sql = f"SELECT {', '.join(cols)} FROM nocode_items ORDER BY rowid ASC"
-        cur.execute(sql)
-        rows = cur.fetchall()
-        conn.close()
-    except Exception as e:
-        messagebox.showerror('Error', f'Error al leer la base de datos: {e}', parent=parent)
-        return
-
-    # reportlab imports
-    from reportlab.lib.pagesizes import A4, landscape
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-
-    styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    normal = styles['Normal']
-
-    doc = SimpleDocTemplate(file_path, pagesize=landscape(A4), rightMargin=18, leftMargin=18, topMargin=18, bottomMargin=18)
-    story = []
-    story.append(Paragraph('Registros Sin codigo (nocode_items)', title_style))
-    story.append(Spacer(1, 8))
-
-    headers = [c.replace('_', ' ').title() for c in cols]
-    data = [headers]
-    for r in rows:
-        row_vals = []
-        for v in r:
-            s = '' if v is None else str(v)
-            # truncate long text
-            if len(s) > 200:
-                s = s[:197] + '...'
-            row_vals.append(s)
-        data.append(row_vals)
-
-    if len(data) == 1:
-        story.append(Paragraph('No hay registros para reportar.', normal))
-    else:
-        # compute approximate col widths
-        total_width = 780
-        col_width = max(40, int(total_width / max(1, len(headers))))
-        col_widths = [col_width] * len(headers)
-        table = Table(data, repeatRows=1, hAlign='LEFT', colWidths=col_widths)
-        tbl_style = TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d3d3d3')),
-            ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('LEFTPADDING', (0, 0), (-1, -1), 4),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-        ])
-        table.setStyle(tbl_style)
-        story.append(table)
-
-    try:
-        doc.build(story)
-    except Exception as e:
-        messagebox.showerror('Error', f'Error al generar el PDF: {e}', parent=parent)
-        return
-
-    _open_pdf_file(file_path, parent=parent)
-    messagebox.showinfo('OK', f'Reporte PDF generado: {file_path}', parent=parent)
+    _run_report(parent, build_nocode_items, db_path, file_path)
 
 
 def add_pdf_report_nocode_items_button(parent_frame, db_path: str = DEFAULT_DB, button_text: str = 'Registros Sin codigo'):
@@ -975,6 +789,26 @@ def add_pdf_report_nocode_items_button(parent_frame, db_path: str = DEFAULT_DB,
         return btn
 
 
+ITEMS_NOT_IN_INVENTORY_SPEC = ReportSpec(
+    'items_not_in_inventory', 'Items No en Inventario',
+    [Column('Código', 0, 120), Column('Descripción', 1, 600, max_len=300)],
+    sql=(
+        "SELECT i.code_item, COALESCE(i.description_item, '') "
+        "FROM items i "
+        "WHERE NOT EXISTS (SELECT 1 FROM inventory_count ic WHERE ic.item_id = i.item_id) "
+        "ORDER BY i.code_item ASC"
+    ),
+    font_size=9)
+
+
+def build_items_not_in_inventory(db_path: str, output_path: str) -> dict:
+    """Items de `items` sin registros en `inventory_count`.
+
+    Returns ``{"path", "rows", "pages"}``; raises ReportError.
+    """
+    return render(ITEMS_NOT_IN_INVENTORY_SPEC, db_path, output_path)
+
+
 def generate_pdf_report_items_not_in_inventory(parent, db_path: str = DEFAULT_DB):
     """Genera un PDF con los items de la tabla `items` que no tienen registros en `inventory_count`.
     Busca por `code_item` en ambas tablas.
@@ -984,72 +818,7 @@ def generate_pdf_report_items_not_in_inventory(parent, db_path: str = DEFAULT_DB
         return
     if not _ensure_reportlab(parent):
         return
-    if not os.path.exists(db_path):
-        messagebox.showerror('Error', f'No se encontró la base de datos: {db_path}', parent=parent)
-        return
-
-    try:
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-        sql = (
-            "SELECT i.code_item, COALESCE(i.description_item, '') "
-            "FROM items i "
-            "WHERE NOT EXISTS (SELECT 1 FROM inventory_count ic WHERE ic.code_item = i.code_item) "
-            "ORDER BY i.code_item ASC"
-        )
-        cur.execute(sql)
-        rows = cur.fetchall()
-        conn.close()
-    except Exception as e:
-        messagebox.showerror('Error', f'Error al leer la base de datos: {e}', parent=parent)
-        return
-
-    from reportlab.lib.pagesizes import A4, landscape
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-
-    styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    normal = styles['Normal']
-
-    doc = SimpleDocTemplate(file_path, pagesize=landscape(A4), rightMargin=18, leftMargin=18, topMargin=18, bottomMargin=18)
-    story = []
-    story.append(Paragraph('Items No en Inventario', title_style))
-    story.append(Spacer(1, 8))
-
-    headers = ['Código', 'Descripción']
-    data = [headers]
-    for r in rows:
-        code = r[0] or ''
-        desc = (r[1] or '')[:300]
-        data.append([code, desc])
-
-    if len(data) == 1:
-        story.append(Paragraph('No hay registros para reportar.', normal))
-    else:
-        col_widths = [120, 600]
-        table = Table(data, repeatRows=1, hAlign='LEFT', colWidths=col_widths)
-        tbl_style = TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d3d3d3')),
-            ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('LEFTPADDING', (0, 0), (-1, -1), 4),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-        ])
-        table.setStyle(tbl_style)
-        story.append(table)
-
-    try:
-        doc.build(story)
-    except Exception as e:
-        messagebox.showerror('Error', f'Error al generar el PDF: {e}', parent=parent)
-        return
-
-    _open_pdf_file(file_path, parent=parent)
-    messagebox.showinfo('OK', f'Reporte PDF generado: {file_path}', parent=parent)
+    _run_report(parent, build_items_not_in_inventory, db_path, file_path)
 
 
 def add_pdf_report_items_not_in_inventory_button(parent_frame, db_path: str = DEFAULT_DB, button_text: str = 'Items no en Inventario'):
@@ -1071,23 +840,15 @@ def add_pdf_report_items_not_in_inventory_button(parent_frame, db_path: str = DE
         return btn
 
 
-def generate_pdf_report_verificacion_remarks(parent, db_path: str = DEFAULT_DB):
-    """Generate a verification-style report but only include records where remarks is not empty."""
-    file_path = _asksave(parent)
-    if not file_path:
-        return
-    if not _ensure_reportlab(parent):
-        return
-    if not os.path.exists(db_path):
-        messagebox.showerror('Error', f'No se encontró la base de datos: {db_path}', parent=parent)
-        return
-
-    sql = """
+# same layout as 'Reporte Verificación', quantities without thousands separator
+VERIFICACION_REMARKS_SPEC = ReportSpec(
+    'verificacion_remarks', 'Reporte Verificación (con Remarks)', verificacion_columns('str'),
+    sql="""
     SELECT 
         ic.counter_name,
         d.deposit_description AS deposito,
         r.rack_description AS rack,
-        ic.location AS ubicacion,
+        COALESCE(l.display_name, ic.location) AS ubicacion,
         ic.code_item AS producto_codigo,
         COALESCE(i.description_item, '') AS producto,
         ic.boxqty AS cajas,
@@ -1100,95 +861,30 @@ def generate_pdf_report_verificacion_remarks(parent, db_path: str = DEFAULT_DB):
     FROM inventory_count ic
     LEFT JOIN deposits d ON ic.deposit_id = d.deposit_id
     LEFT JOIN racks r ON ic.rack_id = r.rack_id
-    LEFT JOIN items i on ic.code_item = i.code_item
+    LEFT JOIN locations l ON l.location_id = ic.location_id
+    LEFT JOIN items i on i.item_id = ic.item_id
     WHERE ic.remarks IS NOT NULL AND TRIM(ic.remarks) <> ''
     ORDER BY ic.counter_name ASC, d.deposit_description ASC, r.rack_description ASC, ic.id ASC;
-    """
+    """,
+    groups=VERIFICACION_GROUPS)
 
-    try:
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-        cur.execute(sql)
-        rows = cur.fetchall()
-        conn.close()
-    except Exception as e:
-        messagebox.showerror('Error', f'Error al leer la base de datos: {e}', parent=parent)
-        return
 
-    grouped = {}
-    for row in rows:
-        counter_name, deposito, rack = row[0], row[1], row[2]
-        grouped.setdefault(counter_name, {}).setdefault(deposito, {}).setdefault(rack, []).append(row)
-
-    # lazy imports for reportlab
-    from reportlab.lib.pagesizes import A4, landscape
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-
-    styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    contador_style = styles['Heading2']
-    deposito_style = styles['Heading3']
-    rack_style = styles['Heading4']
-    normal = styles['Normal']
-
-    doc = SimpleDocTemplate(file_path, pagesize=landscape(A4), rightMargin=18, leftMargin=18, topMargin=18, bottomMargin=18)
-    story = []
-    story.append(Paragraph('Reporte Verificación (con Remarks)', title_style))
-    story.append(Spacer(1, 8))
-
-    col_headers = ['Ubicación', 'Código', 'Producto', 'Cajas', 'U/caja', 'Tot. U/cajas', 'Sueltos', 'Total', 'ID', 'Comentarios']
-    for ci, (counter_name, depositos) in enumerate(grouped.items()):
-        story.append(Paragraph(f'Contador: {counter_name}', contador_style))
-        story.append(Spacer(1, 6))
-        for deposito, racks in depositos.items():
-            story.append(Paragraph(f'Depósito: {deposito}', deposito_style))
-            story.append(Spacer(1, 4))
-            for rack, items in racks.items():
-                story.append(Paragraph(f'Rack: {rack} — {len(items)} registros', rack_style))
-                story.append(Spacer(1, 4))
-                data = [col_headers]
-                for r in items:
-                    data.append([
-                        r[3] or '',
-                        r[4] or '',
-                        (r[5] or '')[:60],
-                        str(r[6] or 0),
-                        str(r[7] or 0),
-                        str(r[8] or 0),
-                        str(r[9] or 0),
-                        str(r[10] or 0),
-                        str(r[11] or ''),
-                        (r[12] or '')[:120]
-                    ])
-                table = Table(data, repeatRows=1, hAlign='LEFT', colWidths=[90, 60, 140, 35, 40, 45, 45, 45, 30, 120])
-                tbl_style = TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d3d3d3')),
-                    ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 8),
-                    ('LEFTPADDING', (0, 0), (-1, -1), 4),
-                    ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-                ])
-                table.setStyle(tbl_style)
-                story.append(table)
-                story.append(Spacer(1, 8))
-        if ci < len(grouped) - 1:
-            story.append(PageBreak())
-
-    if not grouped:
-        story.append(Paragraph('No hay registros para reportar.', normal))
+def build_verificacion_remarks(db_path: str, output_path: str) -> dict:
+    """Verification-style report of the records with remarks.
+
+    Returns ``{"path", "rows", "pages"}``; raises ReportError.
+    """
+    return render(VERIFICACION_REMARKS_SPEC, db_path, output_path)
 
-    try:
-        doc.build(story)
-    except Exception as e:
-        messagebox.showerror('Error', f'Error al generar el PDF: {e}', parent=parent)
-        return
 
-    _open_pdf_file(file_path, parent=parent)
-    messagebox.showinfo('OK', f'Reporte PDF generado: {file_path}', parent=parent)
+def generate_pdf_report_verificacion_remarks(parent, db_path: str = DEFAULT_DB):
+    """Generate a verification-style report but only include records where remarks is not empty."""
+    file_path = _asksave(parent)
+    if not file_path:
+        return
+    if not _ensure_reportlab(parent):
+        return
+    _run_report(parent, build_verificacion_remarks, db_path, file_path)
 
 
 def add_pdf_report_verificacion_remarks_button(parent_frame, db_path: str = DEFAULT_DB, button_text: str = 'Verificación (Remarks)'):
@@ -1208,57 +904,3 @@ def add_pdf_report_verificacion_remarks_button(parent_frame, db_path: str = DEFA
         except Exception:
             btn.pack(pady=8)
         return btn
-    for r in rows:
-        data.append([
-            r[0] or '',
-            (r[1] or '')[:200],
-            str(r[2] or 0),
-            str(r[3] or 0),
-            str(r[4] or 0),
-            str(r[5] or 0),
-            str(abs(r[6] or 0))
-        ])
-
-    if len(data) == 1:
-        story.append(Paragraph('No hay registros para reportar.', normal))
-    else:
-        table = Table(data, repeatRows=1, hAlign='LEFT', colWidths=[80, 360, 60, 60, 60, 60, 60])
-        tbl_style = TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d3d3d3')),
-            ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('LEFTPADDING', (0, 0), (-1, -1), 4),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-        ])
-        table.setStyle(tbl_style)
-        story.append(table)
-
-    try:
-        doc.build(story)
-    except Exception as e:
-        messagebox.showerror('Error', f'Error al generar el PDF: {e}', parent=parent)
-        return
-
-    _open_pdf_file(file_path, parent=parent)
-    messagebox.showinfo('OK', f'Reporte PDF generado: {file_path}', parent=parent)
-
-
-def add_pdf_report_diferencias_resumen_button(parent_frame, db_path: str = DEFAULT_DB, button_text: str = 'Diferencias Resumen'):
-    try:
-        from tkinter import ttk
-        btn = ttk.Button(parent_frame, text=button_text, command=lambda: generate_pdf_report_diferencias_resumen(parent_frame, db_path))
-        try:
-            btn.grid(row=33, column=0, pady=8)
-        except Exception:
-            btn.pack(pady=8)
-        return btn
-    except Exception:
-        from tkinter import Button as _Btn
-        btn = _Btn(parent_frame, text=button_text, command=lambda: generate_pdf_report_diferencias_resumen(parent_frame, db_path))
-        try:
-            btn.grid(row=33, column=0, pady=8)
-        except Exception:
-            btn.pack(pady=8)
-        return btn
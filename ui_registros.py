@@ -1,7 +1,15 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from db_utils import get_deposits, get_racks
+from db_utils import get_deposits, get_racks, get_counters, ensure_resumen_indexes
+from ref_cache import get_ref_cache
+import change_bus
+from ui_grid import VirtualGrid, SqlPageSource, ColumnarSource, KeysetLoader
+from count_filters import ensure_count_filter_indexes, parse_filter_date, build_count_where
+from location_resolver import get_location_resolver
+from count_dates import normalize_count_date
+from count_recompute import COUNT_SOURCE
 import sqlite3
+import time
 from datetime import datetime
 
 DB_NAME = 'inventariovlm.db'
@@ -72,48 +80,84 @@ class _Tooltip:
 
 def mostrar_registros(root):
     # --- Lógica migrada desde app.py ---
-    def cargar_datos(order_by="code_item", filter_code=None):
-        valid_fields = [
-            "id", "counter_name", "count_date", "deposit_id", "rack_id", "location", "code_item",
-            "boxqty", "boxunitqty", "boxunittotal", "magazijn", "winkel", "total", "current_inventory", "difference"
-        ]
-        col_sql = order_by if order_by in valid_fields else "counter_name"
-        for r in tree.get_children():
-            tree.delete(r)
-        conn = sqlite3.connect(DB_NAME)
-        cur = conn.cursor()
+    valid_fields = [
+        "id", "counter_name", "count_date", "deposit_id", "rack_id", "location", "code_item",
+        "boxqty", "boxunitqty", "boxunittotal", "magazijn", "winkel", "total", "current_inventory", "difference"
+    ]
+    current_order = "code_item"
+    current_filter = None
+    current_exact = True
+    loader = None
+    store = None
+    store_complete = False
+    # criterios de la barra de filtros (sin el código) con los que se cargó `store`
+    store_criteria = None
+
+    def cargar_datos(order_by=None, filter_code=None, reload=False, code_exact=True):
+        nonlocal current_order, current_filter, current_exact, loader, store, store_complete, store_criteria
+        if order_by is not None:
+            current_order = order_by if order_by in valid_fields else "counter_name"
         try:
-            query = (
-                "SELECT c.id, c.counter_name, c.count_date, c.deposit_id, c.rack_id, c.location, c.code_item, "
-                "c.boxqty, c.boxunitqty, c.boxunittotal, c.magazijn, c.winkel, c.total, c.current_inventory, c.difference "
-                "FROM inventory_count c"
-            )
-            params = ()
-            if filter_code:
-                query += " WHERE c.code_item = ?"
-                params = (filter_code,)
-            query += f" ORDER BY {col_sql}"
-            cur.execute(query, params)
-            rows = cur.fetchall()
-            print(f"[ui_registros] cargar_datos: fetched {len(rows)} rows (filter={filter_code})")
-            if rows:
-                print("[ui_registros] first row sample:", rows[0])
-            for row in rows:
-                tree.insert("", "end", values=row)
+            criteria = leer_criterios()
+        except ValueError as e:
+            messagebox.showerror("Filtro inválido", str(e), parent=win)
+            return
+        current_filter = filter_code
+        current_exact = code_exact
+        same_criteria = store is not None and not reload and store_criteria == criteria
+        if same_criteria and store_complete:
+            # ya está todo en memoria: reordenar/filtrar por código sin consultar la BD
+            store.set_view(current_order, False, "code_item", filter_code, prefix=not code_exact)
+            grid.set_source(store)
+            lbl_count.config(text=f"{grid.total} registros")
+            return
+        # Mientras tanto se muestra la consulta paginada: COUNT primero y luego la página visible
+        where_sql, params = build_count_where(dict(criteria, code=filter_code, code_exact=code_exact))
+        source = SqlPageSource(DB_NAME, ["c." + f for f in valid_fields], f"{COUNT_SOURCE} c",
+                               where_sql, params, order_by="c." + current_order, key_col="c.id")
+        t0 = time.perf_counter()
+        try:
+            # set_source hace el COUNT y después lee solo la página visible
+            grid.set_source(source)
         except Exception as e:
             messagebox.showerror("Error de consulta", f"No se pudo cargar registros: {e}", parent=win)
-        finally:
-            conn.close()
+            return
+        lbl_count.config(text=f"{grid.total} registros ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+        # ...y en segundo plano se cargan en columnas las filas de los criterios (una vez por criterio)
+        if same_criteria:
+            return
+        if loader is not None:
+            loader.cancel()
+        store = ColumnarSource(valid_fields)
+        store_complete = False
+        store_criteria = criteria
+        new_store = store
+        base_where, base_params = build_count_where(criteria, alias=None)
+
+        def on_done(total):
+            nonlocal store_complete
+            if new_store is not store:
+                return
+            store_complete = True
+            store.set_view(current_order, False, "code_item", current_filter, prefix=not current_exact)
+            # mismo orden que la consulta: se conserva la posición
+            grid.set_source(store, keep_position=True)
+
+        loader = KeysetLoader(win, DB_NAME, COUNT_SOURCE, valid_fields, "id",
+                              where_sql=base_where, params=base_params,
+                              page_size=2000, on_page=new_store.append, on_done=on_done,
+                              on_error=lambda e: None).start()
 
     def on_ordenar(col):
-        cargar_datos(col)
+        cargar_datos(col, filter_code=current_filter, code_exact=current_exact)
 
     win = tk.Toplevel(root)
     win.title("Registros de Inventario")
     win.geometry("1800x700")
 
     cols = ("id", "counter_name", "count_date", "deposit_id", "rack_id", "location", "code_item", "boxqty", "boxunitqty", "boxunittotal", "magazijn", "winkel", "total", "current_inventory", "difference")
-    tree = ttk.Treeview(win, columns=cols, show="headings", height=12)
+    grid = VirtualGrid(win, cols, height=12)
+    tree = grid.tree
     for col in cols:
         heading = col.replace("_", " ").title()
         tree.heading(col, text=heading, command=lambda c=col: on_ordenar(c))
@@ -123,7 +167,37 @@ def mostrar_registros(root):
         elif col == "id":
             width = 60
         tree.column(col, width=width, anchor="center")
-    tree.pack(fill="both", expand=True, padx=6, pady=6)
+    grid.frame.pack(fill="both", expand=True, padx=6, pady=6)
+
+    def apply_change(row_id, row):
+        # Parchea la fila en la grilla (y en la copia en memoria si aún no es la fuente)
+        if row is None:
+            grid.remove_row(row_id)
+            if store is not None and store is not grid.source:
+                store.remove_row(row_id)
+        else:
+            grid.update_row(row_id, row)
+            if store is not None and store is not grid.source:
+                store.update_row(row_id, row)
+
+    def on_external_change(change):
+        # cambios hechos desde otra ventana de registros
+        if change.op == "reload":
+            cargar_datos(current_order, filter_code=current_filter, reload=True, code_exact=current_exact)
+        elif change.op == "delete":
+            apply_change(change.row_id, None)
+        elif change.op == "update" and change.row is not None:
+            apply_change(change.row_id, change.row)
+
+    bus_token = change_bus.subscribe("inventory_count", on_external_change)
+
+    def _on_destroy(event=None):
+        if event is not None and event.widget is not win:
+            return
+        change_bus.unsubscribe(bus_token)
+        if loader is not None:
+            loader.cancel()
+    win.bind("<Destroy>", _on_destroy, add=True)
 
     frm = ttk.Frame(win, padding=6)
     frm.pack(fill="x", padx=6, pady=(0,6))
@@ -144,7 +218,7 @@ def mostrar_registros(root):
     status_total = ttk.Label(frm, text="", foreground="red")
 
     # Combobox de depósito y rack
-    deposits_list = get_deposits()
+    deposits_list = get_deposits(DB_NAME)
     deposits_display = [d[1] for d in deposits_list]
     edit_deposit = ttk.Combobox(frm, values=deposits_display, state="readonly", width=18)
     edit_rack = ttk.Combobox(frm, values=[], state="readonly", width=18)
@@ -156,7 +230,16 @@ def mostrar_registros(root):
     # Filtro por código
     lbl_filter = ttk.Label(frm, text="Filtrar código:")
     edit_filter = ttk.Entry(frm, width=12)
-    def _on_filter():
+    filter_after_id = None
+
+    def _on_filter(exact=True):
+        nonlocal filter_after_id
+        if filter_after_id is not None:
+            try:
+                win.after_cancel(filter_after_id)
+            except Exception:
+                pass
+            filter_after_id = None
         filter_text = edit_filter.get().strip()
         try:
             current_code = edit_code.get().strip()
@@ -165,10 +248,26 @@ def mostrar_registros(root):
         # clear the edit-line selection only if the filter differs from the selected code
         if filter_text != current_code:
             _clear_selection()
-        cargar_datos(filter_code=filter_text or None)
+        cargar_datos(current_order, filter_code=filter_text or None, code_exact=exact)
     btn_filter = ttk.Button(frm, text="Filtrar", command=_on_filter)
+
+    def _on_filter_typed(event=None):
+        # filtrar mientras se escribe (prefijo), esperando una pausa de 300 ms
+        nonlocal filter_after_id
+        if event is not None and event.keysym in ("Return", "KP_Enter", "Tab", "Shift_L", "Shift_R",
+                                                  "Control_L", "Control_R", "Alt_L", "Alt_R"):
+            return
+        if filter_after_id is not None:
+            try:
+                win.after_cancel(filter_after_id)
+            except Exception:
+                pass
+        filter_after_id = win.after(300, lambda: _on_filter(exact=False))
+    edit_filter.bind("<KeyRelease>", _on_filter_typed)
+    edit_filter.bind("<Return>", lambda e: _on_filter())
     def _clear_selection():
         # Clear all edit fields to avoid confusion after clearing filter
+        grid.clear_selection()
         for w in (edit_counter, edit_code, edit_desc, edit_boxqty, edit_boxunitqty, edit_boxunittotal,
                   edit_mag, edit_win, edit_total, edit_current, edit_diff, edit_location, edit_date):
             try:
@@ -193,7 +292,90 @@ def mostrar_registros(root):
         except Exception:
             pass
 
-    btn_clear = ttk.Button(frm, text="Limpiar filtro", command=lambda: (edit_filter.delete(0, tk.END), _clear_selection(), cargar_datos()))
+    # --- Barra de filtros combinados (contador, depósito, rack, fechas, comentario, |diferencia|) ---
+    frm_flt = ttk.Frame(frm)
+    ttk.Label(frm_flt, text="Contador:").pack(side="left", padx=(0, 2))
+    flt_counter = ttk.Combobox(frm_flt, state="readonly", width=12,
+                               values=[""] + [c for c in get_counters(DB_NAME) if c])
+    flt_counter.pack(side="left", padx=2)
+    ttk.Label(frm_flt, text="Depósito:").pack(side="left", padx=(6, 2))
+    flt_deposit = ttk.Combobox(frm_flt, state="readonly", width=16, values=[""] + deposits_display)
+    flt_deposit.pack(side="left", padx=2)
+    ttk.Label(frm_flt, text="Rack:").pack(side="left", padx=(6, 2))
+    flt_racks = get_racks(DB_NAME)(None)
+    flt_rack = ttk.Combobox(frm_flt, state="readonly", width=12, values=[""] + [r[1] for r in flt_racks])
+    flt_rack.pack(side="left", padx=2)
+
+    def _on_flt_deposit(event=None):
+        # solo los racks usados en el depósito elegido
+        nonlocal flt_racks
+        idx = flt_deposit.current()
+        dep_id = deposits_list[idx - 1][0] if idx > 0 else None
+        sel = flt_rack.get()
+        flt_racks = get_racks(DB_NAME)(dep_id)
+        flt_rack['values'] = [""] + [r[1] for r in flt_racks]
+        flt_rack.set(sel if sel in flt_rack['values'] else "")
+    flt_deposit.bind("<<ComboboxSelected>>", _on_flt_deposit)
+    ttk.Label(frm_flt, text="Desde:").pack(side="left", padx=(6, 2))
+    flt_from = ttk.Entry(frm_flt, width=11)
+    flt_from.pack(side="left", padx=2)
+    ttk.Label(frm_flt, text="Hasta:").pack(side="left", padx=(6, 2))
+    flt_to = ttk.Entry(frm_flt, width=11)
+    flt_to.pack(side="left", padx=2)
+    flt_remarks_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(frm_flt, text="Con comentario", variable=flt_remarks_var).pack(side="left", padx=(6, 2))
+    ttk.Label(frm_flt, text="|Dif| >").pack(side="left", padx=(6, 2))
+    flt_diff = ttk.Entry(frm_flt, width=6)
+    flt_diff.pack(side="left", padx=2)
+    btn_apply = ttk.Button(frm_flt, text="Aplicar",
+                           command=lambda: cargar_datos(current_order, filter_code=current_filter, code_exact=current_exact))
+    btn_apply.pack(side="left", padx=(6, 2))
+    lbl_count = ttk.Label(frm_flt, text="")
+    lbl_count.pack(side="left", padx=(10, 2))
+    for w in (flt_from, flt_to, flt_diff):
+        w.bind("<Return>", lambda e: btn_apply.invoke())
+
+    def leer_criterios():
+        """Criterios de la barra de filtros (sin el código). Lanza ValueError si alguno es inválido."""
+        criteria = {}
+        if flt_counter.get():
+            criteria["counter"] = flt_counter.get()
+        idx = flt_deposit.current()
+        if idx > 0:
+            criteria["deposit_id"] = deposits_list[idx - 1][0]
+        idx = flt_rack.current()
+        if idx > 0:
+            criteria["rack_id"] = flt_racks[idx - 1][0]
+        date_from = parse_filter_date(flt_from.get())
+        date_to = parse_filter_date(flt_to.get())
+        if date_from and date_to and date_from > date_to:
+            raise ValueError("La fecha 'Desde' es posterior a 'Hasta'")
+        if date_from:
+            criteria["date_from"] = date_from
+        if date_to:
+            criteria["date_to"] = date_to
+        if flt_remarks_var.get():
+            criteria["with_remarks"] = True
+        diff_text = flt_diff.get().strip()
+        if diff_text:
+            try:
+                criteria["min_abs_diff"] = abs(int(diff_text))
+            except ValueError:
+                raise ValueError(f"|Dif| debe ser un número entero: {diff_text}")
+        return criteria
+
+    def _clear_all_filters():
+        edit_filter.delete(0, tk.END)
+        for w in (flt_counter, flt_deposit, flt_rack):
+            w.set("")
+        _on_flt_deposit()
+        for w in (flt_from, flt_to, flt_diff):
+            w.delete(0, tk.END)
+        flt_remarks_var.set(False)
+        _clear_selection()
+        cargar_datos(current_order)
+
+    btn_clear = ttk.Button(frm, text="Limpiar filtro", command=_clear_all_filters)
 
     # racks_list se actualizará dinámicamente
     racks_list = []
@@ -217,6 +399,7 @@ def mostrar_registros(root):
     edit_filter.grid(row=1, column=1, padx=2, pady=2)
     btn_filter.grid(row=1, column=2, padx=2, pady=2)
     btn_clear.grid(row=1, column=3, padx=2, pady=2)
+    frm_flt.grid(row=2, column=0, columnspan=15, sticky="w", padx=2, pady=(4, 2))
 
     # Tooltips: brief labels shown on hover for the edit fields
     try:
@@ -234,8 +417,11 @@ def mostrar_registros(root):
         _Tooltip(edit_deposit, "Depósito: seleccionar depósito")
         _Tooltip(edit_rack, "Rack: seleccionar rack dentro del depósito")
         _Tooltip(edit_location, "Ubicación: depósito - rack (solo lectura)")
-        _Tooltip(edit_date, "Fecha del conteo (ISO o deje vacío para fecha actual)")
-        _Tooltip(edit_filter, "Escriba un código y presione Filtrar")
+        _Tooltip(edit_date, "Fecha del conteo (AAAA-MM-DD o DD/MM/AAAA; vacío = hoy)")
+        _Tooltip(edit_filter, "Filtra por prefijo mientras escribe; Filtrar o Enter buscan el código exacto")
+        _Tooltip(flt_from, "Fecha inicial (AAAA-MM-DD o DD/MM/AAAA)")
+        _Tooltip(flt_to, "Fecha final, inclusive (AAAA-MM-DD o DD/MM/AAAA)")
+        _Tooltip(flt_diff, "Mostrar solo registros con |diferencia| mayor que este valor")
     except Exception:
         # Tooltips are best-effort; if anything goes wrong keep UI functional
         pass
@@ -257,7 +443,7 @@ def mostrar_registros(root):
         deposit_id = deposits_list[idx][0]
         # get_racks returns a callable (inner); call it with deposit_id
         try:
-            racks_list = get_racks()(deposit_id)
+            racks_list = get_racks(DB_NAME)(deposit_id, include_others=True)
         except Exception:
             racks_list = []
         # racks_list may be list of tuples (id, description) or list of strings
@@ -324,18 +510,9 @@ def mostrar_registros(root):
     win.bind('<Delete>', lambda e: eliminar_registro())
     win.bind('<Escape>', lambda e: win.destroy())
 
-    def on_seleccionar(event=None):
-        sel = tree.focus()
-        if not sel:
-            return
-        vals = tree.item(sel, "values")
+    def on_seleccionar(vals=None):
         if not vals:
             return
-        try:
-            print(f"[ui_registros] on_seleccionar values={vals}")
-            print(f"[ui_registros] code_val repr: {repr(vals[6])}")
-        except Exception:
-            pass
         # vals order: id, counter_name, count_date, deposit_id, rack_id, location, code_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference
         edit_counter.delete(0, tk.END); edit_counter.insert(0, vals[1])
         edit_date.delete(0, tk.END); edit_date.insert(0, vals[2])
@@ -394,16 +571,13 @@ def mostrar_registros(root):
                 edit_deposit.set(dep_name)
                 # Prefer to lookup rack description directly by rack_id in the racks table
                 try:
-                    conn2 = sqlite3.connect(DB_NAME)
-                    cur2 = conn2.cursor()
-                    cur2.execute("SELECT rack_description FROM racks WHERE rack_id = ?", (rack_id_val,))
-                    rr = cur2.fetchone()
-                    conn2.close()
+                    rack_desc = get_ref_cache(DB_NAME).get().rack_name(int(rack_id_val))
+                    rr = (rack_desc,) if rack_desc is not None else None
                 except Exception:
                     rr = None
 
                 try:
-                    racks_list = get_racks()(deposit_id_val)
+                    racks_list = get_racks(DB_NAME)(deposit_id_val, include_others=True)
                 except Exception:
                     racks_list = []
                 racks_display_local = [r[1] if isinstance(r, (list, tuple)) and len(r) > 1 else r for r in racks_list]
@@ -450,13 +624,10 @@ def mostrar_registros(root):
         except Exception:
             pass
 
-    tree.bind("<<TreeviewSelect>>", on_seleccionar)
+    grid.bind_select(on_seleccionar)
 
     def _on_double_click(event=None):
-        sel = tree.focus()
-        if not sel:
-            return
-        vals = tree.item(sel, "values")
+        vals = grid.selected_values()
         if not vals:
             return
         # code is at index 6 in this view
@@ -470,19 +641,23 @@ def mostrar_registros(root):
                 edit_filter.insert(0, code_val)
             except Exception:
                 pass
-            cargar_datos(filter_code=code_val)
+            cargar_datos(current_order, filter_code=code_val)
 
     tree.bind("<Double-1>", _on_double_click)
 
     def actualizar_registro():
-        sel = tree.focus()
-        if not sel:
+        sel_vals = grid.selected_values()
+        if not sel_vals:
             messagebox.showerror("Error", "Selecciona un registro", parent=win)
             return
-        id_reg = tree.item(sel, "values")[0]
+        id_reg = sel_vals[0]
         counter = edit_counter.get().strip()
         code = edit_code.get().strip()
-        date_txt = edit_date.get().strip()
+        try:
+            date_txt = normalize_count_date(edit_date.get())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e), parent=win)
+            return
         try:
             boxqty = int(edit_boxqty.get() or 0)
             boxunitqty = int(edit_boxunitqty.get() or 0)
@@ -496,211 +671,20 @@ def mostrar_registros(root):
         if not deposit_name:
             messagebox.showerror("Error", "Selecciona Deposit", parent=win)
             return
-        deposit_id = None
-        rack_id = None
-        dep_name_norm = deposit_name.strip() if isinstance(deposit_name, str) else deposit_name
-        rack_name_norm = rack_name.strip() if isinstance(rack_name, str) else rack_name
-
-        # Try to resolve deposit_id from the in-memory list (case-insensitive)
-        for d in deposits_list:
-            try:
-                if isinstance(d, (list, tuple)):
-                    # d[1] is usually the description
-                    if len(d) >= 2 and str(d[1]).strip().lower() == str(dep_name_norm).lower():
-                        deposit_id = d[0]
-                        break
-                    # support other tuple shapes where description may be at index 2
-                    if len(d) >= 3 and str(d[2]).strip().lower() == str(dep_name_norm).lower():
-                        deposit_id = d[0]
-                        break
-                    # allow matching if user pasted an id into the combobox
-                    if str(d[0]).strip() == str(dep_name_norm):
-                        deposit_id = d[0]
-                        break
-                else:
-                    if str(d).strip().lower() == str(dep_name_norm).lower():
-                        # single-value list case: we need to lookup id from DB
-                        deposit_id = None
-                        break
-            except Exception:
-                continue
-
-        # Resolve rack_id primarily by querying the `racks` table (preferred over in-memory lists).
-        # Strategies tried: numeric id, exact with deposit, exact without deposit, startswith with deposit, LIKE without deposit.
-        try:
-            conn_r = sqlite3.connect(DB_NAME)
-            cur_r = conn_r.cursor()
-            # 1) numeric id
-            try:
-                cand = int(rack_name_norm)
-                cur_r.execute("SELECT rack_id FROM racks WHERE rack_id = ? LIMIT 1", (cand,))
-                rr = cur_r.fetchone()
-                if rr:
-                    rack_id = rr[0]
-            except Exception:
-                pass
-
-            # 2) exact match with deposit
-            if rack_id is None and rack_name_norm and deposit_id is not None:
-                try:
-                    cur_r.execute("SELECT rack_id FROM racks WHERE rack_description = ? AND deposit_id = ? COLLATE NOCASE LIMIT 1", (rack_name_norm, deposit_id))
-                    rr = cur_r.fetchone()
-                    if rr:
-                        rack_id = rr[0]
-                except Exception:
-                    pass
-
-            # 3) exact match without deposit
-            if rack_id is None and rack_name_norm:
-                try:
-                    cur_r.execute("SELECT rack_id FROM racks WHERE rack_description = ? COLLATE NOCASE LIMIT 1", (rack_name_norm,))
-                    rr = cur_r.fetchone()
-                    if rr:
-                        rack_id = rr[0]
-                except Exception:
-                    pass
-
-            # 4) startswith within deposit
-            if rack_id is None and rack_name_norm and deposit_id is not None:
-                try:
-                    cur_r.execute("SELECT rack_id FROM racks WHERE rack_description LIKE ? AND deposit_id = ? LIMIT 1", (f"{rack_name_norm}%", deposit_id))
-                    rr = cur_r.fetchone()
-                    if rr:
-                        rack_id = rr[0]
-                except Exception:
-                    pass
-
-            # 5) LIKE fallback without deposit
-            if rack_id is None and rack_name_norm:
-                try:
-                    cur_r.execute("SELECT rack_id FROM racks WHERE rack_description LIKE ? LIMIT 1", (f"%{rack_name_norm}%",))
-                    rr = cur_r.fetchone()
-                    if rr:
-                        rack_id = rr[0]
-                except Exception:
-                    pass
-
-            try:
-                conn_r.close()
-            except Exception:
-                pass
-        except Exception:
-            rack_id = None
-
-        # Fallback: if deposit_id couldn't be determined earlier, resolve it from DB now
-        if deposit_id is None:
-            try:
-                cur2 = sqlite3.connect(DB_NAME).cursor()
-                cur2.execute("SELECT deposit_id FROM deposits WHERE deposit_description = ? COLLATE NOCASE LIMIT 1", (dep_name_norm,))
-                rr = cur2.fetchone()
-                if rr:
-                    deposit_id = rr[0]
-                else:
-                    # try matching by number or trimmed description
-                    cur2.execute("SELECT deposit_id FROM deposits WHERE deposit_number = ? LIMIT 1", (dep_name_norm,))
-                    rr = cur2.fetchone()
-                    if rr:
-                        deposit_id = rr[0]
-                try:
-                    cur2.connection.close()
-                except Exception:
-                    pass
-            except Exception:
-                deposit_id = None
-
-        # Fallback: DB lookup for rack by description (case-insensitive), prefer same-deposit match
-        if rack_id is None:
-            try:
-                conn3 = sqlite3.connect(DB_NAME)
-                cur3 = conn3.cursor()
-                if deposit_id is not None:
-                    cur3.execute("SELECT rack_id FROM racks WHERE rack_description = ? AND deposit_id = ? COLLATE NOCASE LIMIT 1", (rack_name_norm, deposit_id))
-                    rr = cur3.fetchone()
-                    if rr:
-                        rack_id = rr[0]
-                if rack_id is None:
-                    # try exact match without deposit
-                    cur3.execute("SELECT rack_id FROM racks WHERE rack_description = ? COLLATE NOCASE LIMIT 1", (rack_name_norm,))
-                    rr = cur3.fetchone()
-                    if rr:
-                        rack_id = rr[0]
-                if rack_id is None:
-                    # try partial match
-                    if deposit_id is not None:
-                        cur3.execute("SELECT rack_id FROM racks WHERE rack_description LIKE ? AND deposit_id = ? LIMIT 1", (f"%{rack_name_norm}%", deposit_id))
-                        rr = cur3.fetchone()
-                        if rr:
-                            rack_id = rr[0]
-                    if rack_id is None:
-                        cur3.execute("SELECT rack_id FROM racks WHERE rack_description LIKE ? LIMIT 1", (f"%{rack_name_norm}%",))
-                        rr = cur3.fetchone()
-                        if rr:
-                            rack_id = rr[0]
-                try:
-                    conn3.close()
-                except Exception:
-                    pass
-            except Exception:
-                rack_id = None
-
+        resolver = get_location_resolver(DB_NAME)
+        deposit_id, _ = resolver.resolve_deposit(deposit_name)
         if deposit_id is None:
             messagebox.showerror("Error", f"Depósito inválido (deposit: {deposit_name} -> {deposit_id})", parent=win)
             return
-        # If rack_id couldn't be resolved, allow storing NULL or numeric string
-        if rack_id is None:
-            # try interpreting the rack_name as an id (user may have pasted numeric id)
-            try:
-                rack_id = int(rack_name_norm)
-            except Exception:
-                rack_id = None
-
-        # If still None, try to extract rack from location (format: 'Deposit - Rack') and retry DB lookup
-        if rack_id is None:
-            loc_val = ''
+        rack_id, _ = resolver.resolve_rack(rack_name, deposit_id)
+        if rack_id is None and not (rack_name or "").strip():
+            # sin rack seleccionado: tomarlo de la ubicación ('Deposit - Rack')
             try:
                 loc_val = edit_location.get().strip()
             except Exception:
                 loc_val = ''
-            if not rack_name_norm and loc_val and ' - ' in loc_val:
-                candidate = loc_val.split(' - ', 1)[1].strip()
-                if candidate:
-                    rack_name_norm = candidate
-
-        # As a last-resort DB fuzzy search for rack_name
-        if rack_id is None and rack_name_norm:
-            try:
-                conn_f = sqlite3.connect(DB_NAME)
-                cur_f = conn_f.cursor()
-                # prefer same-deposit exact match (case-insensitive)
-                if deposit_id is not None:
-                    cur_f.execute("SELECT rack_id FROM racks WHERE rack_description = ? AND deposit_id = ? COLLATE NOCASE LIMIT 1", (rack_name_norm, deposit_id))
-                    rr = cur_f.fetchone()
-                    if rr:
-                        rack_id = rr[0]
-                if rack_id is None:
-                    # try startswith
-                    if deposit_id is not None:
-                        cur_f.execute("SELECT rack_id FROM racks WHERE rack_description LIKE ? AND deposit_id = ? LIMIT 1", (f"{rack_name_norm}%", deposit_id))
-                        rr = cur_f.fetchone()
-                        if rr:
-                            rack_id = rr[0]
-                    if rack_id is None:
-                        cur_f.execute("SELECT rack_id FROM racks WHERE rack_description LIKE ? LIMIT 1", (f"%{rack_name_norm}%",))
-                        rr = cur_f.fetchone()
-                        if rr:
-                            rack_id = rr[0]
-                try:
-                    conn_f.close()
-                except Exception:
-                    pass
-            except Exception:
-                pass
-        # DEBUG: print resolution results to help diagnose missing rack_id
-        try:
-            print(f"[ui_registros] actualizar_registro: id={id_reg} deposit_name={deposit_name!r} dep_id_resolved={deposit_id!r} rack_name={rack_name!r} rack_id_resolved={rack_id!r}")
-            print(f"[ui_registros] racks_list sample (first 6): {racks_list[:6]}")
-        except Exception:
-            pass
+            if ' - ' in loc_val:
+                rack_id, _ = resolver.resolve_rack(loc_val.split(' - ', 1)[1], deposit_id)
         conn = sqlite3.connect(DB_NAME)
         cur = conn.cursor()
         cur.execute("SELECT current_inventory FROM items WHERE code_item = ?", (code,))
@@ -716,32 +700,41 @@ def mostrar_registros(root):
         diff = total - current_inv
         location = f"{deposit_name} - {rack_name}"
         edit_location.config(state="normal"); edit_location.delete(0, tk.END); edit_location.insert(0, location); edit_location.config(state="readonly")
-        print(f"[ui_registros] executing UPDATE for id={id_reg} with rack_id={rack_id}")
         cur.execute("""
             UPDATE inventory_count
             SET counter_name=?, code_item=?, boxqty=?, boxunitqty=?, boxunittotal=?, magazijn=?, winkel=?, total=?, current_inventory=?, difference=?, deposit_id=?, rack_id=?, location=?, count_date=?
             WHERE id=?
-        """, (counter, code, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inv, diff, deposit_id, rack_id, location, date_txt or datetime.now().isoformat(), id_reg))
+        """, (counter, code, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inv, diff, deposit_id, rack_id, location, date_txt, id_reg))
+        # releer la fila tal como la muestra la grilla: RETURNING no ve lo que cambian los triggers
+        # (fecha normalizada, item_id) ni los valores calculados de inventory_count_live
+        new_row = None
+        if cur.rowcount:
+            new_row = cur.execute(f"SELECT {', '.join(valid_fields)} FROM {COUNT_SOURCE} WHERE id = ?", (id_reg,)).fetchone()
         conn.commit()
         conn.close()
-        # keep current filter if any
-        cargar_datos(filter_code=edit_filter.get().strip() or None)
+        if new_row:
+            # solo se actualiza la fila afectada; se conserva el desplazamiento
+            apply_change(new_row[0], new_row)
+            change_bus.publish("inventory_count", "update", new_row[0], row=new_row, code_item=new_row[6], source=bus_token)
         messagebox.showinfo("OK", "Registro actualizado", parent=win)
 
     def eliminar_registro():
-        sel = tree.focus()
-        if not sel:
+        sel_vals = grid.selected_values()
+        if not sel_vals:
             messagebox.showerror("Error", "Selecciona un registro", parent=win)
             return
-        id_reg = tree.item(sel, "values")[0]
+        id_reg = sel_vals[0]
         if not messagebox.askyesno("Confirmar", "¿Eliminar este registro?", parent=win):
             return
         conn = sqlite3.connect(DB_NAME)
         cur = conn.cursor()
-        cur.execute("DELETE FROM inventory_count WHERE id = ?", (id_reg,))
+        cur.execute("DELETE FROM inventory_count WHERE id = ? RETURNING id, code_item", (id_reg,))
+        deleted = cur.fetchone()
         conn.commit()
         conn.close()
-        cargar_datos()
+        if deleted:
+            apply_change(deleted[0], None)
+            change_bus.publish("inventory_count", "delete", deleted[0], code_item=deleted[1], source=bus_token)
         for w in (edit_counter, edit_code, edit_desc, edit_mag, edit_win, edit_total, edit_current, edit_diff, edit_location, edit_date):
             try:
                 w.config(state="normal"); w.delete(0, tk.END)
@@ -851,42 +844,63 @@ def mostrar_registros(root):
     except Exception:
         btn_rpt_resum.pack(padx=6, pady=2)
 
+    # Índices para la barra de filtros (solo se crean la primera vez)
+    ensure_count_filter_indexes(DB_NAME)
     # Mostrar los datos al abrir la ventana
     cargar_datos()
 
 
 def mostrar_registros_resumen(root):
     """Similar window to `mostrar_registros` but operating on `inventory_count_res` summary table."""
-    def cargar_datos(order_by="code_item", order_dir="ASC", filter_code=None):
-        valid_fields = [
-            "id", "code_item", "description_item", "boxqty", "boxunitqty", "boxunittotal",
-            "magazijn", "winkel", "total", "current_inventory", "difference", "updated_date"
-        ]
+    valid_fields = [
+        "id", "code_item", "description_item", "boxqty", "boxunitqty", "boxunittotal",
+        "magazijn", "winkel", "total", "current_inventory", "difference", "updated_date"
+    ]
+    loader = None
+    store = None
+    store_complete = False
+
+    def cargar_datos(order_by="code_item", order_dir="ASC", filter_code=None, reload=False):
+        # Con la tabla ya cargada, ordenar y filtrar se hace en memoria.
+        # Si no, las páginas llegan desde un hilo (keyset sobre (columna, id));
+        # la primera se muestra enseguida y el resto se va agregando.
+        nonlocal loader, store, store_complete
         col_sql = order_by if order_by in valid_fields else "code_item"
         order_dir_sql = "ASC" if str(order_dir).upper() != "DESC" else "DESC"
-        for r in tree.get_children():
-            tree.delete(r)
-        conn = sqlite3.connect(DB_NAME)
-        cur = conn.cursor()
-        try:
-            query = (
-                "SELECT id, code_item, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, updated_date "
-                "FROM inventory_count_res"
-            )
-            params = ()
-            if filter_code:
-                query += " WHERE code_item = ?"
-                params = (filter_code,)
-            query += f" ORDER BY {col_sql} {order_dir_sql}"
-            cur.execute(query, params)
-            rows = cur.fetchall()
-            print(f"[ui_registros_resumen] cargar_datos: fetched {len(rows)} rows (filter={filter_code})")
-            for row in rows:
-                tree.insert("", "end", values=row)
-        except Exception as e:
+        if store is not None and store_complete and not reload:
+            store.set_view(col_sql, order_dir_sql == "DESC", "code_item", filter_code)
+            grid.set_source(store)
+            lbl_status.config(text=f"{store.count()} filas")
+            return
+        if loader is not None:
+            loader.cancel()
+        store = ColumnarSource(valid_fields)
+        store_complete = False
+        # mientras carga, el orden es el de la consulta; el filtro ya se aplica
+        store.set_view(None, False, "code_item", filter_code)
+        source = store
+        grid.set_source(source)
+        lbl_status.config(text="Cargando...")
+
+        def on_page(rows):
+            source.append(rows)
+            grid.refresh()
+            lbl_status.config(text=f"Cargando... {len(source.rows)} filas")
+
+        def on_done(total):
+            nonlocal store_complete
+            if source is store:
+                store_complete = True
+            lbl_status.config(text=f"{source.count()} filas")
+
+        def on_error(e):
+            lbl_status.config(text="")
             messagebox.showerror("Error de consulta", f"No se pudo cargar registros resumen: {e}", parent=win)
-        finally:
-            conn.close()
+
+        # se carga la tabla completa para poder filtrar luego sin volver a la BD
+        loader = KeysetLoader(win, DB_NAME, "inventory_count_res", valid_fields, col_sql,
+                              descending=(order_dir_sql == "DESC"),
+                              on_page=on_page, on_done=on_done, on_error=on_error).start()
 
     # track current sort settings
     sort_field = "code_item"
@@ -906,7 +920,7 @@ def mostrar_registros_resumen(root):
             btn_dir.config(text=sort_dir)
         except Exception:
             pass
-        cargar_datos(order_by=sort_field, order_dir=sort_dir)
+        cargar_datos(order_by=sort_field, order_dir=sort_dir, filter_code=edit_filter.get().strip() or None)
 
     win = tk.Toplevel(root)
     win.title("Registros Resumen")
@@ -914,7 +928,8 @@ def mostrar_registros_resumen(root):
     win.geometry("2000x800")
 
     cols = ("id", "code_item", "description_item", "boxqty", "boxunitqty", "boxunittotal", "magazijn", "winkel", "total", "current_inventory", "difference", "updated_date")
-    tree = ttk.Treeview(win, columns=cols, show="headings", height=14)
+    grid = VirtualGrid(win, cols, height=14)
+    tree = grid.tree
     for col in cols:
         heading = col.replace("_", " ").title()
         tree.heading(col, text=heading, command=lambda c=col: on_ordenar(c))
@@ -936,7 +951,28 @@ def mostrar_registros_resumen(root):
         else:
             width = 120
         tree.column(col, width=width, anchor="center")
-    tree.pack(fill="both", expand=True, padx=6, pady=6)
+    grid.frame.pack(fill="both", expand=True, padx=6, pady=6)
+    ensure_resumen_indexes(DB_NAME)
+
+    # Solo cambios de inventory_count_res: la tabla resumen se regenera a pedido (generar resumen),
+    # un cambio en inventory_count no la toca hasta entonces
+    def on_external_change(change):
+        if change.op == "reload":
+            cargar_datos(order_by=sort_field, order_dir=sort_dir, filter_code=edit_filter.get().strip() or None, reload=True)
+        elif change.op == "delete":
+            grid.remove_row(change.row_id)
+        elif change.op == "update" and change.row is not None:
+            grid.update_row(change.row_id, change.row)
+
+    bus_token = change_bus.subscribe("inventory_count_res", on_external_change)
+
+    def _on_destroy(event=None):
+        if event is not None and event.widget is not win:
+            return
+        change_bus.unsubscribe(bus_token)
+        if loader is not None:
+            loader.cancel()
+    win.bind("<Destroy>", _on_destroy, add=True)
 
     frm = ttk.Frame(win, padding=6)
     frm.pack(fill="x", padx=6, pady=(0,6))
@@ -964,9 +1000,10 @@ def mostrar_registros_resumen(root):
             current_code = ''
         if filter_text != current_code:
             _clear_selection_resumen()
-        cargar_datos(filter_code=filter_text or None)
+        cargar_datos(order_by=sort_field, order_dir=sort_dir, filter_code=filter_text or None)
     btn_filter = ttk.Button(frm, text="Filtrar", command=_on_filter_resumen)
     def _clear_selection_resumen():
+        grid.clear_selection()
         for w in (edit_code, edit_desc, edit_boxqty, edit_boxunitqty, edit_boxunittotal, edit_mag, edit_win,
                   edit_total, edit_current, edit_diff, edit_updated):
             try:
@@ -977,7 +1014,7 @@ def mostrar_registros_resumen(root):
             except Exception:
                 pass
 
-    btn_clear = ttk.Button(frm, text="Limpiar filtro", command=lambda: (edit_filter.delete(0, tk.END), _clear_selection_resumen(), cargar_datos()))
+    btn_clear = ttk.Button(frm, text="Limpiar filtro", command=lambda: (edit_filter.delete(0, tk.END), _clear_selection_resumen(), cargar_datos(order_by=sort_field, order_dir=sort_dir)))
 
     edit_code.grid(row=0, column=0, padx=2, pady=2)
     edit_desc.grid(row=0, column=1, padx=2, pady=2)
@@ -1037,17 +1074,15 @@ def mostrar_registros_resumen(root):
             tree.heading('updated_date', text='')
     chk_date = ttk.Checkbutton(frm, text="Mostrar fecha", variable=show_date_var, command=toggle_date_column)
     chk_date.grid(row=2, column=3, padx=6, pady=2, sticky="w")
+    lbl_status = ttk.Label(frm, text="")
+    lbl_status.grid(row=2, column=4, columnspan=3, padx=6, pady=2, sticky="w")
 
     # block typing into the code field if desired
     def _block_edit_keys(event=None):
         return "break"
     edit_code.bind("<Key>", _block_edit_keys)
 
-    def on_seleccionar(event=None):
-        sel = tree.focus()
-        if not sel:
-            return
-        vals = tree.item(sel, "values")
+    def on_seleccionar(vals=None):
         if not vals:
             return
         # vals order: id, code_item, description_item, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, current_inventory, difference, updated_date
@@ -1069,13 +1104,10 @@ def mostrar_registros_resumen(root):
         except Exception:
             pass
 
-    tree.bind("<<TreeviewSelect>>", on_seleccionar)
+    grid.bind_select(on_seleccionar)
 
     def _on_double_click_resumen(event=None):
-        sel = tree.focus()
-        if not sel:
-            return
-        vals = tree.item(sel, "values")
+        vals = grid.selected_values()
         if not vals:
             return
         # code is at index 1 in resumen view
@@ -1089,16 +1121,16 @@ def mostrar_registros_resumen(root):
                 edit_filter.insert(0, code_val)
             except Exception:
                 pass
-            cargar_datos(filter_code=code_val)
+            cargar_datos(order_by=sort_field, order_dir=sort_dir, filter_code=code_val)
 
     tree.bind("<Double-1>", _on_double_click_resumen)
 
     def actualizar_registro():
-        sel = tree.focus()
-        if not sel:
+        sel_vals = grid.selected_values()
+        if not sel_vals:
             messagebox.showerror("Error", "Selecciona un registro", parent=win)
             return
-        id_reg = tree.item(sel, "values")[0]
+        id_reg = sel_vals[0]
         code = edit_code.get().strip()
         desc = edit_desc.get().strip()
         try:
@@ -1113,38 +1145,45 @@ def mostrar_registros_resumen(root):
         total = boxunittotal + magazijn + winkel
         try:
             cur = sqlite3.connect(DB_NAME).cursor()
-            cur.execute("""
+            cur.execute(f"""
                 UPDATE inventory_count_res
                 SET code_item=?, description_item=?, boxqty=?, boxunitqty=?, boxunittotal=?, magazijn=?, winkel=?, total=?, current_inventory=?, difference=?, updated_date=?
                 WHERE id=?
+                RETURNING {', '.join(valid_fields)}
             """, (code, desc, boxqty, boxunitqty, boxunittotal, magazijn, winkel, total, int(edit_current.get() or 0), total - int(edit_current.get() or 0), edit_updated.get() or datetime.now().isoformat(), id_reg))
+            new_row = cur.fetchone()
             conn = cur.connection
             conn.commit()
             conn.close()
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo actualizar registro resumen: {e}", parent=win)
             return
-        cargar_datos(filter_code=edit_filter.get().strip() or None)
+        if new_row:
+            grid.update_row(new_row[0], new_row)
+            change_bus.publish("inventory_count_res", "update", new_row[0], row=new_row, code_item=new_row[1], source=bus_token)
         messagebox.showinfo("OK", "Registro actualizado", parent=win)
 
     def eliminar_registro():
-        sel = tree.focus()
-        if not sel:
+        sel_vals = grid.selected_values()
+        if not sel_vals:
             messagebox.showerror("Error", "Selecciona un registro", parent=win)
             return
-        id_reg = tree.item(sel, "values")[0]
+        id_reg = sel_vals[0]
         if not messagebox.askyesno("Confirmar", "¿Eliminar este registro resumen?", parent=win):
             return
         try:
             conn = sqlite3.connect(DB_NAME)
             cur = conn.cursor()
-            cur.execute("DELETE FROM inventory_count_res WHERE id = ?", (id_reg,))
+            cur.execute("DELETE FROM inventory_count_res WHERE id = ? RETURNING id, code_item", (id_reg,))
+            deleted = cur.fetchone()
             conn.commit()
             conn.close()
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo eliminar registro resumen: {e}", parent=win)
             return
-        cargar_datos()
+        if deleted:
+            grid.remove_row(deleted[0])
+            change_bus.publish("inventory_count_res", "delete", deleted[0], code_item=deleted[1], source=bus_token)
         for w in (edit_code, edit_desc, edit_boxqty, edit_boxunitqty, edit_boxunittotal, edit_mag, edit_win, edit_total, edit_current, edit_diff, edit_updated):
             try:
                 w.config(state="normal"); w.delete(0, tk.END)